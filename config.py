@@ -36,6 +36,41 @@ class Config:
     # ⏰ Token expiration
     PASSWORD_RESET_TOKEN_EXPIRATION = 3600
     
+    # 🗂️ Cache header laporan (detik) - per proses, dikosongkan otomatis saat data berubah
+    LAPORAN_HEADER_CACHE_TTL = int(os.environ.get("LAPORAN_HEADER_CACHE_TTL", 300))
+    
+    # 📄 PDF laporan (?format=pdf) - butuh `pip install weasyprint`
+    LAPORAN_PDF_DIR = os.environ.get("LAPORAN_PDF_DIR", os.path.join(basedir, "tmp", "laporan_pdf"))
+    LAPORAN_PDF_WORKERS = int(os.environ.get("LAPORAN_PDF_WORKERS", 2))  # jumlah proses render
+    LAPORAN_PDF_TUNGGU = float(os.environ.get("LAPORAN_PDF_TUNGGU", 2))  # detik menunggu sebelum balas 202
+
+    # 🗺️ Shard JSON pohon wilayah untuk dropdown profil (dibuat ulang saat import data sekolah)
+    WILAYAH_JSON_DIR = os.environ.get("WILAYAH_JSON_DIR", os.path.join(basedir, "tmp", "wilayah"))
+    # Index pencarian sekolah /pegawai/search_sekolah (detik) - per proses, dibangun ulang di latar belakang
+    SEKOLAH_INDEX_TTL = int(os.environ.get("SEKOLAH_INDEX_TTL", 600))
+    # `flask sekolah import --diff`: persen sekolah aktif yang boleh ditutup tanpa --paksa
+    SEKOLAH_MAKS_TUTUP_PERSEN = float(os.environ.get("SEKOLAH_MAKS_TUTUP_PERSEN", 5))
+    
+    # 📊 Snapshot statistik superadmin (detik) - dihitung ulang berkala atau saat nilai berubah
+    STATISTIK_CACHE_TTL = int(os.environ.get("STATISTIK_CACHE_TTL", 600))
+    # Cache trend bulan yang sudah lewat (detik) - per proses, worker lain melihat perubahan setelah TTL
+    TREND_BULAN_LALU_TTL = int(os.environ.get("TREND_BULAN_LALU_TTL", 600))
+
+    # 📶 Replay antrean offline penilaian
+    REPLAY_MAKS_OPERASI = int(os.environ.get("REPLAY_MAKS_OPERASI", 500))  # operasi per kiriman
+    OPERASI_KLIEN_SIMPAN_HARI = int(os.environ.get("OPERASI_KLIEN_SIMPAN_HARI", 30))  # umur catatan op_id
+
+    # 📝 Audit log (log_aktivitas): "mati" (default) = tidak dicatat, "transaksi" = satu INSERT
+    # multi-row per commit, "antrian" = ditulis thread latar belakang per batch,
+    # "jsonl" = ditulis ke file lokal lalu dimuat dengan `flask log muat`
+    AUDIT_LOG_MODE = os.environ.get("AUDIT_LOG_MODE", "mati")
+    AUDIT_ANTRIAN_MAKS = int(os.environ.get("AUDIT_ANTRIAN_MAKS", 10000))  # batas event mengantre
+    AUDIT_BATCH = int(os.environ.get("AUDIT_BATCH", 500))  # event per INSERT
+    AUDIT_INTERVAL = float(os.environ.get("AUDIT_INTERVAL", 2))  # detik menunggu batch terisi
+    AUDIT_JSONL_DIR = os.environ.get("AUDIT_JSONL_DIR", os.path.join(basedir, "tmp", "audit"))
+    AUDIT_JSONL_MAKS_BYTES = int(os.environ.get("AUDIT_JSONL_MAKS_BYTES", 10 * 1024 * 1024))  # putar file bila lebih besar
+    LOG_AKTIVITAS_SIMPAN_BULAN = int(os.environ.get("LOG_AKTIVITAS_SIMPAN_BULAN", 6))  # sisanya diringkas per hari
+    
     # 👤 Flask-Login
     REMEMBER_COOKIE_DURATION = timedelta(days=7)
     SESSION_PROTECTION = "strong"
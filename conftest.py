@@ -0,0 +1,102 @@
+# conftest.py - fixture pytest untuk test_*.py di root
+import os
+import tempfile
+
+import pytest
+
+# config.py mewajibkan SECRET_KEY dan memakai MySQL; test berjalan di SQLite sementara
+os.environ.setdefault("SECRET_KEY", "test")
+_folder = tempfile.mkdtemp(prefix="penilaiansiswa-test-")
+
+import config  # noqa: E402
+
+config.Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(_folder, 'test.db')}"
+config.Config.WILAYAH_JSON_DIR = os.path.join(_folder, "wilayah")
+config.Config.LAPORAN_PDF_DIR = os.path.join(_folder, "laporan_pdf")
+config.Config.BCRYPT_LOG_ROUNDS = 4
+config.Config.TESTING = True
+
+# test_db.py dan test_reset.py adalah skrip manual ke database sungguhan, bukan test pytest
+collect_ignore = ["test_db.py", "test_reset.py"]
+
+
+@pytest.fixture
+def app():
+    from main import app
+    from penilaiansiswa import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def data(app):
+    """Satu sekolah, satu kelas dengan 6 siswa (L/P bergantian) dan wali kelasnya."""
+    from main import generate_password_hash
+    from penilaiansiswa import db
+    from penilaiansiswa.models import Provinsi, Kabupaten, Kecamatan, Sekolah, TahunAjaran, Kelas, Siswa
+    from penilaiansiswa.models.users import User, Pegawai
+
+    provinsi = Provinsi(nama="Jawa Timur")
+    kabupaten = Kabupaten(nama="Trenggalek", provinsi=provinsi)
+    kecamatan = Kecamatan(nama="Panggul", kabupaten=kabupaten)
+    sekolah = Sekolah(nama_sekolah="SD Negeri 1 Panggul", npsn="20500001", kecamatan=kecamatan)
+    wali = User(nama_lengkap="Wali Kelas", email="wali@test", username="wali",
+                password=generate_password_hash("rahasia"))
+    kepsek = User(nama_lengkap="Kepala Sekolah", email="kepsek@test", username="kepsek",
+                  password=generate_password_hash("rahasia"))
+    db.session.add_all([sekolah, wali, kepsek])
+    db.session.flush()
+
+    pegawai = Pegawai(user_id=wali.id, sekolah_id=sekolah.id, nip="1")
+    kepala = Pegawai(user_id=kepsek.id, sekolah_id=sekolah.id, nip="2")
+    db.session.add_all([pegawai, kepala])
+    db.session.flush()
+    tahun_ajaran = TahunAjaran(sekolah_id=sekolah.id, tahun_ajaran="2025/2026", semester="ganjil",
+                               kepala_sekolah_id=kepala.id, aktif=True)
+    db.session.add(tahun_ajaran)
+    db.session.flush()
+    kelas = Kelas(tahun_ajaran_id=tahun_ajaran.id, nama_kelas="1A", wali_kelas_id=pegawai.id,
+                  sekolah_id=sekolah.id)
+    db.session.add(kelas)
+    db.session.flush()
+    siswa = [
+        Siswa(nama_siswa=f"Siswa {i}", nisn=f"00{i:03d}", jenis_kelamin="LP"[i % 2], kelas_id=kelas.id)
+        for i in range(6)
+    ]
+    db.session.add_all(siswa)
+    db.session.commit()
+    return {
+        "sekolah": sekolah.id, "tahun_ajaran": tahun_ajaran.id, "kelas": kelas.id,
+        "siswa": [s.id for s in siswa], "pegawai": pegawai.id,
+    }
+
+
+@pytest.fixture
+def client(app, data):
+    """Test client yang sudah login sebagai wali kelas."""
+    client = app.test_client()
+    client.post("/login", data={"username": "wali", "password": "rahasia"})
+    return client
+
+
+@pytest.fixture
+def audit(app, monkeypatch):
+    """Audit log aktif (AUDIT_LOG_MODE=transaksi) selama satu test, listener dilepas setelahnya."""
+    from sqlalchemy import event
+    from penilaiansiswa import db, logging as audit_log
+
+    monkeypatch.setitem(app.config, "AUDIT_LOG_MODE", "transaksi")
+    audit_log.register_listeners(audit_log.MODEL_AUDIT)
+    yield
+    for cls in audit_log.MODEL_AUDIT:
+        for evt, fn in (("after_insert", audit_log._catat_create), ("after_update", audit_log._catat_update),
+                        ("after_delete", audit_log._catat_delete)):
+            event.remove(cls, evt, fn)
+    for evt, fn in (("before_commit", audit_log._tulis_buffer), ("after_commit", audit_log._kirim_antrian),
+                    ("after_rollback", audit_log._buang_buffer)):
+        event.remove(db.session, evt, fn)
+    audit_log._aktif = False
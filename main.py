@@ -137,18 +137,19 @@ def create_app(config_name="default"):
     @app.route("/home")
     @login_required
     def home():
-        from penilaiansiswa.models.sekolah import Provinsi
         from penilaiansiswa.models.users import Pegawai
+        from penilaiansiswa.utils.wilayah_json import url_index_wilayah
         
-        provinsi_list = Provinsi.query.all()
         pegawai = Pegawai.query.filter_by(user_id=current_user.id).first()
 
+        # pilihan wilayah & sekolah dimuat browser dari shard JSON
         return render_template(
             "home.html",
             user=current_user,
             username=current_user.username,
-            provinsi_list=provinsi_list,
             pegawai=pegawai,
+            url_wilayah=url_index_wilayah(),
+            terpilih={},
         )
     
     @app.route("/logout")
@@ -260,6 +261,18 @@ def create_app(config_name="default"):
     except ImportError as e:
         app.logger.warning(f"Superadmin blueprint not found: {e}")
     
+    # =============================
+    # AUDIT LOG
+    # =============================
+    from penilaiansiswa.logging import init_audit
+    init_audit(app)
+    
+    # =============================
+    # CLI COMMANDS
+    # =============================
+    from penilaiansiswa.commands import register_commands
+    register_commands(app)
+    
     # =============================
     # JINJA2 FILTERS
     # =============================
@@ -0,0 +1,39 @@
+"""add operasi_klien
+
+Revision ID: 0b6e3a9c5d21
+Revises: f3b9d2e5a718
+Create Date: 2026-10-18 15:17:52.084461
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e3a9c5d21'
+down_revision = 'f3b9d2e5a718'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('operasi_klien',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('op_id', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('keterangan', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'op_id', name='uq_operasi_klien_user_op')
+    )
+    with op.batch_alter_table('operasi_klien', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_operasi_klien_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('operasi_klien', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_operasi_klien_created_at'))
+
+    op.drop_table('operasi_klien')
@@ -0,0 +1,93 @@
+"""add rekap_kelas_bulan
+
+Revision ID: 3c91a7d2e4b1
+Revises: ecc2815db3da
+Create Date: 2026-10-18 09:12:40.118204
+
+Tabel langsung diisi dari data kebiasaan yang sudah ada (sama dengan: flask rekap rebuild),
+setelah itu diperbarui secara delta saat nilai disimpan.
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c91a7d2e4b1'
+down_revision = 'ecc2815db3da'
+branch_labels = None
+depends_on = None
+
+# Salinan konstanta utils/rekap.py agar migration tidak bergantung pada kode aplikasi
+KEBIASAAN_FIELDS = [
+    "bangun_pagi", "beribadah", "berolahraga",
+    "sehat_dan_lemar", "belajar", "bermasyarakat", "tidur_cepat"
+]
+AMBANG_TERBIASA = 20
+
+kebiasaan = sa.table(
+    'kebiasaan',
+    sa.column('id', sa.Integer), sa.column('siswa_id', sa.Integer), sa.column('kelas_id', sa.Integer),
+    sa.column('bulan', sa.String), *[sa.column(field, sa.Integer) for field in KEBIASAAN_FIELDS]
+)
+siswa = sa.table('siswa', sa.column('id', sa.Integer), sa.column('kelas_id', sa.Integer), sa.column('jenis_kelamin', sa.String))
+
+
+def _baris_utama():
+    """Hanya baris kebiasaan dengan id terkecil per (siswa_id, kelas_id, bulan) bila ada baris
+    ganda, yaitu baris yang dibaca laporan dan diperbarui save_row."""
+    utama = sa.select(sa.func.min(kebiasaan.c.id)).where(
+        kebiasaan.c.siswa_id.isnot(None), kebiasaan.c.kelas_id.isnot(None)
+    ).group_by(kebiasaan.c.siswa_id, kebiasaan.c.kelas_id, kebiasaan.c.bulan)
+    return sa.or_(kebiasaan.c.siswa_id.is_(None), kebiasaan.c.kelas_id.is_(None), kebiasaan.c.id.in_(utama))
+
+
+def _isi_rekap_kelas_bulan():
+    """Sama dengan agregat.rebuild_rekap_kelas_bulan(): hanya siswa yang masih di kelas nilai."""
+    def terbiasa(field):
+        return sa.func.coalesce(kebiasaan.c[field], 0) >= AMBANG_TERBIASA
+
+    terisi = sa.or_(*[kebiasaan.c[field].isnot(None) for field in KEBIASAAN_FIELDS])
+    semua = sa.and_(*[terbiasa(field) for field in KEBIASAAN_FIELDS])
+    sumber = sa.select(
+        kebiasaan.c.kelas_id, kebiasaan.c.bulan, siswa.c.jenis_kelamin,
+        sa.func.sum(sa.case((terisi, 1), else_=0)),
+        sa.func.sum(sa.case((semua, 1), else_=0)),
+        *[sa.func.sum(sa.case((terbiasa(field), 1), else_=0)) for field in KEBIASAAN_FIELDS],
+        sa.literal(datetime.utcnow()),
+    ).select_from(kebiasaan).join(
+        siswa, sa.and_(siswa.c.id == kebiasaan.c.siswa_id, siswa.c.kelas_id == kebiasaan.c.kelas_id)
+    ).where(_baris_utama()).group_by(kebiasaan.c.kelas_id, kebiasaan.c.bulan, siswa.c.jenis_kelamin)
+
+    kolom = ["kelas_id", "bulan", "jenis_kelamin", "jumlah_terisi", "terbiasa_semua"] + [
+        f"{field}_terbiasa" for field in KEBIASAAN_FIELDS
+    ] + ["updated_at"]
+    tujuan = sa.table('rekap_kelas_bulan', *[sa.column(k) for k in kolom])
+    op.execute(tujuan.insert().from_select(kolom, sumber))
+
+
+def upgrade():
+    op.create_table('rekap_kelas_bulan',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kelas_id', sa.Integer(), nullable=False),
+    sa.Column('bulan', sa.String(length=7), nullable=False),
+    sa.Column('jenis_kelamin', sa.String(length=1), nullable=False),
+    sa.Column('jumlah_terisi', sa.Integer(), nullable=False),
+    sa.Column('terbiasa_semua', sa.Integer(), nullable=False),
+    sa.Column('bangun_pagi_terbiasa', sa.Integer(), nullable=False),
+    sa.Column('beribadah_terbiasa', sa.Integer(), nullable=False),
+    sa.Column('berolahraga_terbiasa', sa.Integer(), nullable=False),
+    sa.Column('sehat_dan_lemar_terbiasa', sa.Integer(), nullable=False),
+    sa.Column('belajar_terbiasa', sa.Integer(), nullable=False),
+    sa.Column('bermasyarakat_terbiasa', sa.Integer(), nullable=False),
+    sa.Column('tidur_cepat_terbiasa', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['kelas_id'], ['kelas.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kelas_id', 'bulan', 'jenis_kelamin', name='uq_rekap_kelas_bulan_jk')
+    )
+    _isi_rekap_kelas_bulan()
+
+
+def downgrade():
+    op.drop_table('rekap_kelas_bulan')
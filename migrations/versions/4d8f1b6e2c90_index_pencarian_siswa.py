@@ -0,0 +1,85 @@
+"""index pencarian siswa (nama_normal, siswa_token)
+
+Revision ID: 4d8f1b6e2c90
+Revises: 9a2c7e4b1f63
+Create Date: 2026-10-18 16:41:12.508316
+
+Index siswa yang sudah ada diisi di sini per batch (sama dengan: flask siswa reindex),
+agar pencarian nama langsung menemukan siswa lama.
+"""
+import re
+import unicodedata
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d8f1b6e2c90'
+down_revision = '9a2c7e4b1f63'
+branch_labels = None
+depends_on = None
+
+# Salinan utils/teks.py agar migration tidak bergantung pada kode aplikasi
+_BUKAN_ALNUM = re.compile(r"[^a-z0-9]+")
+MAKS_TOKEN = 50
+BATCH = 1000
+
+
+def _normalisasi(teks):
+    if not teks:
+        return ""
+    if not teks.isascii():
+        teks = unicodedata.normalize("NFKD", teks)
+        teks = "".join(c for c in teks if not unicodedata.combining(c))
+    return _BUKAN_ALNUM.sub(" ", teks.lower()).strip()
+
+
+def _isi_index():
+    conn = op.get_bind()
+    siswa = sa.table('siswa', sa.column('id', sa.Integer), sa.column('nama_siswa', sa.String), sa.column('nama_normal', sa.String))
+    token = sa.table('siswa_token', sa.column('token', sa.String), sa.column('siswa_id', sa.Integer))
+    ubah = siswa.update().where(siswa.c.id == sa.bindparam('b_id')).values(nama_normal=sa.bindparam('b_nama'))
+    id_terakhir = 0
+    while True:
+        rows = conn.execute(
+            sa.select(siswa.c.id, siswa.c.nama_siswa).where(siswa.c.id > id_terakhir).order_by(siswa.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            return
+        normal = {row.id: _normalisasi(row.nama_siswa) for row in rows}
+        conn.execute(ubah, [{'b_id': siswa_id, 'b_nama': nama[:100]} for siswa_id, nama in normal.items()])
+        tokens = [
+            {'token': kata, 'siswa_id': siswa_id}
+            for siswa_id, nama in normal.items()
+            for kata in dict.fromkeys(k[:MAKS_TOKEN] for k in nama.split())
+        ]
+        if tokens:
+            conn.execute(token.insert(), tokens)
+        id_terakhir = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('siswa', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('nama_normal', sa.String(length=100), nullable=True))
+        batch_op.create_index(batch_op.f('ix_siswa_nama_normal'), ['nama_normal'], unique=False)
+
+    op.create_table('siswa_token',
+    sa.Column('token', sa.String(length=50), nullable=False),
+    sa.Column('siswa_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['siswa_id'], ['siswa.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('token', 'siswa_id')
+    )
+    with op.batch_alter_table('siswa_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_siswa_token_siswa_id'), ['siswa_id'], unique=False)
+
+    _isi_index()
+
+
+def downgrade():
+    with op.batch_alter_table('siswa_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_siswa_token_siswa_id'))
+
+    op.drop_table('siswa_token')
+    with op.batch_alter_table('siswa', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_siswa_nama_normal'))
+        batch_op.drop_column('nama_normal')
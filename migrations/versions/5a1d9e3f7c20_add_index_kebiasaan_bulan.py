@@ -0,0 +1,26 @@
+"""add index kebiasaan.bulan
+
+Revision ID: 5a1d9e3f7c20
+Revises: b4e7c2a9d513
+Create Date: 2026-10-18 12:05:13.884190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1d9e3f7c20'
+down_revision = 'b4e7c2a9d513'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('kebiasaan', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_kebiasaan_bulan'), ['bulan'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('kebiasaan', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_kebiasaan_bulan'))
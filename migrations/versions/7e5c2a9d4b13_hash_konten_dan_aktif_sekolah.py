@@ -0,0 +1,30 @@
+"""hash_konten dan aktif di sekolah
+
+Revision ID: 7e5c2a9d4b13
+Revises: 4d8f1b6e2c90
+Create Date: 2026-10-18 17:22:35.914208
+
+hash_konten masih kosong setelah upgrade; import berikutnya membandingkan
+isi lengkap sekali lalu mengisinya: flask sekolah import --diff
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e5c2a9d4b13'
+down_revision = '4d8f1b6e2c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sekolah', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hash_konten', sa.String(length=40), nullable=True))
+        batch_op.add_column(sa.Column('aktif', sa.Boolean(), server_default=sa.true(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('sekolah', schema=None) as batch_op:
+        batch_op.drop_column('aktif')
+        batch_op.drop_column('hash_konten')
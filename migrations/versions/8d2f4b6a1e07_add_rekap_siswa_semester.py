@@ -0,0 +1,133 @@
+"""add rekap_siswa_semester
+
+Revision ID: 8d2f4b6a1e07
+Revises: 3c91a7d2e4b1
+Create Date: 2026-10-18 10:03:21.540117
+
+Tabel langsung diisi dari data kebiasaan yang sudah ada (sama dengan: flask rekap rebuild).
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4b6a1e07'
+down_revision = '3c91a7d2e4b1'
+branch_labels = None
+depends_on = None
+
+# Salinan konstanta utils/rekap.py agar migration tidak bergantung pada kode aplikasi
+KEBIASAAN_FIELDS = [
+    "bangun_pagi", "beribadah", "berolahraga",
+    "sehat_dan_lemar", "belajar", "bermasyarakat", "tidur_cepat"
+]
+AMBANG_TERBIASA = 20
+
+kebiasaan = sa.table(
+    'kebiasaan',
+    sa.column('id', sa.Integer), sa.column('siswa_id', sa.Integer), sa.column('kelas_id', sa.Integer),
+    sa.column('bulan', sa.String), *[sa.column(field, sa.Integer) for field in KEBIASAAN_FIELDS]
+)
+
+
+def _baris_utama():
+    """Hanya baris kebiasaan dengan id terkecil per (siswa_id, kelas_id, bulan) bila ada baris
+    ganda, yaitu baris yang dibaca laporan dan diperbarui save_row."""
+    utama = sa.select(sa.func.min(kebiasaan.c.id)).where(
+        kebiasaan.c.siswa_id.isnot(None), kebiasaan.c.kelas_id.isnot(None)
+    ).group_by(kebiasaan.c.siswa_id, kebiasaan.c.kelas_id, kebiasaan.c.bulan)
+    return sa.or_(kebiasaan.c.siswa_id.is_(None), kebiasaan.c.kelas_id.is_(None), kebiasaan.c.id.in_(utama))
+
+
+def _isi_rekap_siswa_semester():
+    """Sama dengan utils/rekap.hitung_agregat_siswa(): hanya bulan dengan nilai > 0 yang terisi,
+    terbiasa bila rata-ratanya >= AMBANG_TERBIASA (jumlah >= ambang * terisi)."""
+    tahun = sa.cast(sa.func.substr(kebiasaan.c.bulan, 1, 4), sa.Integer)
+    bulan = sa.cast(sa.func.substr(kebiasaan.c.bulan, 6, 2), sa.Integer)
+    ganjil = bulan >= 7
+    tahun_ajaran = sa.case(
+        (ganjil, sa.cast(tahun, sa.String) + "/" + sa.cast(tahun + 1, sa.String)),
+        else_=sa.cast(tahun - 1, sa.String) + "/" + sa.cast(tahun, sa.String)
+    )
+    semester = sa.case((ganjil, "ganjil"), else_="genap")
+
+    kolom, pilih = ["siswa_id", "kelas_id", "tahun_ajaran", "semester"], []
+    for field in KEBIASAAN_FIELDS:
+        nilai = kebiasaan.c[field]
+        isi = nilai > 0
+        jumlah = sa.func.sum(sa.case((isi, nilai), else_=0))
+        terisi = sa.func.sum(sa.case((isi, 1), else_=0))
+        kolom += [f"{field}_{nama}" for nama in ("jumlah", "terisi", "min", "rata", "terbiasa")]
+        pilih += [
+            jumlah,
+            terisi,
+            sa.func.min(sa.case((isi, nilai))),
+            sa.case((terisi > 0, jumlah * 1.0 / terisi), else_=0),
+            sa.case((sa.and_(terisi > 0, jumlah >= AMBANG_TERBIASA * terisi), sa.true()), else_=sa.false()),
+        ]
+    kolom.append("updated_at")
+
+    sumber = sa.select(
+        kebiasaan.c.siswa_id, kebiasaan.c.kelas_id, tahun_ajaran, semester, *pilih, sa.literal(datetime.utcnow())
+    ).where(
+        kebiasaan.c.siswa_id.isnot(None), kebiasaan.c.kelas_id.isnot(None),
+        kebiasaan.c.bulan.like("____-__"), _baris_utama()
+    ).group_by(kebiasaan.c.siswa_id, kebiasaan.c.kelas_id, tahun_ajaran, semester)
+    tujuan = sa.table('rekap_siswa_semester', *[sa.column(k) for k in kolom])
+    op.execute(tujuan.insert().from_select(kolom, sumber))
+
+
+def upgrade():
+    op.create_table('rekap_siswa_semester',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('siswa_id', sa.Integer(), nullable=False),
+    sa.Column('kelas_id', sa.Integer(), nullable=False),
+    sa.Column('tahun_ajaran', sa.String(length=20), nullable=False),
+    sa.Column('semester', sa.String(length=10), nullable=False),
+    sa.Column('bangun_pagi_jumlah', sa.Integer(), nullable=False),
+    sa.Column('bangun_pagi_terisi', sa.Integer(), nullable=False),
+    sa.Column('bangun_pagi_min', sa.Integer(), nullable=True),
+    sa.Column('bangun_pagi_rata', sa.Float(), nullable=False),
+    sa.Column('bangun_pagi_terbiasa', sa.Boolean(), nullable=False),
+    sa.Column('beribadah_jumlah', sa.Integer(), nullable=False),
+    sa.Column('beribadah_terisi', sa.Integer(), nullable=False),
+    sa.Column('beribadah_min', sa.Integer(), nullable=True),
+    sa.Column('beribadah_rata', sa.Float(), nullable=False),
+    sa.Column('beribadah_terbiasa', sa.Boolean(), nullable=False),
+    sa.Column('berolahraga_jumlah', sa.Integer(), nullable=False),
+    sa.Column('berolahraga_terisi', sa.Integer(), nullable=False),
+    sa.Column('berolahraga_min', sa.Integer(), nullable=True),
+    sa.Column('berolahraga_rata', sa.Float(), nullable=False),
+    sa.Column('berolahraga_terbiasa', sa.Boolean(), nullable=False),
+    sa.Column('sehat_dan_lemar_jumlah', sa.Integer(), nullable=False),
+    sa.Column('sehat_dan_lemar_terisi', sa.Integer(), nullable=False),
+    sa.Column('sehat_dan_lemar_min', sa.Integer(), nullable=True),
+    sa.Column('sehat_dan_lemar_rata', sa.Float(), nullable=False),
+    sa.Column('sehat_dan_lemar_terbiasa', sa.Boolean(), nullable=False),
+    sa.Column('belajar_jumlah', sa.Integer(), nullable=False),
+    sa.Column('belajar_terisi', sa.Integer(), nullable=False),
+    sa.Column('belajar_min', sa.Integer(), nullable=True),
+    sa.Column('belajar_rata', sa.Float(), nullable=False),
+    sa.Column('belajar_terbiasa', sa.Boolean(), nullable=False),
+    sa.Column('bermasyarakat_jumlah', sa.Integer(), nullable=False),
+    sa.Column('bermasyarakat_terisi', sa.Integer(), nullable=False),
+    sa.Column('bermasyarakat_min', sa.Integer(), nullable=True),
+    sa.Column('bermasyarakat_rata', sa.Float(), nullable=False),
+    sa.Column('bermasyarakat_terbiasa', sa.Boolean(), nullable=False),
+    sa.Column('tidur_cepat_jumlah', sa.Integer(), nullable=False),
+    sa.Column('tidur_cepat_terisi', sa.Integer(), nullable=False),
+    sa.Column('tidur_cepat_min', sa.Integer(), nullable=True),
+    sa.Column('tidur_cepat_rata', sa.Float(), nullable=False),
+    sa.Column('tidur_cepat_terbiasa', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['kelas_id'], ['kelas.id'], ),
+    sa.ForeignKeyConstraint(['siswa_id'], ['siswa.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('siswa_id', 'kelas_id', 'tahun_ajaran', 'semester', name='uq_rekap_siswa_semester')
+    )
+    _isi_rekap_siswa_semester()
+
+
+def downgrade():
+    op.drop_table('rekap_siswa_semester')
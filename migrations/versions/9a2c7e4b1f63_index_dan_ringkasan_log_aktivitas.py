@@ -0,0 +1,43 @@
+"""index log_aktivitas dan tabel log_aktivitas_harian
+
+Revision ID: 9a2c7e4b1f63
+Revises: 0b6e3a9c5d21
+Create Date: 2026-10-18 16:08:44.731902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a2c7e4b1f63'
+down_revision = '0b6e3a9c5d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('log_aktivitas', schema=None) as batch_op:
+        batch_op.create_index('ix_log_aktivitas_tabel_entri', ['tabel', 'entri_id'], unique=False)
+        batch_op.create_index('ix_log_aktivitas_user_waktu', ['user_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_log_aktivitas_timestamp', ['timestamp'], unique=False)
+
+    op.create_table('log_aktivitas_harian',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tanggal', sa.Date(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('tabel', sa.String(length=50), nullable=False),
+    sa.Column('aksi', sa.String(length=50), nullable=False),
+    sa.Column('jumlah', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('tanggal', 'user_id', 'tabel', 'aksi', name='uq_log_aktivitas_harian')
+    )
+
+
+def downgrade():
+    op.drop_table('log_aktivitas_harian')
+
+    with op.batch_alter_table('log_aktivitas', schema=None) as batch_op:
+        batch_op.drop_index('ix_log_aktivitas_timestamp')
+        batch_op.drop_index('ix_log_aktivitas_user_waktu')
+        batch_op.drop_index('ix_log_aktivitas_tabel_entri')
@@ -0,0 +1,90 @@
+"""add statistik_wilayah_bulan
+
+Revision ID: b4e7c2a9d513
+Revises: 8d2f4b6a1e07
+Create Date: 2026-10-18 11:20:47.302561
+
+Tabel langsung diisi dari data kebiasaan yang sudah ada (sama dengan: flask rekap rebuild).
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e7c2a9d513'
+down_revision = '8d2f4b6a1e07'
+branch_labels = None
+depends_on = None
+
+# Salinan konstanta utils/rekap.py agar migration tidak bergantung pada kode aplikasi
+KEBIASAAN_FIELDS = [
+    "bangun_pagi", "beribadah", "berolahraga",
+    "sehat_dan_lemar", "belajar", "bermasyarakat", "tidur_cepat"
+]
+
+kebiasaan = sa.table(
+    'kebiasaan',
+    sa.column('id', sa.Integer), sa.column('siswa_id', sa.Integer), sa.column('kelas_id', sa.Integer),
+    sa.column('bulan', sa.String), *[sa.column(field, sa.Integer) for field in KEBIASAAN_FIELDS]
+)
+kelas = sa.table('kelas', sa.column('id', sa.Integer), sa.column('sekolah_id', sa.Integer))
+sekolah = sa.table('sekolah', sa.column('id', sa.Integer), sa.column('kecamatan_id', sa.Integer))
+kecamatan = sa.table('kecamatan', sa.column('id', sa.Integer), sa.column('kabupaten_id', sa.Integer))
+kabupaten = sa.table('kabupaten', sa.column('id', sa.Integer), sa.column('provinsi_id', sa.Integer))
+
+
+def _baris_utama():
+    """Hanya baris kebiasaan dengan id terkecil per (siswa_id, kelas_id, bulan) bila ada baris
+    ganda, yaitu baris yang dibaca laporan dan diperbarui save_row."""
+    utama = sa.select(sa.func.min(kebiasaan.c.id)).where(
+        kebiasaan.c.siswa_id.isnot(None), kebiasaan.c.kelas_id.isnot(None)
+    ).group_by(kebiasaan.c.siswa_id, kebiasaan.c.kelas_id, kebiasaan.c.bulan)
+    return sa.or_(kebiasaan.c.siswa_id.is_(None), kebiasaan.c.kelas_id.is_(None), kebiasaan.c.id.in_(utama))
+
+
+def _isi_statistik_wilayah():
+    """Sama dengan agregat.rebuild_statistik_wilayah(): satu INSERT ... SELECT per level & kebiasaan."""
+    level_kolom = [
+        ("sekolah", kelas.c.sekolah_id),
+        ("kecamatan", sekolah.c.kecamatan_id),
+        ("kabupaten", kecamatan.c.kabupaten_id),
+        ("provinsi", kabupaten.c.provinsi_id),
+    ]
+    kolom = ["level", "wilayah_id", "bulan", "field", "jumlah", "banyak", "updated_at"]
+    tujuan = sa.table('statistik_wilayah_bulan', *[sa.column(k) for k in kolom])
+    now = datetime.utcnow()
+    for level, kolom_wilayah in level_kolom:
+        for field in KEBIASAAN_FIELDS:
+            nilai = kebiasaan.c[field]
+            sumber = sa.select(
+                sa.literal(level), kolom_wilayah, kebiasaan.c.bulan, sa.literal(field),
+                sa.func.coalesce(sa.func.sum(nilai), 0), sa.func.count(nilai), sa.literal(now)
+            ).select_from(kebiasaan).join(
+                kelas, kelas.c.id == kebiasaan.c.kelas_id
+            ).outerjoin(sekolah, sekolah.c.id == kelas.c.sekolah_id
+            ).outerjoin(kecamatan, kecamatan.c.id == sekolah.c.kecamatan_id
+            ).outerjoin(kabupaten, kabupaten.c.id == kecamatan.c.kabupaten_id
+            ).where(kolom_wilayah.isnot(None), nilai.isnot(None), _baris_utama()
+            ).group_by(kolom_wilayah, kebiasaan.c.bulan)
+            op.execute(tujuan.insert().from_select(kolom, sumber))
+
+
+def upgrade():
+    op.create_table('statistik_wilayah_bulan',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('level', sa.String(length=10), nullable=False),
+    sa.Column('wilayah_id', sa.Integer(), nullable=False),
+    sa.Column('bulan', sa.String(length=7), nullable=False),
+    sa.Column('field', sa.String(length=30), nullable=False),
+    sa.Column('jumlah', sa.BigInteger(), nullable=False),
+    sa.Column('banyak', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('level', 'wilayah_id', 'bulan', 'field', name='uq_statistik_wilayah_bulan')
+    )
+    _isi_statistik_wilayah()
+
+
+def downgrade():
+    op.drop_table('statistik_wilayah_bulan')
@@ -0,0 +1,42 @@
+"""unique kebiasaan (siswa_id, kelas_id, bulan)
+
+Revision ID: c7e2f19a4b86
+Revises: 5a1d9e3f7c20
+Create Date: 2026-10-18 13:20:47.301552
+
+Baris ganda dihapus lebih dulu: yang dipertahankan adalah baris dengan id
+terkecil, yaitu baris yang selama ini dibaca laporan dan diperbarui save_row.
+Tabel agregat tidak perlu dihitung ulang: isi awalnya (3c91a7d2e4b1, 8d2f4b6a1e07,
+b4e7c2a9d513) juga hanya menghitung baris dengan id terkecil tersebut.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2f19a4b86'
+down_revision = '5a1d9e3f7c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # subquery dibungkus tabel turunan agar diterima MySQL (DELETE dari tabel yang sama)
+    op.execute(
+        "DELETE FROM kebiasaan "
+        "WHERE siswa_id IS NOT NULL AND kelas_id IS NOT NULL "
+        "AND id NOT IN ("
+        "  SELECT id FROM ("
+        "    SELECT MIN(id) AS id FROM kebiasaan"
+        "    WHERE siswa_id IS NOT NULL AND kelas_id IS NOT NULL"
+        "    GROUP BY siswa_id, kelas_id, bulan"
+        "  ) AS sisa"
+        ")"
+    )
+    with op.batch_alter_table('kebiasaan', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_kebiasaan_siswa_kelas_bulan', ['siswa_id', 'kelas_id', 'bulan'])
+
+
+def downgrade():
+    with op.batch_alter_table('kebiasaan', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_kebiasaan_siswa_kelas_bulan', type_='unique')
@@ -0,0 +1,26 @@
+"""add versi to kebiasaan
+
+Revision ID: e1a4c8d06f35
+Revises: c7e2f19a4b86
+Create Date: 2026-10-18 14:02:36.118024
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a4c8d06f35'
+down_revision = 'c7e2f19a4b86'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('kebiasaan', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('versi', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('kebiasaan', schema=None) as batch_op:
+        batch_op.drop_column('versi')
@@ -0,0 +1,32 @@
+"""add versi_data_kelas
+
+Revision ID: f3b9d2e5a718
+Revises: e1a4c8d06f35
+Create Date: 2026-10-18 14:41:09.527310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9d2e5a718'
+down_revision = 'e1a4c8d06f35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('versi_data_kelas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kelas_id', sa.Integer(), nullable=False),
+    sa.Column('bulan', sa.String(length=7), nullable=False),
+    sa.Column('versi', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kelas_id', 'bulan', name='uq_versi_data_kelas')
+    )
+
+
+def downgrade():
+    op.drop_table('versi_data_kelas')
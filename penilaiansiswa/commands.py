@@ -0,0 +1,211 @@
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from penilaiansiswa import db
+
+# =============================
+# flask rekap ...
+# =============================
+rekap_cli = AppGroup("rekap", help="Pemeliharaan tabel rekap/agregat kebiasaan.")
+
+
+@rekap_cli.command("rebuild")
+@click.option("--kelas-id", type=int, default=None, help="Hanya hitung ulang satu kelas.")
+def rekap_rebuild(kelas_id):
+    """Isi ulang tabel rekap & kubus statistik dari tabel kebiasaan.
+
+    Dengan --kelas-id hanya rekap kelas tersebut; kubus statistik wilayah
+    selalu dihitung ulang penuh (tanpa --kelas-id).
+    """
+    from penilaiansiswa.utils.agregat import (
+        rebuild_rekap_kelas_bulan, rebuild_rekap_siswa_semester, rebuild_statistik_wilayah
+    )
+
+    rebuild_rekap_kelas_bulan(kelas_id)
+    rebuild_rekap_siswa_semester(kelas_id)
+    if not kelas_id:
+        rebuild_statistik_wilayah()
+    db.session.commit()
+    if kelas_id:
+        click.echo(f"✅ rekap_kelas_bulan & rekap_siswa_semester dihitung ulang (kelas {kelas_id})")
+    else:
+        click.echo("✅ rekap_kelas_bulan, rekap_siswa_semester & statistik_wilayah_bulan dihitung ulang (semua kelas)")
+
+
+# =============================
+# flask pdf ...
+# =============================
+pdf_cli = AppGroup("pdf", help="Pemeliharaan cache PDF laporan.")
+
+
+@pdf_cli.command("bersihkan")
+@click.option("--hari", type=int, default=30, show_default=True, help="Hapus PDF yang lebih lama dari N hari.")
+def pdf_bersihkan(hari):
+    """Hapus file cache PDF laporan yang sudah lama tidak dibuat ulang."""
+    folder = current_app.config["LAPORAN_PDF_DIR"]
+    batas = time.time() - hari * 86400
+    terhapus = 0
+    for root, _, files in os.walk(folder):
+        for nama in files:
+            path = os.path.join(root, nama)
+            if os.path.getmtime(path) < batas:
+                os.remove(path)
+                terhapus += 1
+    click.echo(f"🧹 {terhapus} file PDF dihapus dari {folder}")
+
+
+# =============================
+# flask operasi ...
+# =============================
+operasi_cli = AppGroup("operasi", help="Pemeliharaan catatan operasi antrean offline.")
+
+
+@operasi_cli.command("bersihkan")
+@click.option("--hari", type=int, default=None, help="Hapus catatan op_id yang lebih lama dari N hari (default OPERASI_KLIEN_SIMPAN_HARI).")
+def operasi_bersihkan(hari):
+    """Hapus catatan operasi_klien lama; antrean klien lebih tua dari ini tidak lagi dijamin idempoten."""
+    from datetime import datetime, timedelta
+    from penilaiansiswa.models import OperasiKlien
+
+    hari = hari if hari is not None else current_app.config.get("OPERASI_KLIEN_SIMPAN_HARI", 30)
+    batas = datetime.utcnow() - timedelta(days=hari)
+    terhapus = OperasiKlien.query.filter(OperasiKlien.created_at < batas).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f"🧹 {terhapus} catatan operasi klien dihapus (lebih dari {hari} hari)")
+
+
+# =============================
+# flask log ...
+# =============================
+log_cli = AppGroup("log", help="Pemeliharaan tabel log_aktivitas.")
+
+
+@log_cli.command("arsip")
+@click.option("--bulan", type=int, default=None, help="Arsipkan log yang lebih lama dari N bulan (default LOG_AKTIVITAS_SIMPAN_BULAN).")
+@click.option("--chunk", type=int, default=1000, show_default=True, help="Baris per transaksi.")
+def log_arsip(bulan, chunk):
+    """Pindahkan log_aktivitas lama ke ringkasan harian (log_aktivitas_harian) lalu hapus aslinya."""
+    from penilaiansiswa.utils.log_aktivitas import batas_retensi, arsipkan_log
+
+    bulan = bulan if bulan is not None else current_app.config.get("LOG_AKTIVITAS_SIMPAN_BULAN", 6)
+    batas = batas_retensi(bulan)
+    total = arsipkan_log(batas, chunk)
+    click.echo(f"🗄️ {total} log aktivitas sebelum {batas:%Y-%m-%d} diringkas ke log_aktivitas_harian")
+
+
+@log_cli.command("muat")
+@click.option("--putar/--tanpa-putar", default=False, help="Putar file audit aktif dulu agar ikut dimuat.")
+@click.option("--batch", type=int, default=1000, show_default=True, help="Baris per INSERT.")
+def log_muat(putar, batch):
+    """Muat file audit .jsonl.gz (AUDIT_LOG_MODE=jsonl) ke log_aktivitas, lalu hapus filenya."""
+    from penilaiansiswa.logging import _get_berkas
+    from penilaiansiswa.utils.log_aktivitas import muat_berkas_jsonl
+
+    berkas = _get_berkas()
+    if putar:
+        berkas.putar()
+    total = rusak = 0
+    daftar = berkas.berkas_putaran()
+    for path in daftar:
+        n, r = muat_berkas_jsonl(path, batch)
+        total += n
+        rusak += r
+    click.echo(f"📥 {total} log aktivitas dimuat dari {len(daftar)} file ({rusak} baris rusak dilewati)")
+
+
+# =============================
+# flask siswa ...
+# =============================
+siswa_cli = AppGroup("siswa", help="Pemeliharaan data siswa.")
+
+
+@siswa_cli.command("reindex")
+@click.option("--batch", type=int, default=1000, show_default=True, help="Siswa per batch.")
+def siswa_reindex(batch):
+    """Isi ulang nama_normal & siswa_token (index pencarian /siswa/search)."""
+    from penilaiansiswa.utils.pencarian_siswa import rebuild_token_siswa
+
+    total = rebuild_token_siswa(batch)
+    db.session.commit()
+    click.echo(f"🔎 index pencarian {total} siswa diisi ulang")
+
+
+@siswa_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--kelas-id", type=int, required=True, help="Kelas tujuan.")
+def siswa_import(path, kelas_id):
+    """Tambah siswa dari roster .xlsx/.csv (kolom Nama, NISN, JK, Status) ke satu kelas."""
+    from penilaiansiswa.models import Kelas
+    from penilaiansiswa.utils.impor_siswa import baca_roster, impor_siswa_kelas
+
+    kelas = db.session.get(Kelas, kelas_id)
+    if not kelas:
+        raise click.ClickException(f"Kelas {kelas_id} tidak ditemukan")
+    try:
+        ditambahkan, ditolak = impor_siswa_kelas(kelas, baca_roster(path, path))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    for row in ditolak:
+        click.echo(f"  ❌ baris {row['baris']} (NISN {row['nisn'] or '-'}): {row['message']}")
+    click.echo(f"✅ {ditambahkan} siswa ditambahkan ke kelas {kelas.nama_kelas}, {len(ditolak)} baris ditolak")
+
+
+# =============================
+# flask sekolah ...
+# =============================
+sekolah_cli = AppGroup("sekolah", help="Master data sekolah & wilayah.")
+
+
+@sekolah_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False), default="data_sekolah.xlsx")
+@click.option("--batch", type=int, default=1000, show_default=True, help="Sekolah per INSERT/UPDATE + commit.")
+@click.option("--diff", is_flag=True, help="File lengkap data nasional: tutup sekolah yang tidak ada lagi dan laporkan tiap perubahan.")
+@click.option("--laporan", type=click.Path(dir_okay=False, writable=True), default=None, help="Tulis daftar perubahan (mode --diff) ke file CSV.")
+@click.option("--maks-tutup", type=float, default=None, help="Mode --diff: persen sekolah aktif yang boleh ditutup (default SEKOLAH_MAKS_TUTUP_PERSEN).")
+@click.option("--paksa", is_flag=True, help="Mode --diff: tetap tutup sekolah walau melebihi --maks-tutup.")
+def sekolah_import(path, batch, diff, laporan, maks_tutup, paksa):
+    """Import/perbarui sekolah dari data_sekolah.xlsx berdasarkan NPSN (aman diulang)."""
+    import csv
+    from penilaiansiswa.utils.impor_sekolah import baca_data_sekolah, impor_sekolah
+
+    try:
+        maks_tutup = maks_tutup if maks_tutup is not None else current_app.config.get("SEKOLAH_MAKS_TUTUP_PERSEN", 5)
+        ringkasan = impor_sekolah(baca_data_sekolah(path), batch, diff=diff, paksa=paksa, maks_tutup_persen=maks_tutup)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    perubahan = ringkasan.pop("perubahan")
+    if laporan:
+        with open(laporan, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["npsn", "jenis", "lama", "baru"])
+            writer.writeheader()
+            writer.writerows(perubahan)
+    for kunci, jumlah in ringkasan.items():
+        click.echo(f"  {kunci:<17} {jumlah}")
+    if ringkasan["tutup_ditahan"]:
+        raise click.ClickException(
+            f"{ringkasan['tutup_ditahan']} sekolah aktif tidak ada di file (lebih dari {maks_tutup:g}%), "
+            "tidak ada yang ditutup. Periksa kelengkapan file, lalu ulangi dengan --paksa bila memang benar."
+        )
+    click.echo(f"✅ Import {path} selesai" + (f", {len(perubahan)} perubahan ditulis ke {laporan}" if laporan else ""))
+
+
+@sekolah_cli.command("wilayah-json")
+def sekolah_wilayah_json():
+    """Bangun ulang shard JSON pohon wilayah (otomatis setelah import yang mengubah data)."""
+    from penilaiansiswa.utils.wilayah_json import bangun_shard_wilayah
+
+    manifest = bangun_shard_wilayah()
+    click.echo(f"🗺️ shard wilayah dibuat, index: {manifest['index']}")
+
+
+def register_commands(app):
+    """Daftarkan semua perintah CLI aplikasi (flask <grup> <perintah>)."""
+    app.cli.add_command(rekap_cli)
+    app.cli.add_command(pdf_cli)
+    app.cli.add_command(operasi_cli)
+    app.cli.add_command(log_cli)
+    app.cli.add_command(siswa_cli)
+    app.cli.add_command(sekolah_cli)
@@ -1,28 +1,326 @@
-from sqlalchemy import event
-from flask import g
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
 from datetime import datetime
-from app.models import LogAktivitas
+
+try:
+    import fcntl  # kunci file antar proses worker (tidak ada di Windows)
+except ImportError:
+    fcntl = None
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from flask import g, has_app_context, has_request_context, current_app
+from penilaiansiswa import db
+from penilaiansiswa.models import (
+    LogAktivitas, Provinsi, Kabupaten, Kecamatan, Sekolah, Pegawai, TahunAjaran, Kelas, Siswa, Kebiasaan
+)
+
+logger = logging.getLogger(__name__)
+
+# Model yang dicatat ke log_aktivitas secara default
+MODEL_AUDIT = [Provinsi, Kabupaten, Kecamatan, Sekolah, Pegawai, TahunAjaran, Kelas, Siswa, Kebiasaan]
+
+# Kunci buffer audit di Session.info (satu buffer per transaksi)
+KUNCI_BUFFER = "audit_buffer"
+# Event yang sudah lolos before_commit, menunggu commit berhasil (mode antrian)
+KUNCI_ANTRIAN = "audit_antrian"
+
+# Penulis latar belakang untuk AUDIT_LOG_MODE = "antrian"
+_penulis = None
+# Berkas tujuan untuk AUDIT_LOG_MODE = "jsonl"
+_berkas = None
+# True setelah register_listeners(): tanpa listener commit, buffer tidak pernah ditulis
+_aktif = False
+
+
+# =========================
+# MODE
+# =========================
+def _mode():
+    """'mati' (default), 'transaksi', 'antrian' (thread latar belakang) atau 'jsonl' (file lokal)."""
+    if not has_app_context():
+        return "transaksi"
+    return current_app.config.get("AUDIT_LOG_MODE", "mati")
+
+
+def audit_aktif():
+    """True bila event audit dicatat; jalur tulis massal memakainya untuk melewati query id."""
+    return _aktif and _mode() != "mati"
+
+
+def _user_aktif():
+    # diisi before_request oleh init_audit(); di luar request (CLI) tidak ada user
+    if has_request_context():
+        return getattr(g, "current_user_id", None)
+    return None
+
+
+# =========================
+# BUFFER PER TRANSAKSI
+# =========================
+def tambah_audit(session, aksi, tabel, entri_id=None, keterangan=None):
+    """Masukkan satu event audit ke buffer transaksi session (ditulis saat commit).
+
+    Dipakai juga oleh jalur tulis massal (INSERT/UPSERT Core) yang tidak memicu event mapper.
+    """
+    if not audit_aktif():
+        return
+    session.info.setdefault(KUNCI_BUFFER, []).append({
+        "user_id": _user_aktif(),
+        "aksi": aksi,
+        "tabel": tabel,
+        "entri_id": entri_id,
+        "keterangan": keterangan or f"{aksi} on {tabel} id={entri_id}",
+        "timestamp": datetime.utcnow(),
+    })
 
 
 def log_activity(mapper, connection, target, action):
     """
-    Catat aktivitas otomatis ke tabel LogAktivitas.
+    Catat aktivitas otomatis ke buffer audit transaksi (bukan INSERT per baris).
+    """
+    session = object_session(target)
+    if session is None:
+        return
+    tambah_audit(session, action, target.__tablename__, getattr(target, "id", None))
+
+
+def _tulis_buffer(session):
+    """before_commit: flush terakhir lalu tulis seluruh buffer sebagai satu INSERT multi-row."""
+    # event dari flush terakhir commit harus masuk buffer sebelum ditulis
+    session.flush()
+    rows = session.info.pop(KUNCI_BUFFER, [])
+    if not rows:
+        return
+    if _mode() in ("antrian", "jsonl"):
+        # diserahkan ke thread penulis / file setelah commit berhasil
+        session.info[KUNCI_ANTRIAN] = rows
+        return
+    session.connection().execute(LogAktivitas.__table__.insert(), rows)
+
+
+def _kirim_antrian(session):
+    rows = session.info.pop(KUNCI_ANTRIAN, None)
+    if not rows:
+        return
+    if _mode() == "jsonl":
+        _get_berkas().tulis(rows)
+    else:
+        _get_penulis().kirim(rows)
+
+
+def _buang_buffer(session, *args):
+    session.info.pop(KUNCI_BUFFER, None)
+    session.info.pop(KUNCI_ANTRIAN, None)
+
+
+# =========================
+# PENULIS LATAR BELAKANG (mode antrian)
+# =========================
+class PenulisAudit:
+    """Thread yang menguras antrean event audit ke database per batch.
+
+    Antrean dibatasi; bila penuh, event ditulis langsung oleh thread pemanggil
+    agar tidak ada log yang hilang. Sisa antrean ditulis saat proses berhenti.
+    """
+
+    def __init__(self, engine, maks=10000, batch=500, interval=2.0):
+        self.engine = engine
+        self.batch = batch
+        self.interval = interval
+        self.antrian = queue.Queue(maxsize=maks)
+        self._stop = threading.Event()
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _mulai(self):
+        # thread tidak ikut ter-fork: buat ulang bila dipakai di proses worker baru
+        with self._lock:
+            if not self._berjalan():
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._jalan, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def _berjalan(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def kirim(self, rows):
+        if not self._berjalan():
+            self._mulai()
+        for i, row in enumerate(rows):
+            try:
+                self.antrian.put_nowait(row)
+            except queue.Full:
+                logger.warning("Antrean audit penuh, %d event ditulis langsung", len(rows) - i)
+                self._tulis(rows[i:])
+                return
+
+    def _ambil_batch(self, timeout):
+        try:
+            rows = [self.antrian.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(rows) < self.batch:
+            try:
+                rows.append(self.antrian.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _tulis(self, rows):
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(LogAktivitas.__table__.insert(), rows)
+        except Exception:
+            logger.exception("Gagal menulis %d event audit", len(rows))
+
+    def _jalan(self):
+        while not self._stop.is_set():
+            rows = self._ambil_batch(self.interval)
+            if rows:
+                self._tulis(rows)
+
+    def berhenti(self, timeout=5):
+        """Hentikan thread lalu tulis semua event yang masih mengantre."""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        while True:
+            rows = self._ambil_batch(0)
+            if not rows:
+                break
+            self._tulis(rows)
+
+
+def _get_penulis():
+    global _penulis
+    if _penulis is None:
+        config = current_app.config
+        _penulis = PenulisAudit(
+            db.engine,
+            maks=config.get("AUDIT_ANTRIAN_MAKS", 10000),
+            batch=config.get("AUDIT_BATCH", 500),
+            interval=config.get("AUDIT_INTERVAL", 2.0),
+        )
+        atexit.register(_penulis.berhenti)
+    return _penulis
+
+
+# =========================
+# BERKAS JSONL (mode jsonl)
+# =========================
+class BerkasAudit:
+    """Tulis event audit sebagai JSON satu baris per event ke file lokal (append-only).
+
+    File aktif <folder>/audit.jsonl diputar saat ukurannya mencapai maks_bytes atau
+    saat hari (UTC) berganti: diganti nama menjadi audit-<waktu>-<pid>.jsonl lalu
+    di-gzip. File .jsonl.gz hasil putaran dimuat ke log_aktivitas dengan `flask log muat`.
+    File dibuka per penulisan dan dikunci (flock), jadi aman dipakai banyak proses worker.
     """
-    user_id = getattr(g, "current_user_id", None)  # diisi dari session/login
-    tabel = target.__tablename__
-    entri_id = getattr(target, "id", None)
-
-    connection.execute(
-        LogAktivitas.__table__.insert(),
-        {
-            "user_id": user_id,
-            "aksi": action,
-            "tabel": tabel,
-            "entri_id": entri_id,
-            "keterangan": f"{action} on {tabel} id={entri_id}",
-            "timestamp": datetime.utcnow(),
-        },
-    )
+
+    NAMA_AKTIF = "audit.jsonl"
+
+    def __init__(self, folder, maks_bytes=10 * 1024 * 1024):
+        self.folder = folder
+        self.maks_bytes = maks_bytes
+        self.path = os.path.join(folder, self.NAMA_AKTIF)
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _kunci(self, f):
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+    def tulis(self, rows):
+        baris = "".join(
+            json.dumps(row, separators=(",", ":"), default=_json_default) + "\n" for row in rows
+        )
+        try:
+            with self._lock, open(self.path + ".lock", "a") as kunci:
+                self._kunci(kunci)
+                if self._perlu_putar(hari_ini=True):
+                    self._putar()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(baris)
+                if self._perlu_putar():
+                    self._putar()
+        except OSError:
+            logger.exception("Gagal menulis %d event audit ke %s", len(rows), self.path)
+
+    def _perlu_putar(self, hari_ini=False):
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if info.st_size == 0:
+            return False
+        if hari_ini:
+            return datetime.utcfromtimestamp(info.st_mtime).date() != datetime.utcnow().date()
+        return info.st_size >= self.maks_bytes
+
+    def _putar(self):
+        tujuan = os.path.join(
+            self.folder, f"audit-{datetime.utcnow():%Y%m%d-%H%M%S%f}-{os.getpid()}.jsonl"
+        )
+        os.replace(self.path, tujuan)
+        # nama .gz baru muncul setelah lengkap, jadi `flask log muat` tidak membaca file setengah jadi
+        with open(tujuan, "rb") as src, gzip.open(tujuan + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tujuan + ".gz.tmp", tujuan + ".gz")
+        os.remove(tujuan)
+
+    def putar(self):
+        """Putar file aktif sekarang (dipakai `flask log muat --putar`)."""
+        with self._lock, open(self.path + ".lock", "a") as kunci:
+            self._kunci(kunci)
+            if os.path.exists(self.path) and os.path.getsize(self.path):
+                self._putar()
+
+    def berkas_putaran(self):
+        """Path file .jsonl.gz yang siap dimuat, terlama dulu."""
+        return sorted(
+            os.path.join(self.folder, nama) for nama in os.listdir(self.folder)
+            if nama.startswith("audit-") and nama.endswith(".jsonl.gz")
+        )
+
+
+def _json_default(nilai):
+    if isinstance(nilai, datetime):
+        return nilai.isoformat()
+    raise TypeError(f"{type(nilai).__name__} tidak bisa dijadikan JSON")
+
+
+def _get_berkas():
+    global _berkas
+    if _berkas is None:
+        config = current_app.config
+        _berkas = BerkasAudit(
+            config["AUDIT_JSONL_DIR"],
+            maks_bytes=config.get("AUDIT_JSONL_MAKS_BYTES", 10 * 1024 * 1024),
+        )
+    return _berkas
+
+
+# =========================
+# REGISTRASI
+# =========================
+def _catat_create(mapper, connection, target):
+    log_activity(mapper, connection, target, "CREATE")
+
+
+def _catat_update(mapper, connection, target):
+    log_activity(mapper, connection, target, "UPDATE")
+
+
+def _catat_delete(mapper, connection, target):
+    log_activity(mapper, connection, target, "DELETE")
 
 
 def register_listeners(models):
@@ -31,6 +329,27 @@ def register_listeners(models):
     models = [Provinsi, Kabupaten, Kecamatan, Sekolah, Pegawai, TahunAjaran, Kelas, Siswa, Kebiasaan]
     """
     for cls in models:
-        event.listen(cls, "after_insert", lambda m, c, t: log_activity(m, c, t, "CREATE"))
-        event.listen(cls, "after_update", lambda m, c, t: log_activity(m, c, t, "UPDATE"))
-        event.listen(cls, "after_delete", lambda m, c, t: log_activity(m, c, t, "DELETE"))
+        for evt, fn in (("after_insert", _catat_create), ("after_update", _catat_update), ("after_delete", _catat_delete)):
+            if not event.contains(cls, evt, fn):
+                event.listen(cls, evt, fn)
+
+    for evt, fn in (("before_commit", _tulis_buffer), ("after_commit", _kirim_antrian),
+                    ("after_rollback", _buang_buffer)):
+        if not event.contains(db.session, evt, fn):
+            event.listen(db.session, evt, fn)
+
+    global _aktif
+    _aktif = True
+
+
+def init_audit(app, models=None):
+    """Aktifkan audit log untuk app (lihat AUDIT_LOG_MODE di config)."""
+    if app.config.get("AUDIT_LOG_MODE", "mati") == "mati":
+        return
+    register_listeners(models or MODEL_AUDIT)
+
+    @app.before_request
+    def _set_user_audit():
+        from flask_login import current_user
+        user_id = current_user.get_id() if current_user else None
+        g.current_user_id = int(user_id) if user_id is not None else None
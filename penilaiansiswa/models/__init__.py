@@ -4,4 +4,7 @@ db = SQLAlchemy()
 
 from .users import User, Pegawai
 from .sekolah import Provinsi, Kabupaten, Kecamatan, Sekolah, TahunAjaran, Kelas, Siswa, Kebiasaan
-from .log import LogAktivitas
\ No newline at end of file
+from .log import LogAktivitas, LogAktivitasHarian
+from .rekap import RekapKelasBulan, RekapSiswaSemester, StatistikWilayahBulan, VersiDataKelas
+from .sinkron import OperasiKlien
+from .pencarian import SiswaToken
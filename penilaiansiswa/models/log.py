@@ -12,4 +12,28 @@ class LogAktivitas(db.Model):
     tabel = db.Column(db.String(50))
     entri_id = db.Column(db.Integer)  # ID dari entri yg dimodifikasi
     keterangan = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_log_aktivitas_tabel_entri", "tabel", "entri_id"),  # riwayat satu entri
+        db.Index("ix_log_aktivitas_user_waktu", "user_id", "timestamp"),  # aktivitas satu user
+        db.Index("ix_log_aktivitas_timestamp", "timestamp"),  # browse terbaru & retensi
+    )
+
+
+class LogAktivitasHarian(db.Model):
+    """Ringkasan harian log_aktivitas yang sudah melewati masa simpan (flask log arsip).
+
+    user_id = 0 untuk aktivitas tanpa user (CLI / sistem).
+    """
+    __tablename__ = "log_aktivitas_harian"
+    id = db.Column(db.Integer, primary_key=True)
+    tanggal = db.Column(db.Date, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, default=0)
+    tabel = db.Column(db.String(50), nullable=False, default="")
+    aksi = db.Column(db.String(50), nullable=False, default="")
+    jumlah = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint("tanggal", "user_id", "tabel", "aksi", name="uq_log_aktivitas_harian"),
+    )
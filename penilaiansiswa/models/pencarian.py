@@ -0,0 +1,12 @@
+from penilaiansiswa import db
+
+
+class SiswaToken(db.Model):
+    """Satu kata nama siswa (hasil utils.teks.token_nama) untuk pencarian prefix per kata.
+
+    Diisi otomatis oleh event Siswa di utils/pencarian_siswa.py; isi ulang dengan
+    `flask siswa reindex`.
+    """
+    __tablename__ = "siswa_token"
+    token = db.Column(db.String(50), primary_key=True)
+    siswa_id = db.Column(db.Integer, db.ForeignKey("siswa.id", ondelete="CASCADE"), primary_key=True, index=True)
@@ -0,0 +1,140 @@
+from datetime import datetime
+from penilaiansiswa import db
+
+
+# =============================================================
+# Rekap Terhitung (materialized) - diperbarui inkremental
+# =============================================================
+class RekapKelasBulan(db.Model):
+    """Jumlah siswa terbiasa per kebiasaan untuk satu kelas, bulan dan jenis kelamin.
+
+    "Belum" tidak disimpan: dihitung dari jumlah siswa di kelas dikurangi terbiasa,
+    karena siswa yang belum dinilai juga dihitung belum terbiasa.
+    """
+    __tablename__ = "rekap_kelas_bulan"
+    id = db.Column(db.Integer, primary_key=True)
+    kelas_id = db.Column(db.Integer, db.ForeignKey("kelas.id"), nullable=False)
+    bulan = db.Column(db.String(7), nullable=False)  # format YYYY-MM
+    jenis_kelamin = db.Column(db.String(1), nullable=False)  # 'L' / 'P'
+
+    jumlah_terisi = db.Column(db.Integer, nullable=False, default=0)  # siswa yang sudah dinilai
+    terbiasa_semua = db.Column(db.Integer, nullable=False, default=0)  # ketujuh kebiasaan >= 20
+
+    # Jumlah siswa terbiasa per kebiasaan
+    bangun_pagi_terbiasa = db.Column(db.Integer, nullable=False, default=0)
+    beribadah_terbiasa = db.Column(db.Integer, nullable=False, default=0)
+    berolahraga_terbiasa = db.Column(db.Integer, nullable=False, default=0)
+    sehat_dan_lemar_terbiasa = db.Column(db.Integer, nullable=False, default=0)
+    belajar_terbiasa = db.Column(db.Integer, nullable=False, default=0)
+    bermasyarakat_terbiasa = db.Column(db.Integer, nullable=False, default=0)
+    tidur_cepat_terbiasa = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("kelas_id", "bulan", "jenis_kelamin", name="uq_rekap_kelas_bulan_jk"),
+    )
+
+
+class RekapSiswaSemester(db.Model):
+    """Agregat nilai satu siswa dalam satu semester, dipakai rapor per siswa.
+
+    Per kebiasaan: jumlah nilai, banyak bulan terisi (nilai > 0), nilai minimum,
+    rata-rata bulan terisi dan status terbiasa (rata-rata >= 20).
+    """
+    __tablename__ = "rekap_siswa_semester"
+    id = db.Column(db.Integer, primary_key=True)
+    siswa_id = db.Column(db.Integer, db.ForeignKey("siswa.id"), nullable=False)
+    kelas_id = db.Column(db.Integer, db.ForeignKey("kelas.id"), nullable=False)
+    tahun_ajaran = db.Column(db.String(20), nullable=False)  # contoh: 2025/2026
+    semester = db.Column(db.String(10), nullable=False)  # ganjil / genap
+
+    bangun_pagi_jumlah = db.Column(db.Integer, nullable=False, default=0)
+    bangun_pagi_terisi = db.Column(db.Integer, nullable=False, default=0)
+    bangun_pagi_min = db.Column(db.Integer)
+    bangun_pagi_rata = db.Column(db.Float, nullable=False, default=0)
+    bangun_pagi_terbiasa = db.Column(db.Boolean, nullable=False, default=False)
+
+    beribadah_jumlah = db.Column(db.Integer, nullable=False, default=0)
+    beribadah_terisi = db.Column(db.Integer, nullable=False, default=0)
+    beribadah_min = db.Column(db.Integer)
+    beribadah_rata = db.Column(db.Float, nullable=False, default=0)
+    beribadah_terbiasa = db.Column(db.Boolean, nullable=False, default=False)
+
+    berolahraga_jumlah = db.Column(db.Integer, nullable=False, default=0)
+    berolahraga_terisi = db.Column(db.Integer, nullable=False, default=0)
+    berolahraga_min = db.Column(db.Integer)
+    berolahraga_rata = db.Column(db.Float, nullable=False, default=0)
+    berolahraga_terbiasa = db.Column(db.Boolean, nullable=False, default=False)
+
+    sehat_dan_lemar_jumlah = db.Column(db.Integer, nullable=False, default=0)
+    sehat_dan_lemar_terisi = db.Column(db.Integer, nullable=False, default=0)
+    sehat_dan_lemar_min = db.Column(db.Integer)
+    sehat_dan_lemar_rata = db.Column(db.Float, nullable=False, default=0)
+    sehat_dan_lemar_terbiasa = db.Column(db.Boolean, nullable=False, default=False)
+
+    belajar_jumlah = db.Column(db.Integer, nullable=False, default=0)
+    belajar_terisi = db.Column(db.Integer, nullable=False, default=0)
+    belajar_min = db.Column(db.Integer)
+    belajar_rata = db.Column(db.Float, nullable=False, default=0)
+    belajar_terbiasa = db.Column(db.Boolean, nullable=False, default=False)
+
+    bermasyarakat_jumlah = db.Column(db.Integer, nullable=False, default=0)
+    bermasyarakat_terisi = db.Column(db.Integer, nullable=False, default=0)
+    bermasyarakat_min = db.Column(db.Integer)
+    bermasyarakat_rata = db.Column(db.Float, nullable=False, default=0)
+    bermasyarakat_terbiasa = db.Column(db.Boolean, nullable=False, default=False)
+
+    tidur_cepat_jumlah = db.Column(db.Integer, nullable=False, default=0)
+    tidur_cepat_terisi = db.Column(db.Integer, nullable=False, default=0)
+    tidur_cepat_min = db.Column(db.Integer)
+    tidur_cepat_rata = db.Column(db.Float, nullable=False, default=0)
+    tidur_cepat_terbiasa = db.Column(db.Boolean, nullable=False, default=False)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("siswa_id", "kelas_id", "tahun_ajaran", "semester", name="uq_rekap_siswa_semester"),
+    )
+
+
+class StatistikWilayahBulan(db.Model):
+    """Kubus statistik: jumlah & banyak nilai satu kebiasaan per wilayah per bulan.
+
+    level: 'provinsi' / 'kabupaten' / 'kecamatan' / 'sekolah', wilayah_id = id
+    baris di tabel level tersebut. Rata-rata = jumlah / banyak (nilai NULL tidak dihitung).
+    """
+    __tablename__ = "statistik_wilayah_bulan"
+    id = db.Column(db.Integer, primary_key=True)
+    level = db.Column(db.String(10), nullable=False)
+    wilayah_id = db.Column(db.Integer, nullable=False)
+    bulan = db.Column(db.String(7), nullable=False)  # format YYYY-MM
+    field = db.Column(db.String(30), nullable=False)  # nama kolom kebiasaan
+
+    jumlah = db.Column(db.BigInteger, nullable=False, default=0)  # total nilai
+    banyak = db.Column(db.Integer, nullable=False, default=0)  # banyak nilai terisi
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("level", "wilayah_id", "bulan", "field", name="uq_statistik_wilayah_bulan"),
+    )
+
+
+class VersiDataKelas(db.Model):
+    """Penghitung versi data satu kelas, dipakai sebagai ETag endpoint grid.
+
+    bulan = 'YYYY-MM' untuk nilai kebiasaan bulan itu, bulan = '' untuk daftar siswa kelas.
+    Naik di transaksi yang sama dengan perubahan datanya (lihat utils/versi_data.py).
+    """
+    __tablename__ = "versi_data_kelas"
+    id = db.Column(db.Integer, primary_key=True)
+    kelas_id = db.Column(db.Integer, nullable=False)
+    bulan = db.Column(db.String(7), nullable=False, default="")
+    versi = db.Column(db.Integer, nullable=False, default=1)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("kelas_id", "bulan", name="uq_versi_data_kelas"),
+    )
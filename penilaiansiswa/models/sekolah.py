@@ -35,6 +35,8 @@ class Sekolah(db.Model, LogMixin):
     nama_sekolah = db.Column(db.String(100), nullable=False)
     npsn = db.Column(db.String(50), unique=True)
     jenjang = db.Column(db.String(20))
+    hash_konten = db.Column(db.String(40))  # sha1 baris data_sekolah.xlsx terakhir (flask sekolah import)
+    aktif = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())  # False = tidak ada lagi di data nasional
 
     pegawai = db.relationship("Pegawai", back_populates="sekolah")
     tahun_ajaran = db.relationship("TahunAjaran", back_populates="sekolah")
@@ -87,6 +89,7 @@ class Siswa(db.Model, LogMixin):
     __tablename__ = "siswa"
     id = db.Column(db.Integer, primary_key=True)
     nama_siswa = db.Column(db.String(100), nullable=False)
+    nama_normal = db.Column(db.String(100), index=True)  # huruf kecil tanpa tanda baca, diisi otomatis
     nisn = db.Column(db.String(20), unique=False, nullable=False)  # ✅ TAMBAH INI
     jenis_kelamin = db.Column(db.Enum('L', 'P'), nullable=False)
     status = db.Column(db.String(20), default='Aktif')
@@ -101,7 +104,7 @@ class Kebiasaan(db.Model, LogMixin):
     id = db.Column(db.Integer, primary_key=True)
     siswa_id = db.Column(db.Integer, db.ForeignKey("siswa.id"))
     kelas_id = db.Column(db.Integer, db.ForeignKey("kelas.id"))
-    bulan = db.Column(db.String(7), nullable=False)  # format YYYY-MM
+    bulan = db.Column(db.String(7), nullable=False, index=True)  # format YYYY-MM
 
     # Nilai 7 kebiasaan
     bangun_pagi = db.Column(db.Integer)
@@ -114,9 +117,17 @@ class Kebiasaan(db.Model, LogMixin):
 
     catatan = db.Column(db.Text)
 
+    # Naik setiap kali baris ditulis, dipakai cek konflik pada /penilaian/kebiasaan/sync
+    versi = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
     siswa = db.relationship("Siswa", backref="kebiasaan_list")
     kelas = db.relationship("Kelas")
 
+    # Satu baris per siswa/kelas/bulan, ditulis dengan upsert (lihat utils/kebiasaan_simpan.py)
+    __table_args__ = (
+        db.UniqueConstraint("siswa_id", "kelas_id", "bulan", name="uq_kebiasaan_siswa_kelas_bulan"),
+    )
+
 
 # ====================== RIWAYAT PEGAWAI SEKOLAH ===========================
 class PegawaiSekolahHistory(db.Model, LogMixin):
@@ -0,0 +1,20 @@
+from datetime import datetime
+from penilaiansiswa import db
+
+
+class OperasiKlien(db.Model):
+    """Operasi antrean offline yang sudah diproses (lihat /penilaian/kebiasaan/replay).
+
+    op_id dibuat klien; replay ulang dengan op_id yang sama dilewati.
+    """
+    __tablename__ = "operasi_klien"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    op_id = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # diterapkan / ditolak
+    keterangan = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "op_id", name="uq_operasi_klien_user_op"),
+    )
@@ -2,7 +2,9 @@ from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import func
 from penilaiansiswa import db
+from sqlalchemy.exc import IntegrityError
 from penilaiansiswa.models import Kelas, TahunAjaran, Pegawai
+from penilaiansiswa.utils.kenaikan import MODE_KENAIKAN, siapkan_kelas_tujuan, naikkan_kelas
 
 kelas_bp = Blueprint("kelas", __name__, url_prefix="/kelas")
 
@@ -119,3 +121,93 @@ def edit_kelas(id):
             }
         }
     })
+
+
+@kelas_bp.route("/naik", methods=["POST"])
+@login_required
+def naik_kelas():
+    """Kenaikan kelas: salin seluruh siswa aktif satu/lebih kelas ke kelas baru di tahun ajaran lain.
+
+    JSON: {"tahun_ajaran_id": <tujuan, default tahun ajaran aktif>, "mode": "salin"/"pindah",
+           "kelas": [{"kelas_id": <kelas lama>, "nama_kelas": <kelas baru>, "wali_kelas_id": <opsional>}]}
+    Kelas tujuan yang belum ada dibuat. Baris siswa lama tidak dihapus.
+    """
+    pegawai = current_user.pegawai
+    if not pegawai:
+        return jsonify({"success": False, "message": "Pegawai tidak ditemukan."}), 400
+
+    data = request.get_json(silent=True) or {}
+    mode = data.get("mode") or "salin"
+    if mode not in MODE_KENAIKAN:
+        return jsonify({"success": False, "message": "Mode harus salin atau pindah."}), 400
+
+    try:
+        pasangan = [
+            {
+                "kelas_id": int(item["kelas_id"]),
+                "nama_kelas": (item.get("nama_kelas") or "").strip(),
+                "wali_kelas_id": int(item["wali_kelas_id"]) if item.get("wali_kelas_id") else None
+            }
+            for item in data.get("kelas") or []
+        ]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"success": False, "message": "Daftar kelas tidak valid."}), 400
+    if not pasangan or any(not p["nama_kelas"] for p in pasangan):
+        return jsonify({"success": False, "message": "Kelas lama dan nama kelas baru wajib diisi."}), 400
+    if len({p["kelas_id"] for p in pasangan}) != len(pasangan):
+        return jsonify({"success": False, "message": "Kelas lama tidak boleh ganda."}), 400
+
+    if data.get("tahun_ajaran_id"):
+        tahun_ajaran = db.session.get(TahunAjaran, data.get("tahun_ajaran_id"))
+    else:
+        tahun_ajaran = TahunAjaran.query.filter_by(sekolah_id=pegawai.sekolah_id, aktif=True).first()
+    if not tahun_ajaran or tahun_ajaran.sekolah_id != pegawai.sekolah_id:
+        return jsonify({"success": False, "message": "Tahun ajaran tujuan tidak ditemukan."}), 404
+
+    # kelas lama & wali kelas baru harus dari sekolah yang sama, masing-masing satu query
+    kelas_lama = {
+        k.id: k for k in Kelas.query.filter(
+            Kelas.id.in_([p["kelas_id"] for p in pasangan]),
+            Kelas.sekolah_id == pegawai.sekolah_id
+        )
+    }
+    if len(kelas_lama) != len(pasangan):
+        return jsonify({"success": False, "message": "Kelas lama tidak ditemukan di sekolah Anda."}), 404
+    if any(k.tahun_ajaran_id == tahun_ajaran.id for k in kelas_lama.values()):
+        return jsonify({"success": False, "message": "Tahun ajaran tujuan harus berbeda dari tahun ajaran kelas lama."}), 400
+    wali_ids = {p["wali_kelas_id"] for p in pasangan if p["wali_kelas_id"]}
+    if wali_ids and Pegawai.query.filter(
+        Pegawai.id.in_(wali_ids), Pegawai.sekolah_id == pegawai.sekolah_id
+    ).count() != len(wali_ids):
+        return jsonify({"success": False, "message": "Wali kelas tidak ditemukan di sekolah Anda."}), 404
+
+    try:
+        for p in pasangan:
+            p["kelas"] = kelas_lama[p["kelas_id"]]
+        tujuan = siapkan_kelas_tujuan(pasangan, tahun_ajaran, pegawai.id)
+        disalin, dilewati = naikkan_kelas(
+            {lama_id: kelas.id for lama_id, (kelas, _) in tujuan.items()}, tahun_ajaran, mode
+        )
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": f"{e}. Perbaiki data siswa kelas lama terlebih dahulu."}), 409
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"success": False, "message": "Ada NISN ganda di kelas tujuan, periksa data siswa kelas lama."}), 409
+
+    return jsonify({
+        "success": True,
+        "message": f"{sum(disalin.values())} siswa dinaikkan, {dilewati} dilewati (NISN sudah terdaftar di tahun ajaran tujuan).",
+        "kelas": [
+            {
+                "kelas_lama_id": lama_id,
+                "kelas_id": kelas.id,
+                "nama_kelas": kelas.nama_kelas,
+                "baru": dibuat,
+                "jumlah_siswa": disalin.get(kelas.id, 0)
+            }
+            for lama_id, (kelas, dibuat) in tujuan.items()
+        ],
+        "dilewati": dilewati
+    })
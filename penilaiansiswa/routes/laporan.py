@@ -1,11 +1,16 @@
-from flask import Blueprint, jsonify, request, render_template, abort
+from flask import Blueprint, jsonify, request, render_template, abort, Response, stream_template
 from flask_login import login_required, current_user
-from penilaiansiswa.models import TahunAjaran, Kelas, Kebiasaan, Siswa, Pegawai, Sekolah, Provinsi, Kabupaten, Kecamatan
+from penilaiansiswa.models import TahunAjaran, Kelas, Siswa, RekapSiswaSemester
 from penilaiansiswa.routes.tahun_ajaran_routes import extract_years_from_ta, get_kelas_for_current_user, generate_bulan_list_for_semester
-from penilaiansiswa import db
 from datetime import datetime
 import traceback
 from penilaiansiswa.utils.kebiasaan_labels import get_field_labels
+from penilaiansiswa.utils.rekap import (
+    KEBIASAAN_FIELDS, load_nilai_kelas, hitung_rekap_bulan, rekap_kelas_periode, rekap_bulan_tersimpan,
+    hitung_agregat_siswa, agregat_dari_rekap
+)
+from penilaiansiswa.utils.header_laporan import get_header_laporan
+from penilaiansiswa.utils.pdf_laporan import respon_laporan
 
 laporan_bp = Blueprint("laporan", __name__, url_prefix="/laporan")
 
@@ -55,117 +60,36 @@ def laporan_rchk(kelas_id, bulan):
         if not hasattr(current_user, 'pegawai') or kelas.wali_kelas_id != current_user.pegawai.id:
             abort(403, description="Anda bukan wali kelas dari kelas ini")
 
-        tahun_ajaran = TahunAjaran.query.get(kelas.tahun_ajaran_id)
-        sekolah = Sekolah.query.get(kelas.sekolah_id)
-        kepala_sekolah = Pegawai.query.get(tahun_ajaran.kepala_sekolah_id) if tahun_ajaran else None
-        wali_kelas = Pegawai.query.get(kelas.wali_kelas_id)
+        header = get_header_laporan(kelas.id)
+        tahun_ajaran = header["tahun_ajaran"]
 
-        kecamatan = Kecamatan.query.get(sekolah.kecamatan_id) if sekolah else None
-        kabupaten = Kabupaten.query.get(kecamatan.kabupaten_id) if kecamatan else None
-        provinsi = Provinsi.query.get(kabupaten.provinsi_id) if kabupaten else None
-
-        siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
-
-        kebiasaan_fields = [
-            'bangun_pagi', 'beribadah', 'berolahraga',
-            'sehat_dan_lemar', 'belajar', 'bermasyarakat', 'tidur_cepat'
-        ]
         field_labels = get_field_labels()
 
-        jml_perempuan = sum(1 for s in siswa_list if s.jenis_kelamin == 'P')
-        jml_laki = sum(1 for s in siswa_list if s.jenis_kelamin == 'L')
-
-        terbiasa_perempuan = 0
-        terbiasa_laki = 0
-
-        rekap_umum = {field: {'terbiasa': 0, 'belum': 0} for field in kebiasaan_fields}
-        rekap_jk = {
-            'P': {field: {'terbiasa': 0, 'belum': 0} for field in kebiasaan_fields},
-            'L': {field: {'terbiasa': 0, 'belum': 0} for field in kebiasaan_fields}
-        }
-
-        for siswa in siswa_list:
-            kebiasaan = Kebiasaan.query.filter_by(
-                siswa_id=siswa.id,
-                kelas_id=kelas.id,
-                bulan=bulan
-            ).first()
-
-            nilai_kebiasaan = []
-            for field in kebiasaan_fields:
-                nilai = getattr(kebiasaan, field, 0) if kebiasaan else 0
-                nilai = nilai or 0
-                nilai_kebiasaan.append(nilai)
-
-                if nilai >= 20:
-                    rekap_umum[field]['terbiasa'] += 1
-                    rekap_jk[siswa.jenis_kelamin][field]['terbiasa'] += 1
-                else:
-                    rekap_umum[field]['belum'] += 1
-                    rekap_jk[siswa.jenis_kelamin][field]['belum'] += 1
-
-            # LOGIKA TERBIASA: semua 7 nilai >= 20
-            if all(nilai >= 20 for nilai in nilai_kebiasaan):
-                if siswa.jenis_kelamin == 'P':
-                    terbiasa_perempuan += 1
-                elif siswa.jenis_kelamin == 'L':
-                    terbiasa_laki += 1
-
-        total_siswa = len(siswa_list)
-        total_terbiasa = terbiasa_perempuan + terbiasa_laki
-
-        # Tambahkan prosentase ke rekap umum
-        for field in kebiasaan_fields:
-            total_field = rekap_umum[field]['terbiasa'] + rekap_umum[field]['belum']
-            if total_field > 0:
-                rekap_umum[field]['terbiasa_pct'] = round((rekap_umum[field]['terbiasa'] / total_field) * 100, 2)
-                rekap_umum[field]['belum_pct'] = round((rekap_umum[field]['belum'] / total_field) * 100, 2)
-            else:
-                rekap_umum[field]['terbiasa_pct'] = 0.0
-                rekap_umum[field]['belum_pct'] = 0.0
-
-        # Tambahkan prosentase ke rekap per jenis kelamin
-        for jk in ['P', 'L']:
-            for field in kebiasaan_fields:
-                total_field = rekap_jk[jk][field]['terbiasa'] + rekap_jk[jk][field]['belum']
-                if total_field > 0:
-                    rekap_jk[jk][field]['terbiasa_pct'] = round((rekap_jk[jk][field]['terbiasa'] / total_field) * 100, 2)
-                    rekap_jk[jk][field]['belum_pct'] = round((rekap_jk[jk][field]['belum'] / total_field) * 100, 2)
-                else:
-                    rekap_jk[jk][field]['terbiasa_pct'] = 0.0
-                    rekap_jk[jk][field]['belum_pct'] = 0.0
+        # Pakai rekap yang sudah terhitung; jika belum ada, hitung dari nilai mentah
+        rekap = rekap_bulan_tersimpan(kelas.id, bulan)
+        if rekap is None:
+            siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
+            matrix = load_nilai_kelas(kelas.id, [bulan])
+            rekap = hitung_rekap_bulan(siswa_list, matrix, bulan)
 
         data = {
-            'tahun_ajaran': tahun_ajaran.tahun_ajaran if tahun_ajaran else '',
-            'sekolah': {
-                'nama': sekolah.nama_sekolah if sekolah else '',
-                'npsn': sekolah.npsn if sekolah else '',
-                'kecamatan': kecamatan.nama if kecamatan else '',
-                'kabupaten': kabupaten.nama if kabupaten else '',
-                'provinsi': provinsi.nama if provinsi else ''
-            },
-            'kepala_sekolah': {
-                'nama': kepala_sekolah.nama if kepala_sekolah else '',
-                'nip': kepala_sekolah.nip if kepala_sekolah else ''
-            } if kepala_sekolah else {'nama': '', 'nip': ''},
-            'wali_kelas': {
-                'nama': wali_kelas.nama if wali_kelas else '',
-                'nip': wali_kelas.nip if wali_kelas else ''
-            } if wali_kelas else {'nama': '', 'nip': ''},
-            'rekap_siswa': {
-                'perempuan': {'total': jml_perempuan, 'terbiasa': terbiasa_perempuan, 'belum': jml_perempuan - terbiasa_perempuan},
-                'laki': {'total': jml_laki, 'terbiasa': terbiasa_laki, 'belum': jml_laki - terbiasa_laki},
-                'total': {'total': total_siswa, 'terbiasa': total_terbiasa, 'belum': total_siswa - total_terbiasa}
-            },
-            'rekap_umum': rekap_umum,
-            'rekap_jk': rekap_jk,
+            'tahun_ajaran': tahun_ajaran['tahun_ajaran'] if tahun_ajaran else '',
+            'sekolah': header['sekolah'],
+            'kepala_sekolah': header['kepala_sekolah'],
+            'wali_kelas': header['wali_kelas'],
+            'rekap_siswa': rekap['rekap_siswa'],
+            'rekap_umum': rekap['rekap_umum'],
+            'rekap_jk': rekap['rekap_jk'],
             'bulan': bulan,
             'nama_kelas': kelas.nama_kelas,
             'kelas_id': kelas_id,
             'field_labels': field_labels
         }
 
-        return render_template("laporan/rchk.html", data=data, now=datetime.now())
+        return respon_laporan(
+            "laporan/rchk.html", f"RCHK_{kelas.nama_kelas}_{bulan}.pdf",
+            data, now=datetime.now()
+        )
 
     except Exception as e:
         print(f"ERROR REPORT RCHK: {e}")
@@ -183,19 +107,9 @@ def laporan_semester(kelas_id, tahun_ajaran_id):
             abort(403, description="Anda bukan wali kelas dari kelas ini")
 
         tahun_ajaran = TahunAjaran.query.get_or_404(tahun_ajaran_id)
-        sekolah = Sekolah.query.get(kelas.sekolah_id)
-        kepala_sekolah = Pegawai.query.get(tahun_ajaran.kepala_sekolah_id) if tahun_ajaran else None
-        wali_kelas = Pegawai.query.get(kelas.wali_kelas_id)
-
-        kecamatan = Kecamatan.query.get(sekolah.kecamatan_id) if sekolah else None
-        kabupaten = Kabupaten.query.get(kecamatan.kabupaten_id) if kecamatan else None
-        provinsi = Provinsi.query.get(kabupaten.provinsi_id) if kabupaten else None
+        header = get_header_laporan(kelas.id, tahun_ajaran.id)
 
         # Label field kebiasaan
-        kebiasaan_fields = [
-            "bangun_pagi", "beribadah", "berolahraga",
-            "sehat_dan_lemar", "belajar", "bermasyarakat", "tidur_cepat"
-        ]
         field_labels = get_field_labels()
 
         # Tentukan semester - konversi format tampilan
@@ -213,101 +127,27 @@ def laporan_semester(kelas_id, tahun_ajaran_id):
         # Daftar siswa
         siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
 
-        jml_perempuan = sum(1 for s in siswa_list if s.jenis_kelamin == "P")
-        jml_laki = sum(1 for s in siswa_list if s.jenis_kelamin == "L")
-        terbiasa_perempuan = 0
-        terbiasa_laki = 0
-
-        rekap_umum = {field: {"terbiasa": 0, "belum": 0} for field in kebiasaan_fields}
-        rekap_jk = {
-            "P": {field: {"terbiasa": 0, "belum": 0} for field in kebiasaan_fields},
-            "L": {field: {"terbiasa": 0, "belum": 0} for field in kebiasaan_fields},
-        }
-
-        for siswa in siswa_list:
-            semua_field_terbiasa = True
-            for field in kebiasaan_fields:
-                field_terbiasa = True
-                for bulan in bulan_list:
-                    kebiasaan = Kebiasaan.query.filter_by(
-                        siswa_id=siswa.id,
-                        kelas_id=kelas.id,
-                        bulan=bulan
-                    ).first()
-                    nilai = getattr(kebiasaan, field, 0) if kebiasaan else 0
-                    if nilai < 20:  # ambang batas
-                        field_terbiasa = False
-                        break
-
-                if field_terbiasa:
-                    rekap_umum[field]["terbiasa"] += 1
-                    rekap_jk[siswa.jenis_kelamin][field]["terbiasa"] += 1
-                else:
-                    rekap_umum[field]["belum"] += 1
-                    rekap_jk[siswa.jenis_kelamin][field]["belum"] += 1
-                    semua_field_terbiasa = False
-
-            if semua_field_terbiasa:
-                if siswa.jenis_kelamin == "P":
-                    terbiasa_perempuan += 1
-                elif siswa.jenis_kelamin == "L":
-                    terbiasa_laki += 1
-
-        total_siswa = len(siswa_list)
-        total_terbiasa = terbiasa_perempuan + terbiasa_laki
-
-        # Hitung prosentase rekap umum
-        for field in kebiasaan_fields:
-            total_field = rekap_umum[field]["terbiasa"] + rekap_umum[field]["belum"]
-            if total_field > 0:
-                rekap_umum[field]["terbiasa_pct"] = round((rekap_umum[field]["terbiasa"] / total_field) * 100, 2)
-                rekap_umum[field]["belum_pct"] = round((rekap_umum[field]["belum"] / total_field) * 100, 2)
-            else:
-                rekap_umum[field]["terbiasa_pct"] = 0.0
-                rekap_umum[field]["belum_pct"] = 0.0
-
-        # Hitung prosentase per jenis kelamin
-        for jk in ["P", "L"]:
-            for field in kebiasaan_fields:
-                total_field = rekap_jk[jk][field]["terbiasa"] + rekap_jk[jk][field]["belum"]
-                if total_field > 0:
-                    rekap_jk[jk][field]["terbiasa_pct"] = round((rekap_jk[jk][field]["terbiasa"] / total_field) * 100, 2)
-                    rekap_jk[jk][field]["belum_pct"] = round((rekap_jk[jk][field]["belum"] / total_field) * 100, 2)
-                else:
-                    rekap_jk[jk][field]["terbiasa_pct"] = 0.0
-                    rekap_jk[jk][field]["belum_pct"] = 0.0
+        # Semua nilai semester dimuat sekaligus, aturan "setiap bulan >= 20" dihitung di memori
+        rekap = rekap_kelas_periode(kelas.id, siswa_list, bulan_list)
 
         data = {
             "tahun_ajaran": tahun_ajaran.tahun_ajaran if tahun_ajaran else "",
             "semester": semester,
-            "sekolah": {
-                "nama": sekolah.nama_sekolah if sekolah else "",
-                "npsn": sekolah.npsn if sekolah else "",
-                "kecamatan": kecamatan.nama if kecamatan else "",
-                "kabupaten": kabupaten.nama if kabupaten else "",
-                "provinsi": provinsi.nama if provinsi else ""
-            },
-            "kepala_sekolah": {
-                "nama": kepala_sekolah.nama if kepala_sekolah else "",
-                "nip": kepala_sekolah.nip if kepala_sekolah else ""
-            } if kepala_sekolah else {"nama": "", "nip": ""},
-            "wali_kelas": {
-                "nama": wali_kelas.nama if wali_kelas else "",
-                "nip": wali_kelas.nip if wali_kelas else ""
-            } if wali_kelas else {"nama": "", "nip": ""},
-            "rekap_siswa": {
-                "perempuan": {"total": jml_perempuan, "terbiasa": terbiasa_perempuan, "belum": jml_perempuan - terbiasa_perempuan},
-                "laki": {"total": jml_laki, "terbiasa": terbiasa_laki, "belum": jml_laki - terbiasa_laki},
-                "total": {"total": total_siswa, "terbiasa": total_terbiasa, "belum": total_siswa - total_terbiasa}
-            },
-            "rekap_umum_semester": rekap_umum,
-            "rekap_jk_semester": rekap_jk,
+            "sekolah": header["sekolah"],
+            "kepala_sekolah": header["kepala_sekolah"],
+            "wali_kelas": header["wali_kelas"],
+            "rekap_siswa": rekap["rekap_siswa"],
+            "rekap_umum_semester": rekap["rekap_umum"],
+            "rekap_jk_semester": rekap["rekap_jk"],
             "nama_kelas": kelas.nama_kelas,
             "kelas_id": kelas_id,
             "field_labels": field_labels
         }
 
-        return render_template("laporan/laporan_semester.html", data=data, now=datetime.now())
+        return respon_laporan(
+            "laporan/laporan_semester.html", f"RCHK_Semester_{kelas.nama_kelas}.pdf",
+            data, now=datetime.now()
+        )
 
     except Exception as e:
         print("ERROR REPORT SEMESTER:", e)
@@ -364,28 +204,19 @@ def laporan_penilaian(kelas_id, bulan):
         except:
             bulan_label = bulan
 
-        # Data sekolah dan tahun ajaran
-        tahun_ajaran = TahunAjaran.query.get(kelas.tahun_ajaran_id)
-        sekolah = Sekolah.query.get(kelas.sekolah_id)
-        wali_kelas = Pegawai.query.get(kelas.wali_kelas_id)
-        kepala_sekolah = Pegawai.query.get(tahun_ajaran.kepala_sekolah_id) if tahun_ajaran else None
-
-        # Data kecamatan, kabupaten, provinsi
-        kecamatan = Kecamatan.query.get(sekolah.kecamatan_id) if sekolah else None
-        kabupaten = Kabupaten.query.get(kecamatan.kabupaten_id) if kecamatan else None
-        provinsi = Provinsi.query.get(kabupaten.provinsi_id) if kabupaten else None
+        # Data sekolah, wilayah, kepala sekolah dan wali kelas (cached)
+        header = get_header_laporan(kelas.id)
+        tahun_ajaran = header["tahun_ajaran"]
 
         # Data siswa dengan nilai
         siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
         
+        matrix = load_nilai_kelas(kelas.id, [bulan])
+
         siswa_with_nilai = []
         for siswa in siswa_list:
-            kebiasaan = Kebiasaan.query.filter_by(
-                siswa_id=siswa.id,
-                kelas_id=kelas.id,
-                bulan=bulan
-            ).first()
-            
+            kebiasaan = matrix.get(siswa.id, {}).get(bulan)
+
             # Konversi jenis kelamin ke format yang lebih readable
             jk_map = {'L': 'Laki-laki', 'P': 'Perempuan'}
             jenis_kelamin = jk_map.get(siswa.jenis_kelamin, siswa.jenis_kelamin)
@@ -394,16 +225,7 @@ def laporan_penilaian(kelas_id, bulan):
                 'id': siswa.id,
                 'nama_siswa': siswa.nama_siswa,
                 'jenis_kelamin': jenis_kelamin,
-                'nilai': {
-                    'bangun_pagi': getattr(kebiasaan, 'bangun_pagi', None),
-                    'beribadah': getattr(kebiasaan, 'beribadah', None),
-                    'berolahraga': getattr(kebiasaan, 'berolahraga', None),
-                    'sehat_dan_lemar': getattr(kebiasaan, 'sehat_dan_lemar', None),
-                    'belajar': getattr(kebiasaan, 'belajar', None),
-                    'bermasyarakat': getattr(kebiasaan, 'bermasyarakat', None),
-                    'tidur_cepat': getattr(kebiasaan, 'tidur_cepat', None),
-                    'catatan': getattr(kebiasaan, 'catatan', '')
-                } if kebiasaan else {}
+                'nilai': dict(kebiasaan) if kebiasaan else {}
             }
             siswa_with_nilai.append(siswa_data)
 
@@ -413,24 +235,12 @@ def laporan_penilaian(kelas_id, bulan):
                 'nama_kelas': kelas.nama_kelas
             },
             'tahun_ajaran': {
-                'tahun_ajaran': tahun_ajaran.tahun_ajaran if tahun_ajaran else '',
-                'semester': tahun_ajaran.semester if tahun_ajaran else ''
-            },
-            'sekolah': {
-                'nama_sekolah': sekolah.nama_sekolah if sekolah else '',
-                'npsn': sekolah.npsn if sekolah else '',
-                'kecamatan': kecamatan.nama if kecamatan else '',
-                'kabupaten': kabupaten.nama if kabupaten else '',
-                'provinsi': provinsi.nama if provinsi else ''
-            },
-            'kepala_sekolah': {
-                'nama': kepala_sekolah.nama if kepala_sekolah else '',
-                'nip': kepala_sekolah.nip if kepala_sekolah else ''
-            } if kepala_sekolah else {'nama': '', 'nip': ''},
-            'wali_kelas': {
-                'nama': wali_kelas.nama if wali_kelas else '',
-                'nip': wali_kelas.nip if wali_kelas else ''
+                'tahun_ajaran': tahun_ajaran['tahun_ajaran'] if tahun_ajaran else '',
+                'semester': tahun_ajaran['semester'] if tahun_ajaran else ''
             },
+            'sekolah': dict(header['sekolah'], nama_sekolah=header['sekolah']['nama']),
+            'kepala_sekolah': header['kepala_sekolah'],
+            'wali_kelas': header['wali_kelas'],
             'siswa_list': siswa_with_nilai,
             'bulan': bulan,
             'bulan_label': bulan_label,
@@ -457,19 +267,9 @@ def laporan_tahunan(kelas_id, tahun_ajaran_id):
             abort(403, description="Anda bukan wali kelas dari kelas ini")
 
         tahun_ajaran = TahunAjaran.query.get_or_404(tahun_ajaran_id)
-        sekolah = Sekolah.query.get(kelas.sekolah_id)
-        kepala_sekolah = Pegawai.query.get(tahun_ajaran.kepala_sekolah_id) if tahun_ajaran else None
-        wali_kelas = Pegawai.query.get(kelas.wali_kelas_id)
-
-        kecamatan = Kecamatan.query.get(sekolah.kecamatan_id) if sekolah else None
-        kabupaten = Kabupaten.query.get(kecamatan.kabupaten_id) if kecamatan else None
-        provinsi = Provinsi.query.get(kabupaten.provinsi_id) if kabupaten else None
+        header = get_header_laporan(kelas.id, tahun_ajaran.id)
 
         # Label field kebiasaan
-        kebiasaan_fields = [
-            "bangun_pagi", "beribadah", "berolahraga",
-            "sehat_dan_lemar", "belajar", "bermasyarakat", "tidur_cepat"
-        ]
         field_labels = get_field_labels()
 
         # Generate bulan list untuk seluruh tahun ajaran (ganjil + genap)
@@ -481,103 +281,24 @@ def laporan_tahunan(kelas_id, tahun_ajaran_id):
         # Daftar siswa
         siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
 
-        jml_perempuan = sum(1 for s in siswa_list if s.jenis_kelamin == "P")
-        jml_laki = sum(1 for s in siswa_list if s.jenis_kelamin == "L")
-        terbiasa_perempuan = 0
-        terbiasa_laki = 0
-
-        rekap_umum = {field: {"terbiasa": 0, "belum": 0} for field in kebiasaan_fields}
-        rekap_jk = {
-            "P": {field: {"terbiasa": 0, "belum": 0} for field in kebiasaan_fields},
-            "L": {field: {"terbiasa": 0, "belum": 0} for field in kebiasaan_fields},
-        }
-
-        for siswa in siswa_list:
-            semua_field_terbiasa = True
-            for field in kebiasaan_fields:
-                field_terbiasa = True
-                for bulan_data in semua_bulan:
-                    bulan = bulan_data['value']
-                    kebiasaan = Kebiasaan.query.filter_by(
-                        siswa_id=siswa.id,
-                        kelas_id=kelas.id,
-                        bulan=bulan
-                    ).first()
-                    nilai = getattr(kebiasaan, field, 0) if kebiasaan else 0
-                    # Jika ada satu bulan saja yang nilainya < 20, dianggap belum terbiasa
-                    if nilai < 20:
-                        field_terbiasa = False
-                        break  # Langsung break, tidak perlu cek bulan lainnya
-
-                if field_terbiasa:
-                    rekap_umum[field]["terbiasa"] += 1
-                    rekap_jk[siswa.jenis_kelamin][field]["terbiasa"] += 1
-                else:
-                    rekap_umum[field]["belum"] += 1
-                    rekap_jk[siswa.jenis_kelamin][field]["belum"] += 1
-                    semua_field_terbiasa = False
-
-            if semua_field_terbiasa:
-                if siswa.jenis_kelamin == "P":
-                    terbiasa_perempuan += 1
-                elif siswa.jenis_kelamin == "L":
-                    terbiasa_laki += 1
-
-        total_siswa = len(siswa_list)
-        total_terbiasa = terbiasa_perempuan + terbiasa_laki
-
-        # Hitung prosentase rekap umum
-        for field in kebiasaan_fields:
-            total_field = rekap_umum[field]["terbiasa"] + rekap_umum[field]["belum"]
-            if total_field > 0:
-                rekap_umum[field]["terbiasa_pct"] = round((rekap_umum[field]["terbiasa"] / total_field) * 100, 2)
-                rekap_umum[field]["belum_pct"] = round((rekap_umum[field]["belum"] / total_field) * 100, 2)
-            else:
-                rekap_umum[field]["terbiasa_pct"] = 0.0
-                rekap_umum[field]["belum_pct"] = 0.0
-
-        # Hitung prosentase per jenis kelamin
-        for jk in ["P", "L"]:
-            for field in kebiasaan_fields:
-                total_field = rekap_jk[jk][field]["terbiasa"] + rekap_jk[jk][field]["belum"]
-                if total_field > 0:
-                    rekap_jk[jk][field]["terbiasa_pct"] = round((rekap_jk[jk][field]["terbiasa"] / total_field) * 100, 2)
-                    rekap_jk[jk][field]["belum_pct"] = round((rekap_jk[jk][field]["belum"] / total_field) * 100, 2)
-                else:
-                    rekap_jk[jk][field]["terbiasa_pct"] = 0.0
-                    rekap_jk[jk][field]["belum_pct"] = 0.0
+        # Semua nilai satu tahun ajaran dimuat sekaligus
+        rekap = rekap_kelas_periode(kelas.id, siswa_list, [b["value"] for b in semua_bulan])
 
         data = {
             "tahun_ajaran": {
                 "tahun_ajaran": tahun_ajaran.tahun_ajaran if tahun_ajaran else "",
                 "semester": tahun_ajaran.semester if tahun_ajaran else ""
             },
-            "sekolah": {
-                "nama": sekolah.nama_sekolah if sekolah else "",
-                "npsn": sekolah.npsn if sekolah else "",
-                "kecamatan": kecamatan.nama if kecamatan else "",
-                "kabupaten": kabupaten.nama if kabupaten else "",
-                "provinsi": provinsi.nama if provinsi else ""
-            },
-            "kepala_sekolah": {
-                "nama": kepala_sekolah.nama if kepala_sekolah else "",
-                "nip": kepala_sekolah.nip if kepala_sekolah else ""
-            } if kepala_sekolah else {"nama": "", "nip": ""},
-            "wali_kelas": {
-                "nama": wali_kelas.nama if wali_kelas else "",
-                "nip": wali_kelas.nip if wali_kelas else ""
-            } if wali_kelas else {"nama": "", "nip": ""},
+            "sekolah": header["sekolah"],
+            "kepala_sekolah": header["kepala_sekolah"],
+            "wali_kelas": header["wali_kelas"],
             "kelas": {  # PERUBAHAN: Ditambahkan object kelas
                 "id": kelas.id,
                 "nama_kelas": kelas.nama_kelas
             },
-            "rekap_siswa": {
-                "perempuan": {"total": jml_perempuan, "terbiasa": terbiasa_perempuan, "belum": jml_perempuan - terbiasa_perempuan},
-                "laki": {"total": jml_laki, "terbiasa": terbiasa_laki, "belum": jml_laki - terbiasa_laki},
-                "total": {"total": total_siswa, "terbiasa": total_terbiasa, "belum": total_siswa - total_terbiasa}
-            },
-            "rekap_umum": rekap_umum,
-            "rekap_jk": rekap_jk,
+            "rekap_siswa": rekap["rekap_siswa"],
+            "rekap_umum": rekap["rekap_umum"],
+            "rekap_jk": rekap["rekap_jk"],
             "nama_kelas": kelas.nama_kelas,  # Tetap dipertahankan untuk backward compatibility
             "kelas_id": kelas_id,
             "field_labels": field_labels,
@@ -585,7 +306,11 @@ def laporan_tahunan(kelas_id, tahun_ajaran_id):
             "tanggal_cetak": datetime.now().strftime('%d %B %Y %H:%M')
         }
 
-        return render_template("laporan/laporan_tahunan.html", data=data)
+        return respon_laporan(
+            "laporan/laporan_tahunan.html",
+            f"Rekap_Tahunan_{kelas.nama_kelas}_{data['tahun_ajaran']['tahun_ajaran']}.pdf",
+            data
+        )
 
     except Exception as e:
         print("ERROR REPORT TAHUNAN:", e)
@@ -704,6 +429,102 @@ def api_siswa_by_kelas(kelas_id):
         traceback.print_exc()
         return jsonify({"success": False, "error": str(e)}), 500
 
+# =========================
+# HELPER RAPOR PER SISWA
+# =========================
+BULAN_NAMES = [
+    'Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
+    'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember'
+]
+
+
+def _bulan_rapor(tahun_ajaran, semester_param):
+    """Daftar bulan semester untuk rapor: (bulan_data, semester_label, kunci tahun ajaran).
+
+    bulan_data berisi tuple (bulan_num, tahun, bulan_key, bulan_label).
+    """
+    # Extract tahun dari tahun ajaran (format: "2023/2024")
+    tahun_parts = tahun_ajaran.tahun_ajaran.split('/')
+    if len(tahun_parts) == 2:
+        tahun_awal = int(tahun_parts[0])  # 2023
+        tahun_akhir = int(tahun_parts[1]) # 2024
+    else:
+        tahun_awal = int(tahun_parts[0])
+        tahun_akhir = tahun_awal + 1
+
+    if semester_param == 'ganjil':
+        # Semester Ganjil: Juli - Desember tahun_awal
+        tahun, bulan_range, semester_label = tahun_awal, range(7, 13), "Ganjil"
+    else:
+        # Semester Genap: Januari - Juni tahun_akhir
+        tahun, bulan_range, semester_label = tahun_akhir, range(1, 7), "Genap"
+
+    bulan_data = [
+        (bulan_num, tahun, f"{tahun}-{bulan_num:02d}", f"{BULAN_NAMES[bulan_num - 1]} {tahun}")
+        for bulan_num in bulan_range
+    ]
+    return bulan_data, semester_label, f"{tahun_awal}/{tahun_akhir}"
+
+
+def _data_rapor_siswa(siswa, kelas, tahun_ajaran, header, bulan_data, semester_label,
+                      nilai_siswa, rekap, tanggal_cetak):
+    """Susun data template rapor satu siswa (tanpa query).
+
+    nilai_siswa: {bulan: nilai} hasil load_nilai_kelas, rekap: baris
+    RekapSiswaSemester atau None (dihitung langsung dari nilai_siswa).
+    """
+    # Daftar bulan yang akan ditampilkan
+    bulan_list = []
+    for bulan_num, tahun, bulan_key, bulan_label in bulan_data:
+        kebiasaan = nilai_siswa.get(bulan_key)
+        bulan_list.append({
+            'nama_bulan': bulan_label,
+            'bulan_key': bulan_key,
+            # Jika tidak ada data, semua nilai 0
+            'nilai': {field: (kebiasaan.get(field) or 0) if kebiasaan else 0 for field in KEBIASAAN_FIELDS},
+            'catatan': kebiasaan.get('catatan') if kebiasaan else ''
+        })
+
+    # Rata-rata & status kebiasaan dari tabel agregat (satu baris per siswa per semester),
+    # hitung langsung dari nilai bulanan bila barisnya belum ada
+    agregat = agregat_dari_rekap(rekap) if rekap else hitung_agregat_siswa(nilai_siswa)
+    rata_rata = {field: agregat[field]['rata'] for field in KEBIASAAN_FIELDS}
+    status_kebiasaan = {field: agregat[field]['terbiasa'] for field in KEBIASAAN_FIELDS}
+
+    # Tentukan keterangan untuk setiap kebiasaan
+    keterangan_kebiasaan = {
+        field: "Terbiasa" if status_kebiasaan[field] else "Belum Terbiasa"
+        for field in status_kebiasaan
+    }
+
+    return {
+        'siswa': {
+            'id': siswa.id,
+            'nama_siswa': siswa.nama_siswa,
+            'nisn': getattr(siswa, 'nisn', None),
+            'jenis_kelamin': 'Laki-laki' if siswa.jenis_kelamin == 'L' else 'Perempuan'
+        },
+        'kelas': {
+            'id': kelas.id,
+            'nama_kelas': kelas.nama_kelas
+        },
+        'tahun_ajaran': {
+            'id': tahun_ajaran.id,
+            'tahun_ajaran': tahun_ajaran.tahun_ajaran,
+            'semester': tahun_ajaran.semester
+        },
+        'sekolah': dict(header['sekolah'], nama_sekolah=header['sekolah']['nama']),
+        'kepala_sekolah': header['kepala_sekolah'],
+        'wali_kelas': header['wali_kelas'],
+        'bulan_list': bulan_list,
+        'rata_rata': rata_rata,
+        'status_kebiasaan': status_kebiasaan,
+        'keterangan_kebiasaan': keterangan_kebiasaan,
+        'semester': semester_label,
+        'tanggal_cetak': tanggal_cetak
+    }
+
+
 # Route utama untuk laporan penilaian siswa
 
 @laporan_bp.route("/penilaian-siswa/<int:siswa_id>")
@@ -742,172 +563,95 @@ def laporan_penilaian_siswa(siswa_id):
         if not tahun_ajaran:
             abort(404, description="Tahun ajaran tidak ditemukan")
 
-        # Extract tahun dari tahun ajaran (format: "2023/2024")
-        tahun_parts = tahun_ajaran.tahun_ajaran.split('/')
-        if len(tahun_parts) == 2:
-            tahun_awal = int(tahun_parts[0])  # 2023
-            tahun_akhir = int(tahun_parts[1]) # 2024
-        else:
-            tahun_awal = int(tahun_parts[0])
-            tahun_akhir = tahun_awal + 1
-
         # Tentukan bulan yang akan ditampilkan berdasarkan semester
-        bulan_data = []
-        bulan_names = [
-            'Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
-            'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember'
-        ]
-        
-        if semester_param == 'ganjil':
-            # Semester Ganjil: Juli - Desember tahun_awal
-            for bulan_num in range(7, 13):
-                tahun = tahun_awal
-                bulan_key = f"{tahun}-{bulan_num:02d}"
-                bulan_label = f"{bulan_names[bulan_num - 1]} {tahun}"
-                bulan_data.append((bulan_num, tahun, bulan_key, bulan_label))
-            semester_label = "Ganjil"
-        else:  # semester_param == 'genap'
-            # Semester Genap: Januari - Juni tahun_akhir  
-            for bulan_num in range(1, 7):
-                tahun = tahun_akhir
-                bulan_key = f"{tahun}-{bulan_num:02d}"
-                bulan_label = f"{bulan_names[bulan_num - 1]} {tahun}"
-                bulan_data.append((bulan_num, tahun, bulan_key, bulan_label))
-            semester_label = "Genap"
-
-        # Data sekolah dan tahun ajaran
-        sekolah = Sekolah.query.get(kelas.sekolah_id)
-        wali_kelas = Pegawai.query.get(kelas.wali_kelas_id)
-        kepala_sekolah = Pegawai.query.get(tahun_ajaran.kepala_sekolah_id) if tahun_ajaran else None
-
-        # Data kecamatan, kabupaten, provinsi
-        kecamatan = Kecamatan.query.get(sekolah.kecamatan_id) if sekolah else None
-        kabupaten = Kabupaten.query.get(kecamatan.kabupaten_id) if kecamatan else None
-        provinsi = Provinsi.query.get(kabupaten.provinsi_id) if kabupaten else None
-
-        # Daftar bulan yang akan ditampilkan
-        bulan_list = []
-        
-        # Inisialisasi variabel untuk perhitungan rata-rata
-        total_nilai = {
-            'bangun_pagi': 0, 'beribadah': 0, 'berolahraga': 0,
-            'sehat_dan_lemar': 0, 'belajar': 0, 'bermasyarakat': 0, 'tidur_cepat': 0
-        }
-        jumlah_bulan_terisi = {
-            'bangun_pagi': 0, 'beribadah': 0, 'berolahraga': 0,
-            'sehat_dan_lemar': 0, 'belajar': 0, 'bermasyarakat': 0, 'tidur_cepat': 0
-        }
-        
-        # Track status kebiasaan (apakah rata-rata >= 20)
-        status_kebiasaan = {
-            'bangun_pagi': True,
-            'beribadah': True, 
-            'berolahraga': True,
-            'sehat_dan_lemar': True,
-            'belajar': True,
-            'bermasyarakat': True,
-            'tidur_cepat': True
-        }
+        bulan_data, semester_label, kunci_ta = _bulan_rapor(tahun_ajaran, semester_param)
 
-        for bulan_num, tahun, bulan_key, bulan_label in bulan_data:
-            # Cari data kebiasaan untuk bulan ini
-            kebiasaan = Kebiasaan.query.filter_by(
-                siswa_id=siswa.id,
-                kelas_id=kelas.id,
-                bulan=bulan_key
-            ).first()
-            
-            nilai_data = {}
-            if kebiasaan:
-                # Hitung nilai jika ada data
-                nilai_fields = ['bangun_pagi', 'beribadah', 'berolahraga', 
-                               'sehat_dan_lemar', 'belajar', 'bermasyarakat', 'tidur_cepat']
-                
-                for field in nilai_fields:
-                    nilai = getattr(kebiasaan, field, 0) or 0
-                    nilai_data[field] = nilai
-                    
-                    # Akumulasi untuk rata-rata
-                    if nilai is not None and nilai > 0:
-                        total_nilai[field] += nilai
-                        jumlah_bulan_terisi[field] += 1
-            else:
-                # Jika tidak ada data, set semua nilai menjadi 0
-                nilai_fields = ['bangun_pagi', 'beribadah', 'berolahraga', 
-                               'sehat_dan_lemar', 'belajar', 'bermasyarakat', 'tidur_cepat']
-                for field in nilai_fields:
-                    nilai_data[field] = 0
-
-            bulan_data_item = {
-                'nama_bulan': bulan_label,
-                'bulan_key': bulan_key,
-                'nilai': nilai_data,
-                'catatan': getattr(kebiasaan, 'catatan', '') if kebiasaan else ''
-            }
-            bulan_list.append(bulan_data_item)
-
-        # Hitung rata-rata per kebiasaan
-        rata_rata = {}
-        for field in total_nilai:
-            if jumlah_bulan_terisi[field] > 0:
-                rata_rata[field] = total_nilai[field] / jumlah_bulan_terisi[field]
-                # Cek status kebiasaan berdasarkan rata-rata
-                status_kebiasaan[field] = rata_rata[field] >= 20
-            else:
-                rata_rata[field] = 0
-                status_kebiasaan[field] = False
-
-        # Tentukan keterangan untuk setiap kebiasaan
-        keterangan_kebiasaan = {}
-        for field in status_kebiasaan:
-            if status_kebiasaan[field]:
-                keterangan_kebiasaan[field] = "Terbiasa"
-            else:
-                keterangan_kebiasaan[field] = "Belum Terbiasa"
+        # Data sekolah, wilayah, kepala sekolah dan wali kelas (cached)
+        header = get_header_laporan(kelas.id, tahun_ajaran.id)
 
-        data = {
-            'siswa': {
-                'id': siswa.id,
-                'nama_siswa': siswa.nama_siswa,
-                'nisn': getattr(siswa, 'nisn', None),
-                'jenis_kelamin': 'Laki-laki' if siswa.jenis_kelamin == 'L' else 'Perempuan'
-            },
-            'kelas': {
-                'id': kelas.id,
-                'nama_kelas': kelas.nama_kelas
-            },
-            'tahun_ajaran': {
-                'id': tahun_ajaran.id,
-                'tahun_ajaran': tahun_ajaran.tahun_ajaran,
-                'semester': tahun_ajaran.semester
-            },
-            'sekolah': {
-                'nama_sekolah': sekolah.nama_sekolah if sekolah else '',
-                'npsn': sekolah.npsn if sekolah else '',
-                'kecamatan': kecamatan.nama if kecamatan else '',
-                'kabupaten': kabupaten.nama if kabupaten else '',
-                'provinsi': provinsi.nama if provinsi else ''
-            },
-            'kepala_sekolah': {
-                'nama': kepala_sekolah.nama if kepala_sekolah else '',
-                'nip': kepala_sekolah.nip if kepala_sekolah else ''
-            } if kepala_sekolah else {'nama': '', 'nip': ''},
-            'wali_kelas': {
-                'nama': wali_kelas.nama if wali_kelas else '',
-                'nip': wali_kelas.nip if wali_kelas else ''
-            },
-            'bulan_list': bulan_list,
-            'rata_rata': rata_rata,
-            'status_kebiasaan': status_kebiasaan,
-            'keterangan_kebiasaan': keterangan_kebiasaan,
-            'semester': semester_label,
-            'tanggal_cetak': datetime.now().strftime('%d %B %Y %H:%M')
-        }
+        # Nilai 6 bulan siswa dalam satu query
+        bulan_keys = [bulan_key for _, _, bulan_key, _ in bulan_data]
+        nilai_siswa = load_nilai_kelas(kelas.id, bulan_keys, siswa_id=siswa.id).get(siswa.id, {})
+
+        rekap = RekapSiswaSemester.query.filter_by(
+            siswa_id=siswa.id,
+            kelas_id=kelas.id,
+            tahun_ajaran=kunci_ta,
+            semester=semester_param
+        ).first()
 
-        return render_template("laporan/laporan_penilaian_siswa.html", data=data)
+        data = _data_rapor_siswa(
+            siswa, kelas, tahun_ajaran, header, bulan_data, semester_label,
+            nilai_siswa, rekap, datetime.now().strftime('%d %B %Y %H:%M')
+        )
+
+        return respon_laporan(
+            "laporan/laporan_penilaian_siswa.html",
+            f"Laporan_Perkembangan_{siswa.nama_siswa}_{tahun_ajaran.tahun_ajaran}_{semester_label}.pdf",
+            data
+        )
 
     except Exception as e:
         print(f"ERROR LAPORAN PENILAIAN SISWA: {e}")
         traceback.print_exc()
         return render_template("error.html", 
-                            message=f"Error generating penilaian siswa report: {str(e)}"), 500
\ No newline at end of file
+                            message=f"Error generating penilaian siswa report: {str(e)}"), 500
+
+
+# Cetak rapor seluruh siswa satu kelas dalam satu dokumen
+
+@laporan_bp.route("/penilaian-siswa/kelas/<int:kelas_id>")
+@login_required
+def laporan_penilaian_siswa_kelas(kelas_id):
+    """Rapor semester semua siswa satu kelas, di-stream per halaman siswa.
+
+    Nilai seluruh siswa dan agregat semesternya dimuat masing-masing dengan
+    satu query, header diambil sekali, lalu HTML dikirim bertahap.
+    """
+    tahun_ajaran_id = request.args.get('tahun_ajaran_id')
+    semester_param = request.args.get('semester', '').lower()
+
+    if semester_param not in ['ganjil', 'genap']:
+        return render_template("error.html",
+                            message="Parameter semester harus diisi dengan 'ganjil' atau 'genap'"), 400
+
+    kelas = Kelas.query.get_or_404(kelas_id)
+
+    # Authorization check
+    if not hasattr(current_user, 'pegawai') or kelas.wali_kelas_id != current_user.pegawai.id:
+        abort(403, description="Anda bukan wali kelas dari kelas ini")
+
+    tahun_ajaran = TahunAjaran.query.get(tahun_ajaran_id or kelas.tahun_ajaran_id)
+    if not tahun_ajaran:
+        abort(404, description="Tahun ajaran tidak ditemukan")
+
+    bulan_data, semester_label, kunci_ta = _bulan_rapor(tahun_ajaran, semester_param)
+    header = get_header_laporan(kelas.id, tahun_ajaran.id)
+
+    siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
+    matrix = load_nilai_kelas(kelas.id, [bulan_key for _, _, bulan_key, _ in bulan_data])
+    rekap_per_siswa = {
+        rekap.siswa_id: rekap
+        for rekap in RekapSiswaSemester.query.filter_by(
+            kelas_id=kelas.id, tahun_ajaran=kunci_ta, semester=semester_param
+        )
+    }
+    tanggal_cetak = datetime.now().strftime('%d %B %Y %H:%M')
+
+    def rapor_siswa():
+        # generator: data satu siswa baru disusun saat halamannya dirender
+        for siswa in siswa_list:
+            yield _data_rapor_siswa(
+                siswa, kelas, tahun_ajaran, header, bulan_data, semester_label,
+                matrix.get(siswa.id, {}), rekap_per_siswa.get(siswa.id), tanggal_cetak
+            )
+
+    # stream_template menjaga request context selama HTML dikirim
+    return Response(stream_template(
+        "laporan/laporan_penilaian_siswa_kelas.html",
+        kelas=header['kelas'],
+        tahun_ajaran=tahun_ajaran,
+        semester=semester_label,
+        jumlah_siswa=len(siswa_list),
+        rapor_list=rapor_siswa()
+    ), mimetype="text/html")
@@ -2,8 +2,15 @@ from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required, current_user
 from penilaiansiswa.models import Kebiasaan, Kelas, Siswa, TahunAjaran
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError, OperationalError
 import calendar
 from penilaiansiswa import db
+from penilaiansiswa.utils.versi_data import versi_kelas, respon_bersyarat
+from penilaiansiswa.utils.replay import replay_operasi
+from penilaiansiswa.utils.kebiasaan_simpan import (
+    KOLOM_ISIAN, bersihkan_baris, terapkan_sel, data_kebiasaan, baca_kebiasaan_lama, simpan_kebiasaan_kelas,
+    ulangi_transaksi, bentrok_kunci
+)
 
 penilaian_bp = Blueprint("penilaian", __name__, url_prefix="/penilaian")
 
@@ -43,22 +50,254 @@ def save_kebiasaan_row():
     if not siswa:
         return jsonify({"success": False, "message": "Siswa tidak ditemukan di kelas ini"}), 404
 
-    # ✅ lanjutkan simpan/update
-    kebiasaan = Kebiasaan.query.filter_by(
-        siswa_id=siswa.id, kelas_id=kelas.id, bulan=bulan
-    ).first()
+    try:
+        isian = bersihkan_baris(request.form)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
-    if not kebiasaan:
-        kebiasaan = Kebiasaan(siswa_id=siswa_id, kelas_id=kelas_id, bulan=bulan)
-        db.session.add(kebiasaan)
+    # ✅ simpan/update dalam satu upsert, rekap ikut diperbarui dalam transaksi yang sama
+    try:
+        ulangi_transaksi(lambda: simpan_kebiasaan_kelas(
+            kelas.id, bulan, {siswa.id: isian}, {siswa.id: siswa}, current_user.id
+        ))
+    except OperationalError as e:
+        if not bentrok_kunci(e):
+            raise
+        return _respon_bentrok()
+    return jsonify({"success": True, "message": "Data berhasil disimpan"})
 
-    # Update nilai
-    for field in ["bangun_pagi", "beribadah", "berolahraga", "sehat_dan_lemar",
-                  "belajar", "bermasyarakat", "tidur_cepat", "catatan"]:
-        setattr(kebiasaan, field, request.form.get(field) or None)
 
-    db.session.commit()
-    return jsonify({"success": True, "message": "Data berhasil disimpan"})
+# =========================
+# HELPER TULIS GRID
+# =========================
+def _respon_bentrok():
+    # transaksi tetap deadlock setelah diulang; tidak ada yang tersimpan, aman dikirim ulang
+    return jsonify({"success": False, "message": "Data sedang diubah dari perangkat lain, silakan coba lagi"}), 409
+
+
+def _kelas_grid(kelas_id, bulan):
+    """Validasi kelas_id/bulan payload grid.
+
+    Return (kelas, None) atau (None, respon error).
+    """
+    if not (kelas_id and bulan):
+        return None, (jsonify({"success": False, "message": "Data tidak lengkap"}), 400)
+    try:
+        datetime.strptime(bulan, "%Y-%m")
+    except (TypeError, ValueError):
+        return None, (jsonify({"success": False, "message": "Format bulan harus YYYY-MM"}), 400)
+
+    kelas = Kelas.query.get(kelas_id)
+    if not kelas or not current_user.pegawai or kelas.wali_kelas_id != current_user.pegawai.id:
+        return None, (jsonify({"success": False, "message": "Anda bukan wali kelas dari kelas ini"}), 403)
+    return kelas, None
+
+
+def _siswa_kelas(kelas, siswa_ids):
+    """Cek keanggotaan kelas untuk semua siswa sekaligus.
+
+    Return (siswa_map, None) atau (None, respon error berisi siswa_id yang tidak valid).
+    """
+    siswa_map = {
+        s.id: s for s in Siswa.query.filter(
+            Siswa.id.in_(list(siswa_ids)), Siswa.kelas_id == kelas.id
+        ).all()
+    }
+    bukan_anggota = sorted(set(siswa_ids) - set(siswa_map))
+    if bukan_anggota:
+        return None, (jsonify({
+            "success": False,
+            "message": "Sebagian siswa tidak ditemukan di kelas ini",
+            "siswa_id": bukan_anggota
+        }), 404)
+    return siswa_map, None
+
+
+# =========================
+# SAVE KEBIASAAN SATU GRID (BULK)
+# =========================
+@penilaian_bp.route("/kebiasaan/save_bulk", methods=["POST"])
+@login_required
+def save_kebiasaan_bulk():
+    """Simpan seluruh grid (atau hanya baris yang berubah) satu kelas/bulan dalam satu transaksi.
+
+    Body JSON: {"kelas_id": .., "bulan": "YYYY-MM", "rows": [{"siswa_id": .., <7 field>, "catatan": ..}]}
+    """
+    payload = request.get_json(silent=True) or {}
+    rows = payload.get("rows")
+    if not isinstance(rows, list):
+        return jsonify({"success": False, "message": "Data tidak lengkap"}), 400
+
+    bulan = payload.get("bulan")
+    kelas, error = _kelas_grid(payload.get("kelas_id"), bulan)
+    if error:
+        return error
+
+    # Baris siswa yang sama dikirim dua kali: yang terakhir dipakai
+    isian = {}
+    for baris in rows:
+        try:
+            siswa_id = int(baris["siswa_id"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"success": False, "message": "siswa_id tidak valid"}), 400
+        try:
+            isian[siswa_id] = bersihkan_baris(baris)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e), "siswa_id": siswa_id}), 400
+
+    if not isian:
+        return jsonify({"success": True, "message": "Tidak ada data yang disimpan", "baru": 0, "diperbarui": 0})
+
+    siswa_map, error = _siswa_kelas(kelas, isian)
+    if error:
+        return error
+
+    try:
+        hasil = ulangi_transaksi(lambda: simpan_kebiasaan_kelas(kelas.id, bulan, isian, siswa_map, current_user.id))
+    except OperationalError as e:
+        if not bentrok_kunci(e):
+            raise
+        return _respon_bentrok()
+    return jsonify({
+        "success": True,
+        "message": f"{hasil['baru'] + hasil['diperbarui']} baris berhasil disimpan",
+        "baru": hasil["baru"],
+        "diperbarui": hasil["diperbarui"],
+        "versi": {str(k): v for k, v in hasil["versi"].items()}
+    })
+
+
+# =========================
+# SYNC PERUBAHAN PER SEL (OPTIMISTIC CONCURRENCY)
+# =========================
+@penilaian_bp.route("/kebiasaan/sync", methods=["POST"])
+@login_required
+def sync_kebiasaan():
+    """Terapkan perubahan per sel dengan cek versi baris.
+
+    Body JSON: {"kelas_id": .., "bulan": "YYYY-MM",
+                "perubahan": [{"siswa_id": .., "versi": .., "sel": {"belajar": 20, ...}}]}
+    versi = versi baris terakhir yang dilihat klien (0 bila baris belum ada).
+    Baris yang versinya sudah berubah di server tidak ditulis dan dikembalikan
+    di 'konflik' bersama nilai server terbaru.
+    """
+    payload = request.get_json(silent=True) or {}
+    daftar = payload.get("perubahan")
+    if not isinstance(daftar, list):
+        return jsonify({"success": False, "message": "Data tidak lengkap"}), 400
+
+    bulan = payload.get("bulan")
+    kelas, error = _kelas_grid(payload.get("kelas_id"), bulan)
+    if error:
+        return error
+
+    # siswa_id -> (versi klien, sel); perubahan untuk siswa yang sama digabung berurutan
+    permintaan = {}
+    for item in daftar:
+        try:
+            siswa_id = int(item["siswa_id"])
+            versi = int(item.get("versi") or 0)
+            sel = item["sel"]
+            if not isinstance(sel, dict):
+                raise TypeError
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({"success": False, "message": "Format perubahan tidak valid"}), 400
+        if siswa_id in permintaan:
+            permintaan[siswa_id][1].update(sel)
+        else:
+            permintaan[siswa_id] = (versi, dict(sel))
+
+    if not permintaan:
+        return jsonify({"success": True, "message": "Tidak ada perubahan", "diterapkan": [], "konflik": []})
+
+    siswa_map, error = _siswa_kelas(kelas, permintaan)
+    if error:
+        return error
+
+    # nilai sel divalidasi sebelum transaksi, agar tulis() di bawah aman diulang
+    for siswa_id, (versi, sel) in permintaan.items():
+        try:
+            terapkan_sel(None, sel)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e), "siswa_id": siswa_id}), 400
+
+    def tulis():
+        lama_map = baca_kebiasaan_lama(kelas.id, bulan, permintaan)
+        isian, konflik = {}, []
+        for siswa_id, (versi, sel) in permintaan.items():
+            lama = lama_map.get(siswa_id)
+            versi_server = lama.versi if lama is not None else 0
+            if versi != versi_server:
+                konflik.append({"siswa_id": siswa_id, "versi": versi_server, "data": data_kebiasaan(lama)})
+                continue
+            isian[siswa_id] = terapkan_sel(lama, sel)
+        hasil = simpan_kebiasaan_kelas(
+            kelas.id, bulan, isian, siswa_map, current_user.id, lama_map=lama_map, ketat=True
+        )
+        return hasil, isian, konflik
+
+    try:
+        hasil, isian, konflik = ulangi_transaksi(tulis)
+    except IntegrityError:
+        # baris yang sama baru saja dibuat oleh request lain, versi klien sudah usang
+        db.session.rollback()
+        return _respon_bentrok()
+    except OperationalError as e:
+        if not bentrok_kunci(e):
+            raise
+        return _respon_bentrok()
+
+    return jsonify({
+        "success": True,
+        "message": "Ada perubahan yang bentrok dengan data terbaru" if konflik else "Data berhasil disimpan",
+        "diterapkan": [{"siswa_id": siswa_id, "versi": hasil["versi"][siswa_id]} for siswa_id in isian],
+        "konflik": konflik
+    })
+
+
+# =========================
+# REPLAY ANTREAN OFFLINE
+# =========================
+@penilaian_bp.route("/kebiasaan/replay", methods=["POST"])
+@login_required
+def replay_kebiasaan():
+    """Terapkan antrean operasi yang tertunda saat offline, berurutan dalam satu transaksi.
+
+    Body JSON: {"operasi": [{"op_id": "<uuid>", "jenis": "simpan"/"hapus", "kelas_id": ..,
+                "siswa_id": .., "bulan": "YYYY-MM", "data": {"belajar": 20, ...}}]}
+    Idempoten: op_id yang sudah pernah diproses dilaporkan 'duplikat' dan tidak ditulis ulang.
+    """
+    if not current_user.pegawai:
+        return jsonify({"success": False, "message": "User tidak terkait pegawai"}), 403
+
+    payload = request.get_json(silent=True) or {}
+    operasi = payload.get("operasi")
+    if not isinstance(operasi, list):
+        return jsonify({"success": False, "message": "Data tidak lengkap"}), 400
+    maks = current_app.config.get("REPLAY_MAKS_OPERASI", 500)
+    if len(operasi) > maks:
+        return jsonify({"success": False, "message": f"Maksimal {maks} operasi per kiriman"}), 413
+    if not all(isinstance(op, dict) and isinstance(op.get("op_id"), str) and 0 < len(op["op_id"]) <= 64
+               for op in operasi):
+        return jsonify({"success": False, "message": "Setiap operasi wajib memiliki op_id"}), 400
+
+    user_id, pegawai_id = current_user.id, current_user.pegawai.id
+    try:
+        hasil = ulangi_transaksi(lambda: replay_operasi(operasi, user_id, pegawai_id))
+    except (IntegrityError, OperationalError) as e:
+        if isinstance(e, OperationalError) and not bentrok_kunci(e):
+            raise
+        # antrean yang sama sedang dikirim dari tab/perangkat lain; aman untuk diulang
+        db.session.rollback()
+        return jsonify({"success": False, "message": "Antrean sedang diproses, silakan coba lagi"}), 409
+
+    jumlah = {status: sum(1 for h in hasil if h["status"] == status) for status in ("diterapkan", "duplikat", "ditolak")}
+    return jsonify({
+        "success": True,
+        "message": f"{jumlah['diterapkan']} operasi diterapkan, {jumlah['duplikat']} duplikat, {jumlah['ditolak']} ditolak",
+        "hasil": hasil,
+        **jumlah
+    })
 
 
 # =========================
@@ -67,17 +306,32 @@ def save_kebiasaan_row():
 @penilaian_bp.route("/kebiasaan/delete_row/<int:siswa_id>/<bulan>", methods=["POST"])
 @login_required
 def delete_kebiasaan_row(siswa_id, bulan):
-    kebiasaan = Kebiasaan.query.filter_by(
-        siswa_id=siswa_id,
-        bulan=bulan
-    ).first()
-    if kebiasaan:
-        for field in ["bangun_pagi", "beribadah", "berolahraga", "sehat_dan_lemar",
-                      "belajar", "bermasyarakat", "tidur_cepat", "catatan"]:
-            setattr(kebiasaan, field, None)
-        db.session.commit()
-        return jsonify({"success": True, "message": "Data kebiasaan dihapus"})
-    return jsonify({"success": False, "message": "Data kebiasaan tidak ditemukan"}), 404
+    siswa = db.session.get(Siswa, siswa_id)
+    # kelas_id dikirim grid; klien lama tidak mengirimnya, pakai kelas siswa saat ini
+    kelas_id = request.form.get("kelas_id", type=int) or (siswa.kelas_id if siswa else None)
+    kelas = db.session.get(Kelas, kelas_id) if kelas_id else None
+    if not kelas or kelas.wali_kelas_id != current_user.pegawai.id:
+        return jsonify({"success": False, "message": "Anda bukan wali kelas dari kelas ini"}), 403
+
+    def tulis():
+        # baris dikunci lalu dikosongkan lewat jalur tulis yang sama dengan simpan (versi & delta agregat)
+        lama_map = baca_kebiasaan_lama(kelas.id, bulan, [siswa_id])
+        if siswa_id not in lama_map:
+            return None
+        return simpan_kebiasaan_kelas(
+            kelas.id, bulan, {siswa_id: dict.fromkeys(KOLOM_ISIAN)}, {siswa_id: siswa},
+            current_user.id, lama_map=lama_map
+        )
+
+    try:
+        hasil = ulangi_transaksi(tulis)
+    except OperationalError as e:
+        if not bentrok_kunci(e):
+            raise
+        return _respon_bentrok()
+    if hasil is None:
+        return jsonify({"success": False, "message": "Data kebiasaan tidak ditemukan"}), 404
+    return jsonify({"success": True, "message": "Data kebiasaan dihapus", "versi": hasil["versi"][siswa_id]})
 
 
 # =========================
@@ -157,10 +411,14 @@ def get_siswa(kelas_id):
     if kelas.wali_kelas_id != current_user.pegawai.id:
         return jsonify({"success": False, "message": "Anda bukan wali kelas dari kelas ini"}), 403
 
-    siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
-    return jsonify([
-        {"id": s.id, "nama_siswa": s.nama_siswa} for s in siswa_list
-    ])
+    def buat_respon():
+        siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
+        return jsonify([
+            {"id": s.id, "nama_siswa": s.nama_siswa} for s in siswa_list
+        ])
+
+    # ✅ 304 bila daftar siswa belum berubah sejak dimuat klien
+    return respon_bersyarat(*versi_kelas(kelas.id), buat_respon)
 
 
 # =========================
@@ -173,26 +431,31 @@ def get_kebiasaan(kelas_id, bulan):
     if kelas.wali_kelas_id != current_user.pegawai.id:
         return jsonify({"success": False, "message": "Anda bukan wali kelas dari kelas ini"}), 403
 
-    siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
-    kebiasaan_map = {
-        k.siswa_id: k
-        for k in Kebiasaan.query.filter_by(kelas_id=kelas.id, bulan=bulan).all()
-    }
+    def buat_respon():
+        siswa_list = Siswa.query.filter_by(kelas_id=kelas.id).order_by(Siswa.nama_siswa).all()
+        kebiasaan_map = {
+            k.siswa_id: k
+            for k in Kebiasaan.query.filter_by(kelas_id=kelas.id, bulan=bulan).all()
+        }
+
+        data = []
+        for idx, s in enumerate(siswa_list, 1):
+            k = kebiasaan_map.get(s.id)
+            data.append({
+                "no": idx,
+                "siswa_id": s.id,
+                "nama_siswa": s.nama_siswa,
+                "bangun_pagi": k.bangun_pagi if k else None,
+                "beribadah": k.beribadah if k else None,
+                "berolahraga": k.berolahraga if k else None,
+                "sehat_dan_lemar": k.sehat_dan_lemar if k else None,
+                "belajar": k.belajar if k else None,
+                "bermasyarakat": k.bermasyarakat if k else None,
+                "tidur_cepat": k.tidur_cepat if k else None,
+                "catatan": k.catatan if k else None,
+                "versi": k.versi if k else 0
+            })
+        return jsonify(data)
 
-    data = []
-    for idx, s in enumerate(siswa_list, 1):
-        k = kebiasaan_map.get(s.id)
-        data.append({
-            "no": idx,
-            "siswa_id": s.id,
-            "nama_siswa": s.nama_siswa,
-            "bangun_pagi": k.bangun_pagi if k else None,
-            "beribadah": k.beribadah if k else None,
-            "berolahraga": k.berolahraga if k else None,
-            "sehat_dan_lemar": k.sehat_dan_lemar if k else None,
-            "belajar": k.belajar if k else None,
-            "bermasyarakat": k.bermasyarakat if k else None,
-            "tidur_cepat": k.tidur_cepat if k else None,
-            "catatan": k.catatan if k else None
-        })
-    return jsonify(data)
\ No newline at end of file
+    # ✅ 304 bila nilai kelas/bulan ini dan daftar siswanya belum berubah
+    return respon_bersyarat(*versi_kelas(kelas.id, bulan), buat_respon)
@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+import gzip
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response, abort
 from penilaiansiswa.models.users import Pegawai, User
 from penilaiansiswa.models.sekolah import Sekolah, Kabupaten, Kecamatan, Provinsi, TahunAjaran, Kelas, Siswa, Kebiasaan
 from flask_login import current_user, login_required
 from penilaiansiswa import db
+from penilaiansiswa.utils.wilayah_json import path_shard, url_index_wilayah
+from penilaiansiswa.utils.pencarian_sekolah import cari_sekolah, MAKS_HASIL_SEKOLAH, MIN_PANJANG_Q
+from penilaiansiswa.utils.teks import normalisasi_nama
 
 pegawai_bp = Blueprint("pegawai_bp", __name__, url_prefix="/pegawai")
 
@@ -22,9 +26,45 @@ def get_kecamatan(kabupaten_id):
 @pegawai_bp.route("/get_sekolah/<int:kecamatan_id>")
 @login_required
 def get_sekolah(kecamatan_id):
-    sekolah_list = Sekolah.query.filter_by(kecamatan_id=kecamatan_id).all()
+    sekolah_list = Sekolah.query.filter_by(kecamatan_id=kecamatan_id, aktif=True).all()
     return jsonify([{"id": s.id, "nama_sekolah": s.nama_sekolah} for s in sekolah_list])
 
+# ===== TYPEAHEAD SEKOLAH =====
+@pegawai_bp.route("/search_sekolah")
+@login_required
+def search_sekolah():
+    """Cari sekolah aktif dari awalan nama atau NPSN lewat index in-memory (utils/pencarian_sekolah.py)."""
+    q = request.args.get("q", "").strip()
+    limit = request.args.get("limit", MAKS_HASIL_SEKOLAH, type=int)
+    if len(normalisasi_nama(q)) < MIN_PANJANG_Q:
+        return jsonify({"success": False, "message": f"Ketik minimal {MIN_PANJANG_Q} huruf nama sekolah atau NPSN"})
+    sekolah_list = cari_sekolah(q, max(1, min(limit, MAKS_HASIL_SEKOLAH)))
+    return jsonify({"success": True, "sekolah": sekolah_list, "total": len(sekolah_list)})
+
+# ===== SHARD JSON WILAYAH =====
+@pegawai_bp.route("/wilayah/<nama>")
+@login_required
+def wilayah_json(nama):
+    """Shard pohon wilayah (lihat utils/wilayah_json.py). Nama memuat hash isi, jadi di-cache selamanya.
+
+    Hanya untuk user yang login (sama seperti get_sekolah), sehingga cache-nya private di browser.
+    """
+    path = path_shard(nama)
+    if not path:
+        abort(404)
+    with open(path, "rb") as f:
+        isi = f.read()
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = make_response(isi)
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = make_response(gzip.decompress(isi))
+    response.mimetype = "application/json"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
 # ===== CEK NIP UNIK =====
 @pegawai_bp.route("/check_nip", methods=["GET"])
 @login_required
@@ -91,15 +131,13 @@ def create_pegawai():
             flash(f"Terjadi kesalahan saat menyimpan: {str(e)}", "danger")
             return redirect(url_for("pegawai_bp.create_pegawai"))
 
-    provinsi_list = Provinsi.query.all()
+    # pilihan wilayah & sekolah dimuat browser dari shard JSON
     return render_template(
         "home.html",
         user=user,
         pegawai=None,
-        provinsi_list=provinsi_list,
-        kabupaten_list=[],
-        kecamatan_list=[],
-        sekolah_list=[]
+        url_wilayah=url_index_wilayah(),
+        terpilih={}
     )
 
 # ===== UPDATE Pegawai =====
@@ -152,28 +190,25 @@ def update_pegawai(pegawai_id):
             flash(f"Terjadi kesalahan saat memperbarui: {str(e)}", "danger")
             return redirect(url_for("pegawai.update_pegawai", pegawai_id=pegawai.id))
 
-    # Pre-fill cascading dropdown (GET method)
-    selected_sekolah = Sekolah.query.get(pegawai.sekolah_id)
-    selected_kecamatan = Kecamatan.query.get(selected_sekolah.kecamatan_id)
-    selected_kabupaten = Kabupaten.query.get(selected_kecamatan.kabupaten_id)
-    selected_provinsi = Provinsi.query.get(selected_kabupaten.provinsi_id)
-
-    provinsi_list = Provinsi.query.all()
-    kabupaten_list = Kabupaten.query.filter_by(provinsi_id=selected_provinsi.id).all()
-    kecamatan_list = Kecamatan.query.filter_by(kabupaten_id=selected_kabupaten.id).all()
-    sekolah_list = Sekolah.query.filter_by(kecamatan_id=selected_kecamatan.id).all()
+    # Pre-fill cascading dropdown (GET method): id wilayah sekolah dalam satu query,
+    # daftar pilihannya dimuat browser dari shard JSON
+    terpilih = db.session.query(
+        Provinsi.id.label("provinsi_id"),
+        Kabupaten.id.label("kabupaten_id"),
+        Kecamatan.id.label("kecamatan_id"),
+        Sekolah.id.label("sekolah_id")
+    ).select_from(Sekolah).join(
+        Kecamatan, Kecamatan.id == Sekolah.kecamatan_id
+    ).join(
+        Kabupaten, Kabupaten.id == Kecamatan.kabupaten_id
+    ).join(
+        Provinsi, Provinsi.id == Kabupaten.provinsi_id
+    ).filter(Sekolah.id == pegawai.sekolah_id).first()
 
     return render_template(
         "home.html",
         user=pegawai.user,
         pegawai=pegawai,
-        provinsi_list=provinsi_list,
-        kabupaten_list=kabupaten_list,
-        kecamatan_list=kecamatan_list,
-        sekolah_list=sekolah_list,
-        selected_provinsi=selected_provinsi,
-        selected_kabupaten=selected_kabupaten,
-        selected_kecamatan=selected_kecamatan,
-        selected_sekolah=selected_sekolah
+        url_wilayah=url_index_wilayah(),
+        terpilih=terpilih._asdict() if terpilih else {}
     )
-
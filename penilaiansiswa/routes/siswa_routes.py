@@ -2,7 +2,11 @@ from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import func
 from penilaiansiswa import db
-from penilaiansiswa.models import Kelas, TahunAjaran, Pegawai, Sekolah, User, Kelas, Siswa
+from penilaiansiswa.models import Kelas, TahunAjaran, Pegawai, Sekolah, User, Kelas, Siswa, RekapSiswaSemester
+from penilaiansiswa.utils.agregat import rebuild_rekap_kelas_bulan
+from penilaiansiswa.utils.versi_data import versi_kelas, respon_bersyarat
+from penilaiansiswa.utils.pencarian_siswa import cari_siswa
+from penilaiansiswa.utils.impor_siswa import baca_roster, impor_siswa_kelas
 
 siswa_bp = Blueprint("siswa", __name__, url_prefix="/siswa")
 
@@ -72,6 +76,42 @@ def create_siswa():
         db.session.rollback()
         return jsonify({"success": False, "message": f"Terjadi kesalahan: {str(e)}"}), 500
 
+@siswa_bp.route("/import", methods=["POST"])
+@login_required
+def import_siswa():
+    """Tambah banyak siswa sekaligus dari file roster (.xlsx / .csv) untuk satu kelas.
+
+    Form: kelas_id, file. Kolom file: Nama, NISN, JK (L/P), Status (opsional).
+    Baris yang valid disimpan; baris yang ditolak dikembalikan per nomor baris.
+    """
+    kelas_id = request.form.get("kelas_id", type=int)
+    berkas = request.files.get("file")
+    if not kelas_id or not berkas or not berkas.filename:
+        return jsonify({"success": False, "message": "kelas_id dan file wajib diisi."}), 400
+
+    kelas = db.session.get(Kelas, kelas_id)
+    if not kelas:
+        return jsonify({"success": False, "message": "Kelas tidak ditemukan."}), 404
+    if not current_user.pegawai or kelas.wali_kelas_id != current_user.pegawai.id:
+        return jsonify({"success": False, "message": "Anda bukan wali kelas dari kelas ini."}), 403
+
+    try:
+        ditambahkan, ditolak = impor_siswa_kelas(kelas, baca_roster(berkas.stream, berkas.filename))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": f"Terjadi kesalahan: {str(e)}"}), 500
+
+    return jsonify({
+        "success": True,
+        "message": f"{ditambahkan} siswa ditambahkan, {len(ditolak)} baris ditolak.",
+        "ditambahkan": ditambahkan,
+        "ditolak": ditolak
+    })
+
 @siswa_bp.route("/list/<int:kelas_id>")
 @login_required
 def list_siswa(kelas_id):
@@ -81,19 +121,23 @@ def list_siswa(kelas_id):
     if not current_user.pegawai or kelas.wali_kelas_id != current_user.pegawai.id:
         return jsonify({"success": False, "message": "Anda bukan wali kelas kelas ini."}), 403
 
-    siswa = Siswa.query.filter_by(kelas_id=kelas.id).all()
-    return jsonify({
-        "success": True,
-        "siswa": [
-            {
-                "id": s.id,
-                "nama_siswa": s.nama_siswa,
-                "nisn": s.nisn,
-                "jenis_kelamin": s.jenis_kelamin,
-                "status": s.status
-            } for s in siswa
-        ]
-    })
+    def buat_respon():
+        siswa = Siswa.query.filter_by(kelas_id=kelas.id).all()
+        return jsonify({
+            "success": True,
+            "siswa": [
+                {
+                    "id": s.id,
+                    "nama_siswa": s.nama_siswa,
+                    "nisn": s.nisn,
+                    "jenis_kelamin": s.jenis_kelamin,
+                    "status": s.status
+                } for s in siswa
+            ]
+        })
+
+    # 304 bila daftar siswa belum berubah sejak dimuat klien
+    return respon_bersyarat(*versi_kelas(kelas.id), buat_respon)
 
 @siswa_bp.route("/delete/<int:id>", methods=["POST"])
 @login_required
@@ -104,7 +148,10 @@ def delete_siswa(id):
     if not current_user.pegawai or kelas.wali_kelas_id != current_user.pegawai.id:
         return jsonify({"success": False, "message": "Anda bukan wali kelas kelas ini."}), 403
 
+    # Agregat semester milik siswa ikut dihapus
+    RekapSiswaSemester.query.filter_by(siswa_id=siswa.id).delete(synchronize_session=False)
     db.session.delete(siswa)
+    rebuild_rekap_kelas_bulan(kelas.id)
     db.session.commit()
     return jsonify({"success": True, "message": "Siswa berhasil dihapus."})
 
@@ -146,10 +193,14 @@ def update_siswa(id):
 
     try:
         # update data siswa
+        jk_berubah = siswa.jenis_kelamin != jk
         siswa.nama_siswa = nama
         siswa.nisn = nisn  # ✅ SEKARANG WAJIB, TIDAK ADA NULL
         siswa.jenis_kelamin = jk
         siswa.status = status
+        if jk_berubah:
+            # rekap dipisah per jenis kelamin, hitung ulang kelas ini
+            rebuild_rekap_kelas_bulan(kelas.id)
         db.session.commit()
 
         return jsonify({
@@ -171,34 +222,14 @@ def update_siswa(id):
 @login_required
 def search_siswa():
     query = request.args.get("q", "").strip()
-    kelas_id = request.args.get("kelas_id")
+    kelas_id = request.args.get("kelas_id", type=int)
     
     if not query:
         return jsonify({"success": False, "message": "Masukkan kata kunci pencarian"})
     
-    # Cari siswa berdasarkan nama atau NISN
-    siswa_list = Siswa.query.filter(
-        db.or_(
-            Siswa.nama_siswa.ilike(f"%{query}%"),
-            Siswa.nisn.ilike(f"%{query}%")
-        )
-    )
-    
-    # Filter: cari siswa yang TIDAK di kelas mana pun di SEKOLAH YANG SAMA dan TAHUN AJARAN YANG SAMA
-    if kelas_id:
-        kelas = Kelas.query.get(kelas_id)
-        if kelas:
-            # Cari siswa yang tidak ada di sekolah yang sama dan tahun ajaran yang sama
-            siswa_list = siswa_list.filter(
-                ~Siswa.kelas_id.in_(
-                    db.session.query(Kelas.id).filter(
-                        Kelas.sekolah_id == kelas.sekolah_id,
-                        Kelas.tahun_ajaran_id == kelas.tahun_ajaran_id
-                    )
-                )
-            )
-    
-    siswa_list = siswa_list.limit(20).all()
+    # Prefix NISN / prefix kata nama lewat index, kelas & sekolah di-load dalam query yang sama
+    kelas = db.session.get(Kelas, kelas_id) if kelas_id else None
+    siswa_list = cari_siswa(query, kelas)
     
     results = []
     for siswa in siswa_list:
@@ -243,7 +274,12 @@ def add_siswa_to_class():
     if not siswa:
         return jsonify({"success": False, "message": "Siswa tidak ditemukan"})
     
+    kelas_lama_id = siswa.kelas_id
     siswa.kelas_id = kelas_id
+    # siswa pindah kelas: hitung ulang rekap kelas lama dan kelas baru
+    if kelas_lama_id:
+        rebuild_rekap_kelas_bulan(kelas_lama_id)
+    rebuild_rekap_kelas_bulan(kelas_id)
     db.session.commit()
     
     return jsonify({
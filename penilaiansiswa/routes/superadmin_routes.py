@@ -3,10 +3,14 @@ from flask_login import login_required, current_user
 from penilaiansiswa import db
 from penilaiansiswa.models.users import User, Pegawai
 from penilaiansiswa.models.sekolah import Sekolah
-from penilaiansiswa.models import Kebiasaan, Kelas, Siswa, TahunAjaran
-from sqlalchemy import func, extract
+from penilaiansiswa.models import TahunAjaran
 from datetime import datetime
 from passlib.hash import bcrypt
+from penilaiansiswa.utils.statistik import (
+    get_statistik, statistik_wilayah, statistik_wilayah_bulanan, LEVEL_WILAYAH,
+    trend_bulanan, daftar_bulan, bulan_tahun_ajaran, tahun_ajaran_berjalan
+)
+from penilaiansiswa.utils.log_aktivitas import daftar_log, ringkasan_harian, MAKS_LIMIT_LOG
 
 superadmin_bp = Blueprint("superadmin", __name__, url_prefix="/superadmin")
 
@@ -35,260 +39,210 @@ def dashboard():
 def api_statistik():
     if not current_user.is_superadmin:
         return jsonify({"error": "Unauthorized"}), 403
-    
-    # Data statistik dasar
-    total_users = User.query.count()
-    total_pegawai = Pegawai.query.count()
-    total_sekolah_aktif = Sekolah.query.count()
-    
-    # Ambil tahun ajaran terakhir
-    tahun_ajaran_terakhir = TahunAjaran.query.order_by(TahunAjaran.id.desc()).first()
-    tahun_ajaran_text = tahun_ajaran_terakhir.tahun_ajaran if tahun_ajaran_terakhir else "2025/2026"
-    
-    # Data untuk 7 grafik kebiasaan
-    kebiasaan_fields = ['bangun_pagi', 'beribadah', 'berolahraga', 'sehat_dan_lemar', 'belajar', 'bermasyarakat', 'tidur_cepat']
-    kebiasaan_labels = ['Bangun Pagi', 'Beribadah', 'Berolahraga', 'Sehat & Bergizi', 'Belajar', 'Bermasyarakat', 'Tidur Cepat']
-    
-    habits_data = {}
-    
-    # Ambil semua sekolah dari database
-    semua_sekolah_db = Sekolah.query.all()
-    
-    # Untuk setiap kebiasaan, buat data untuk semua sekolah
-    for i, field_name in enumerate(kebiasaan_fields):
-        field_label = kebiasaan_labels[i]
-        
-        # Dictionary untuk menyimpan rata-rata per sekolah
-        rata_rata_per_sekolah = {}
-        
-        # Query semua kebiasaan yang punya nilai untuk field ini
-        try:
-            results = db.session.query(
-                Sekolah.nama_sekolah,
-                func.avg(getattr(Kebiasaan, field_name)).label('rata_rata')
-            ).join(Kelas, Kelas.id == Kebiasaan.kelas_id
-            ).join(Sekolah, Sekolah.id == Kelas.sekolah_id
-            ).filter(getattr(Kebiasaan, field_name).isnot(None)
-            ).group_by(Sekolah.id, Sekolah.nama_sekolah
-            ).all()
-            
-            for result in results:
-                rata_rata_per_sekolah[result.nama_sekolah] = float(result.rata_rata or 0)
-            
-        except Exception as e:
-            # Jika error, lanjutkan dengan data kosong
-            continue
-        
-        # Siapkan data untuk grafik (maksimal 10 sekolah teratas)
-        sekolah_dengan_data = []
-        for sekolah in semua_sekolah_db:
-            nilai = rata_rata_per_sekolah.get(sekolah.nama_sekolah, 0)
-            if nilai > 0:  # Hanya tampilkan sekolah dengan nilai > 0
-                sekolah_dengan_data.append((sekolah.nama_sekolah, nilai))
-        
-        # Jika tidak ada sekolah dengan data, coba tanpa filter nilai > 0
-        if not sekolah_dengan_data:
-            for sekolah in semua_sekolah_db:
-                nilai = rata_rata_per_sekolah.get(sekolah.nama_sekolah, 0)
-                sekolah_dengan_data.append((sekolah.nama_sekolah, nilai))
-        
-        # Urutkan berdasarkan nilai descending
-        sekolah_dengan_data.sort(key=lambda x: x[1], reverse=True)
-        
-        # Ambil maksimal 10 teratas
-        if len(sekolah_dengan_data) > 10:
-            sekolah_dengan_data = sekolah_dengan_data[:10]
-        
-        labels = [item[0] for item in sekolah_dengan_data]
-        data = [item[1] for item in sekolah_dengan_data]
-        
-        habits_data[field_label] = {
-            'labels': labels,
-            'data': data
-        }
-    
-    # Data untuk line chart
-    urutan_bulan_tahun_ajaran = [
-        '2025-07', '2025-08', '2025-09', '2025-10', '2025-11', '2025-12',
-        '2026-01', '2026-02', '2026-03', '2026-04', '2026-05', '2026-06'
-    ]
-    
-    nama_bulan_tampilan = {
-        '2025-07': 'Jul 2025', '2025-08': 'Agust 2025', '2025-09': 'Sept 2025', 
-        '2025-10': 'Okt 2025', '2025-11': 'Nop 2025', '2025-12': 'Des 2025',
-        '2026-01': 'Jan 2026', '2026-02': 'Feb 2026', '2026-03': 'Mar 2026', 
-        '2026-04': 'Apr 2026', '2026-05': 'Mei 2026', '2026-06': 'Jun 2026'
-    }
-    
+
+    # Snapshot di-cache (STATISTIK_CACHE_TTL) dan dikosongkan saat data kebiasaan berubah
+    return jsonify(get_statistik())
+
+
+# Batas rentang bulan untuk endpoint trend
+MAKS_BULAN_TREND = 60
+
+
+def _parameter_bulan():
+    """Ambil & validasi filter ?bulan_dari=YYYY-MM&bulan_sampai=YYYY-MM (opsional)."""
+    hasil = []
+    for nama in ("bulan_dari", "bulan_sampai"):
+        nilai = request.args.get(nama) or None
+        if nilai:
+            try:
+                datetime.strptime(nilai, "%Y-%m")
+            except ValueError:
+                raise ValueError(f"Format {nama} harus YYYY-MM")
+        hasil.append(nilai)
+    return hasil
+
+
+@superadmin_bp.route("/api/statistik/trend")
+@login_required
+def api_statistik_trend():
+    """Trend rata-rata kebiasaan per bulan (format Chart.js).
+
+    Pilih salah satu: ?tahun_ajaran=2025/2026, ?tahun_ajaran_id=<id>, atau
+    ?bulan_dari=YYYY-MM&bulan_sampai=YYYY-MM. Default: tahun ajaran berjalan.
+    """
+    if not current_user.is_superadmin:
+        return jsonify({"error": "Unauthorized"}), 403
+
     try:
-        # Query trend data
-        query_trend = db.session.query(
-            Kebiasaan.bulan,
-            func.avg(Kebiasaan.bangun_pagi).label('bangun_pagi'),
-            func.avg(Kebiasaan.beribadah).label('beribadah'),
-            func.avg(Kebiasaan.berolahraga).label('berolahraga'),
-            func.avg(Kebiasaan.sehat_dan_lemar).label('sehat_dan_lemar'),
-            func.avg(Kebiasaan.belajar).label('belajar'),
-            func.avg(Kebiasaan.bermasyarakat).label('bermasyarakat'),
-            func.avg(Kebiasaan.tidur_cepat).label('tidur_cepat')
-        ).filter(Kebiasaan.bulan.isnot(None))
-        
-        bulan_stats = query_trend.group_by(Kebiasaan.bulan).all()
-        
-        bulan_data = {b.bulan: b for b in bulan_stats}
-        
-        trend_datasets = []
-        for i, field in enumerate(kebiasaan_fields):
-            data_per_bulan = []
-            for bulan in urutan_bulan_tahun_ajaran:
-                if bulan in bulan_data:
-                    data_per_bulan.append(float(getattr(bulan_data[bulan], field) or 0))
-                else:
-                    data_per_bulan.append(None)
-            
-            trend_datasets.append({
-                'label': kebiasaan_labels[i],
-                'data': data_per_bulan,
-                'borderColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#2E8B57'][i],
-                'tension': 0.3,
-                'spanGaps': True
-            })
-        
-        trend_data = {
-            'labels': [nama_bulan_tampilan[b] for b in urutan_bulan_tahun_ajaran],
-            'datasets': trend_datasets
-        }
-        
-    except Exception as e:
-        # Fallback trend data jika error
-        trend_data = {
-            'labels': ['Jul 2025', 'Agust 2025', 'Sept 2025'],
-            'datasets': [{
-                'label': 'Sample Data',
-                'data': [20, 22, 24],
-                'borderColor': '#FF6384',
-                'tension': 0.3
-            }]
-        }
-    
-    # Data sekolah untuk tabel
-    sekolah_stats = []
-    
-    for sekolah in semua_sekolah_db:
+        bulan_dari, bulan_sampai = _parameter_bulan()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    if bulan_dari or bulan_sampai:
+        if not (bulan_dari and bulan_sampai) or bulan_dari > bulan_sampai:
+            return jsonify({"success": False, "message": "bulan_dari dan bulan_sampai harus diisi dan berurutan"}), 400
+        bulan_list = daftar_bulan(bulan_dari, bulan_sampai)
+        if len(bulan_list) > MAKS_BULAN_TREND:
+            return jsonify({"success": False, "message": f"Rentang maksimal {MAKS_BULAN_TREND} bulan"}), 400
+        periode = f"{bulan_dari} s/d {bulan_sampai}"
+    else:
+        tahun_ajaran = request.args.get("tahun_ajaran")
+        tahun_ajaran_id = request.args.get("tahun_ajaran_id", type=int)
+        if tahun_ajaran_id:
+            ta = TahunAjaran.query.get(tahun_ajaran_id)
+            if not ta:
+                return jsonify({"success": False, "message": "Tahun ajaran tidak ditemukan"}), 404
+            tahun_ajaran = ta.tahun_ajaran
+        tahun_ajaran = tahun_ajaran or tahun_ajaran_berjalan()
         try:
-            # Query data sekolah
-            stats_query = db.session.query(
-                func.avg(Kebiasaan.bangun_pagi).label('bangun_pagi'),
-                func.avg(Kebiasaan.beribadah).label('beribadah'),
-                func.avg(Kebiasaan.berolahraga).label('berolahraga'),
-                func.avg(Kebiasaan.sehat_dan_lemar).label('sehat_dan_lemar'),
-                func.avg(Kebiasaan.belajar).label('belajar'),
-                func.avg(Kebiasaan.bermasyarakat).label('bermasyarakat'),
-                func.avg(Kebiasaan.tidur_cepat).label('tidur_cepat')
-            ).join(Kelas, Kelas.id == Kebiasaan.kelas_id
-            ).filter(Kelas.sekolah_id == sekolah.id)
-            
-            stats = stats_query.first()
-            
-            if stats:
-                nilai_nilai = [
-                    float(stats.bangun_pagi or 0),
-                    float(stats.beribadah or 0),
-                    float(stats.berolahraga or 0),
-                    float(stats.sehat_dan_lemar or 0),
-                    float(stats.belajar or 0),
-                    float(stats.bermasyarakat or 0),
-                    float(stats.tidur_cepat or 0)
-                ]
-                
-                # Filter nilai yang valid (tidak None dan > 0)
-                nilai_valid = [nilai for nilai in nilai_nilai if nilai is not None and nilai > 0]
-                
-                if nilai_valid:
-                    rata_rata = sum(nilai_valid) / len(nilai_valid)
-                    sekolah_stats.append({
-                        'sekolah': sekolah.nama_sekolah,
-                        'bangun_pagi': float(stats.bangun_pagi or 0),
-                        'beribadah': float(stats.beribadah or 0),
-                        'berolahraga': float(stats.berolahraga or 0),
-                        'sehat_dan_lemar': float(stats.sehat_dan_lemar or 0),
-                        'belajar': float(stats.belajar or 0),
-                        'bermasyarakat': float(stats.bermasyarakat or 0),
-                        'tidur_cepat': float(stats.tidur_cepat or 0),
-                        'rata_rata': rata_rata
-                    })
-                else:
-                    # Semua nilai 0 atau None
-                    sekolah_stats.append({
-                        'sekolah': sekolah.nama_sekolah,
-                        'bangun_pagi': 0,
-                        'beribadah': 0,
-                        'berolahraga': 0,
-                        'sehat_dan_lemar': 0,
-                        'belajar': 0,
-                        'bermasyarakat': 0,
-                        'tidur_cepat': 0,
-                        'rata_rata': 0
-                    })
-            else:
-                # Tidak ada data
-                sekolah_stats.append({
-                    'sekolah': sekolah.nama_sekolah,
-                    'bangun_pagi': 0,
-                    'beribadah': 0,
-                    'berolahraga': 0,
-                    'sehat_dan_lemar': 0,
-                    'belajar': 0,
-                    'bermasyarakat': 0,
-                    'tidur_cepat': 0,
-                    'rata_rata': 0
-                })
-                
-        except Exception as e:
-            # Jika error, tambahkan dengan nilai default
-            sekolah_stats.append({
-                'sekolah': sekolah.nama_sekolah,
-                'bangun_pagi': 0,
-                'beribadah': 0,
-                'berolahraga': 0,
-                'sehat_dan_lemar': 0,
-                'belajar': 0,
-                'bermasyarakat': 0,
-                'tidur_cepat': 0,
-                'rata_rata': 0
-            })
-    
-    # Urutkan sekolah berdasarkan rata-rata
-    sekolah_stats_sorted = sorted(sekolah_stats, key=lambda x: x['rata_rata'], reverse=True)
-    
-    # Hitung overall performance
+            bulan_list = bulan_tahun_ajaran(tahun_ajaran)
+        except ValueError:
+            return jsonify({"success": False, "message": "Format tahun ajaran harus YYYY/YYYY"}), 400
+        periode = tahun_ajaran
+
+    return jsonify({"success": True, "periode": periode, "trend_data": trend_bulanan(bulan_list)})
+
+
+@superadmin_bp.route("/api/statistik/wilayah")
+@login_required
+def api_statistik_wilayah():
+    """Drill-down rata-rata kebiasaan: provinsi -> kabupaten -> kecamatan -> sekolah.
+
+    ?level=kabupaten&induk_id=<provinsi_id>[&bulan_dari=YYYY-MM&bulan_sampai=YYYY-MM]
+    """
+    if not current_user.is_superadmin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    level = request.args.get("level", "provinsi")
+    if level not in LEVEL_WILAYAH:
+        return jsonify({"success": False, "message": f"Level harus salah satu dari: {', '.join(LEVEL_WILAYAH)}"}), 400
+    induk_id = request.args.get("induk_id", type=int)
+
     try:
-        total_performance = db.session.query(
-            func.avg(Kebiasaan.bangun_pagi),
-            func.avg(Kebiasaan.beribadah),
-            func.avg(Kebiasaan.berolahraga),
-            func.avg(Kebiasaan.sehat_dan_lemar),
-            func.avg(Kebiasaan.belajar),
-            func.avg(Kebiasaan.bermasyarakat),
-            func.avg(Kebiasaan.tidur_cepat)
-        ).first()
-        
-        overall_avg = sum([val or 0 for val in total_performance]) / 7
-    except:
-        overall_avg = 0
-    
-    response_data = {
-        'tahun_ajaran': tahun_ajaran_text,
-        'total_users': total_users,
-        'total_pegawai': total_pegawai,
-        'total_sekolah': total_sekolah_aktif,
-        'overall_performance': round(overall_avg, 1),
-        'habits_data': habits_data,
-        'trend_data': trend_data,
-        'sekolah_stats': sekolah_stats_sorted
-    }
-    
-    return jsonify(response_data)
+        bulan_dari, bulan_sampai = _parameter_bulan()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "level": level,
+        "induk_id": induk_id,
+        "data": statistik_wilayah(level, induk_id, bulan_dari, bulan_sampai)
+    })
+
+
+@superadmin_bp.route("/api/statistik/wilayah/<level>/<int:wilayah_id>")
+@login_required
+def api_statistik_wilayah_bulanan(level, wilayah_id):
+    """Rata-rata kebiasaan per bulan untuk satu wilayah/sekolah."""
+    if not current_user.is_superadmin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    if level not in LEVEL_WILAYAH:
+        return jsonify({"success": False, "message": f"Level harus salah satu dari: {', '.join(LEVEL_WILAYAH)}"}), 400
+
+    try:
+        bulan_dari, bulan_sampai = _parameter_bulan()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "level": level,
+        "wilayah_id": wilayah_id,
+        "data": statistik_wilayah_bulanan(level, wilayah_id, bulan_dari, bulan_sampai)
+    })
+
+# ===== API LOG AKTIVITAS =====
+def _parameter_tanggal(nama):
+    """Ambil filter ?<nama>=YYYY-MM-DD (opsional) sebagai datetime."""
+    nilai = request.args.get(nama) or None
+    if not nilai:
+        return None
+    try:
+        return datetime.strptime(nilai, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"Format {nama} harus YYYY-MM-DD")
+
+
+@superadmin_bp.route("/api/log-aktivitas")
+@login_required
+def api_log_aktivitas():
+    """Log aktivitas terbaru dulu, per halaman.
+
+    Filter opsional: ?user_id=, ?tabel=&entri_id=, ?aksi=, ?dari=YYYY-MM-DD&sampai=YYYY-MM-DD
+    (sampai eksklusif). Halaman berikutnya: kirim ?cursor=<next_cursor> dari respon sebelumnya.
+    """
+    if not current_user.is_superadmin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        user_id = request.args.get("user_id", type=int)
+        entri_id = request.args.get("entri_id", type=int)
+        limit = min(max(request.args.get("limit", 50, type=int), 1), MAKS_LIMIT_LOG)
+        rows, next_cursor = daftar_log(
+            user_id=user_id,
+            tabel=request.args.get("tabel") or None,
+            entri_id=entri_id,
+            aksi=request.args.get("aksi") or None,
+            dari=_parameter_tanggal("dari"),
+            sampai=_parameter_tanggal("sampai"),
+            cursor=request.args.get("cursor") or None,
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "data": [
+            {
+                "id": row.id,
+                "user_id": row.user_id,
+                "aksi": row.aksi,
+                "tabel": row.tabel,
+                "entri_id": row.entri_id,
+                "keterangan": row.keterangan,
+                "timestamp": row.timestamp.isoformat() if row.timestamp else None
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor
+    })
+
+
+@superadmin_bp.route("/api/log-aktivitas/harian")
+@login_required
+def api_log_aktivitas_harian():
+    """Ringkasan harian log yang sudah diarsipkan (flask log arsip). user_id 0 = sistem/CLI."""
+    if not current_user.is_superadmin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        dari, sampai = _parameter_tanggal("dari"), _parameter_tanggal("sampai")
+        rows = ringkasan_harian(
+            user_id=request.args.get("user_id", type=int),
+            tabel=request.args.get("tabel") or None,
+            dari=dari.date() if dari else None,
+            sampai=sampai.date() if sampai else None
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "data": [
+            {
+                "tanggal": row.tanggal.isoformat(),
+                "user_id": row.user_id,
+                "tabel": row.tabel,
+                "aksi": row.aksi,
+                "jumlah": row.jumlah
+            }
+            for row in rows
+        ]
+    })
+
 @superadmin_bp.route("/api/users")
 @login_required
 def api_users():
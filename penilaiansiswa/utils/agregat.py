@@ -0,0 +1,356 @@
+from datetime import datetime
+from sqlalchemy import select, func, case, and_, or_, literal
+from penilaiansiswa import db
+from penilaiansiswa.models import (
+    Kebiasaan, Siswa, Kelas, Sekolah, Kecamatan, Kabupaten,
+    RekapKelasBulan, RekapSiswaSemester, StatistikWilayahBulan
+)
+from penilaiansiswa.utils.rekap import (
+    KEBIASAAN_FIELDS, AMBANG_TERBIASA, semester_dari_bulan, bulan_semester, hitung_agregat_siswa
+)
+from penilaiansiswa.utils.upsert import upsert
+from penilaiansiswa.utils.statistik import invalidate_statistik, invalidate_trend
+from penilaiansiswa.utils.versi_data import naikkan_versi
+
+# Kolom hitungan di rekap_kelas_bulan yang diperbarui secara delta
+KOLOM_REKAP = ["jumlah_terisi", "terbiasa_semua"] + [f"{field}_terbiasa" for field in KEBIASAAN_FIELDS]
+
+# Kunci unik rekap_siswa_semester
+KUNCI_REKAP_SISWA = ["siswa_id", "kelas_id", "tahun_ajaran", "semester"]
+
+# Kolom id wilayah tiap level kubus statistik (lihat _wilayah_kelas)
+KOLOM_WILAYAH = [
+    ("sekolah", Kelas.sekolah_id),
+    ("kecamatan", Sekolah.kecamatan_id),
+    ("kabupaten", Kecamatan.kabupaten_id),
+    ("provinsi", Kabupaten.provinsi_id),
+]
+
+# Ukuran batch insert saat rebuild
+UKURAN_BATCH = 500
+
+
+# =========================
+# HELPER PERUBAHAN
+# =========================
+def _angka(nilai):
+    # nilai dari form masih berupa string sampai di-flush
+    if nilai is None or nilai == "":
+        return None
+    return int(nilai)
+
+
+def nilai_kebiasaan(kebiasaan):
+    """Snapshot nilai 7 kebiasaan dari objek Kebiasaan (None jika barisnya belum ada)."""
+    if kebiasaan is None:
+        return None
+    return {field: _angka(getattr(kebiasaan, field)) for field in KEBIASAAN_FIELDS}
+
+
+def perubahan_kebiasaan(siswa, kelas_id, bulan, lama, baru, siswa_id=None):
+    """Satu item perubahan untuk sinkron_agregat_kebiasaan().
+
+    lama/baru: dict nilai per field (hasil nilai_kebiasaan), None = baris tidak ada.
+    siswa None (baris yatim, siswanya sudah dihapus): isi siswa_id; hanya
+    statistik wilayah, rekap semester dan versi kelas yang ikut berubah.
+    """
+    return {
+        "siswa_id": siswa.id if siswa is not None else siswa_id,
+        "jenis_kelamin": siswa.jenis_kelamin if siswa is not None else None,
+        # rekap_kelas_bulan hanya mencakup siswa yang masih di kelas asal nilai ini
+        "di_kelas": siswa is not None and siswa.kelas_id == int(kelas_id),
+        "kelas_id": int(kelas_id),
+        "bulan": bulan,
+        "lama": lama,
+        "baru": baru,
+    }
+
+
+def sinkron_agregat_kebiasaan(perubahan):
+    """Perbarui tabel agregat dari daftar perubahan baris Kebiasaan.
+
+    Dipanggil oleh setiap jalur tulis Kebiasaan SEBELUM commit,
+    sehingga agregat (dan versi ETag grid) ikut satu transaksi dengan data aslinya.
+    """
+    if not perubahan:
+        return
+    _delta_rekap_kelas_bulan(perubahan)
+    _refresh_rekap_siswa_semester(perubahan)
+    _delta_statistik_wilayah(perubahan)
+    naikkan_versi({(item["kelas_id"], item["bulan"]) for item in perubahan})
+    invalidate_statistik()
+    invalidate_trend({item["bulan"] for item in perubahan})
+
+
+# =========================
+# REKAP KELAS BULAN
+# =========================
+def _kontribusi_rekap(nilai):
+    """Kontribusi satu baris nilai terhadap kolom-kolom rekap_kelas_bulan."""
+    hasil = dict.fromkeys(KOLOM_REKAP, 0)
+    if not nilai or all(nilai.get(field) is None for field in KEBIASAAN_FIELDS):
+        return hasil
+
+    hasil["jumlah_terisi"] = 1
+    semua_terbiasa = True
+    for field in KEBIASAAN_FIELDS:
+        if (nilai.get(field) or 0) >= AMBANG_TERBIASA:
+            hasil[f"{field}_terbiasa"] = 1
+        else:
+            semua_terbiasa = False
+    hasil["terbiasa_semua"] = 1 if semua_terbiasa else 0
+    return hasil
+
+
+def _delta_rekap_kelas_bulan(perubahan):
+    delta = {}
+    for item in perubahan:
+        if not item["di_kelas"]:
+            continue
+        key = (item["kelas_id"], item["bulan"], item["jenis_kelamin"])
+        lama = _kontribusi_rekap(item["lama"])
+        baru = _kontribusi_rekap(item["baru"])
+        total = delta.setdefault(key, dict.fromkeys(KOLOM_REKAP, 0))
+        for col in KOLOM_REKAP:
+            total[col] += baru[col] - lama[col]
+
+    now = datetime.utcnow()
+    rows = [
+        dict(kelas_id=kelas_id, bulan=bulan, jenis_kelamin=jk, updated_at=now, **hitungan)
+        for (kelas_id, bulan, jk), hitungan in delta.items()
+        if any(hitungan.values())
+    ]
+    upsert(
+        RekapKelasBulan.__table__, rows,
+        kunci=["kelas_id", "bulan", "jenis_kelamin"],
+        tambah=KOLOM_REKAP,
+        ganti=["updated_at"],
+    )
+
+
+def rebuild_rekap_kelas_bulan(kelas_id=None):
+    """Hitung ulang rekap_kelas_bulan dari tabel kebiasaan dengan satu INSERT ... SELECT.
+
+    kelas_id=None berarti semua kelas. Hanya siswa yang masih berada di kelas
+    tersebut yang dihitung (sama seperti laporan RCHK). Tidak melakukan commit.
+    """
+    db.session.flush()
+
+    tabel = RekapKelasBulan.__table__
+    hapus = tabel.delete()
+    if kelas_id:
+        hapus = hapus.where(tabel.c.kelas_id == kelas_id)
+    db.session.execute(hapus)
+
+    def terbiasa(field):
+        return func.coalesce(getattr(Kebiasaan, field), 0) >= AMBANG_TERBIASA
+
+    terisi = or_(*[getattr(Kebiasaan, field).isnot(None) for field in KEBIASAAN_FIELDS])
+    semua = and_(*[terbiasa(field) for field in KEBIASAAN_FIELDS])
+
+    sumber = select(
+        Kebiasaan.kelas_id,
+        Kebiasaan.bulan,
+        Siswa.jenis_kelamin,
+        func.sum(case((terisi, 1), else_=0)),
+        func.sum(case((semua, 1), else_=0)),
+        *[func.sum(case((terbiasa(field), 1), else_=0)) for field in KEBIASAAN_FIELDS],
+        literal(datetime.utcnow()),
+    ).join(
+        Siswa, and_(Siswa.id == Kebiasaan.siswa_id, Siswa.kelas_id == Kebiasaan.kelas_id)
+    ).group_by(Kebiasaan.kelas_id, Kebiasaan.bulan, Siswa.jenis_kelamin)
+    if kelas_id:
+        sumber = sumber.where(Kebiasaan.kelas_id == kelas_id)
+
+    kolom = ["kelas_id", "bulan", "jenis_kelamin"] + KOLOM_REKAP + ["updated_at"]
+    db.session.execute(tabel.insert().from_select(kolom, sumber))
+
+
+# =========================
+# REKAP SISWA SEMESTER
+# =========================
+def _baris_rekap_siswa(kunci, nilai_per_bulan, now):
+    """Satu baris rekap_siswa_semester dari nilai bulanan satu siswa."""
+    siswa_id, kelas_id, tahun_ajaran, semester = kunci
+    baris = dict(
+        siswa_id=siswa_id, kelas_id=kelas_id,
+        tahun_ajaran=tahun_ajaran, semester=semester, updated_at=now
+    )
+    for field, agregat in hitung_agregat_siswa(nilai_per_bulan).items():
+        for nama, nilai in agregat.items():
+            baris[f"{field}_{nama}"] = nilai
+    return baris
+
+
+def _refresh_rekap_siswa_semester(perubahan):
+    """Hitung ulang baris semester untuk setiap siswa yang nilainya berubah.
+
+    Satu semester hanya 6 bulan, jadi seluruh bulan siswa terdampak dimuat
+    dengan satu query lalu ditulis ulang sekaligus lewat upsert.
+    """
+    kunci_set = set()
+    for item in perubahan:
+        try:
+            tahun_ajaran, semester = semester_dari_bulan(item["bulan"])
+        except (ValueError, AttributeError):
+            continue
+        kunci_set.add((item["siswa_id"], item["kelas_id"], tahun_ajaran, semester))
+    if not kunci_set:
+        return
+
+    bulan_set = set()
+    for _, _, tahun_ajaran, semester in kunci_set:
+        bulan_set.update(bulan_semester(tahun_ajaran, semester))
+
+    db.session.flush()
+    rows = db.session.query(
+        Kebiasaan.siswa_id,
+        Kebiasaan.kelas_id,
+        Kebiasaan.bulan,
+        *[getattr(Kebiasaan, field) for field in KEBIASAAN_FIELDS]
+    ).filter(
+        Kebiasaan.siswa_id.in_({k[0] for k in kunci_set}),
+        Kebiasaan.kelas_id.in_({k[1] for k in kunci_set}),
+        Kebiasaan.bulan.in_(bulan_set)
+    ).all()
+
+    nilai = {kunci: {} for kunci in kunci_set}
+    for row in rows:
+        kunci = (row.siswa_id, row.kelas_id) + semester_dari_bulan(row.bulan)
+        per_bulan = nilai.get(kunci)
+        if per_bulan is None:
+            continue
+        per_bulan[row.bulan] = {field: getattr(row, field) for field in KEBIASAAN_FIELDS}
+
+    now = datetime.utcnow()
+    baris = [_baris_rekap_siswa(kunci, per_bulan, now) for kunci, per_bulan in nilai.items()]
+    kolom_ganti = [col for col in baris[0] if col not in KUNCI_REKAP_SISWA]
+    upsert(RekapSiswaSemester.__table__, baris, kunci=KUNCI_REKAP_SISWA, ganti=kolom_ganti)
+
+
+def rebuild_rekap_siswa_semester(kelas_id=None):
+    """Hitung ulang rekap_siswa_semester dari tabel kebiasaan.
+
+    Nilai dibaca berurutan per siswa/kelas/bulan secara streaming dan
+    ditulis per batch. kelas_id=None berarti semua kelas. Tidak melakukan commit.
+    """
+    db.session.flush()
+
+    tabel = RekapSiswaSemester.__table__
+    hapus = tabel.delete()
+    if kelas_id:
+        hapus = hapus.where(tabel.c.kelas_id == kelas_id)
+    db.session.execute(hapus)
+
+    query = select(
+        Kebiasaan.siswa_id,
+        Kebiasaan.kelas_id,
+        Kebiasaan.bulan,
+        *[getattr(Kebiasaan, field) for field in KEBIASAAN_FIELDS]
+    ).order_by(Kebiasaan.siswa_id, Kebiasaan.kelas_id, Kebiasaan.bulan)
+    if kelas_id:
+        query = query.where(Kebiasaan.kelas_id == kelas_id)
+
+    now = datetime.utcnow()
+    batch = []
+    kunci_aktif, per_bulan = None, {}
+
+    def tulis(paksa=False):
+        if batch and (paksa or len(batch) >= UKURAN_BATCH):
+            db.session.execute(tabel.insert(), batch)
+            batch.clear()
+
+    for row in db.session.execute(query.execution_options(yield_per=UKURAN_BATCH)):
+        try:
+            kunci = (row.siswa_id, row.kelas_id) + semester_dari_bulan(row.bulan)
+        except (ValueError, AttributeError):
+            continue
+        if kunci != kunci_aktif:
+            if kunci_aktif is not None:
+                batch.append(_baris_rekap_siswa(kunci_aktif, per_bulan, now))
+                tulis()
+            kunci_aktif, per_bulan = kunci, {}
+        per_bulan[row.bulan] = {field: getattr(row, field) for field in KEBIASAAN_FIELDS}
+
+    if kunci_aktif is not None:
+        batch.append(_baris_rekap_siswa(kunci_aktif, per_bulan, now))
+    tulis(paksa=True)
+
+
+# =========================
+# KUBUS STATISTIK WILAYAH
+# =========================
+def _join_wilayah(query):
+    """Sambungkan kelas -> sekolah -> kecamatan -> kabupaten (outer join)."""
+    return query.outerjoin(Sekolah, Sekolah.id == Kelas.sekolah_id
+    ).outerjoin(Kecamatan, Kecamatan.id == Sekolah.kecamatan_id
+    ).outerjoin(Kabupaten, Kabupaten.id == Kecamatan.kabupaten_id)
+
+
+def _wilayah_kelas(kelas_ids):
+    """{kelas_id: {level: wilayah_id}} untuk sekumpulan kelas dalam satu query."""
+    query = db.session.query(Kelas.id, *[kolom for _, kolom in KOLOM_WILAYAH]).select_from(Kelas)
+    rows = _join_wilayah(query).filter(Kelas.id.in_(kelas_ids)).all()
+    return {
+        row[0]: {level: row[i + 1] for i, (level, _) in enumerate(KOLOM_WILAYAH)}
+        for row in rows
+    }
+
+
+def _delta_statistik_wilayah(perubahan):
+    wilayah = _wilayah_kelas({item["kelas_id"] for item in perubahan})
+
+    delta = {}
+    for item in perubahan:
+        lama = item["lama"] or {}
+        baru = item["baru"] or {}
+        for field in KEBIASAAN_FIELDS:
+            d_jumlah = (baru.get(field) or 0) - (lama.get(field) or 0)
+            d_banyak = (baru.get(field) is not None) - (lama.get(field) is not None)
+            if not (d_jumlah or d_banyak):
+                continue
+            for level, wilayah_id in wilayah.get(item["kelas_id"], {}).items():
+                if wilayah_id is None:
+                    continue
+                total = delta.setdefault((level, wilayah_id, item["bulan"], field), [0, 0])
+                total[0] += d_jumlah
+                total[1] += d_banyak
+
+    now = datetime.utcnow()
+    rows = [
+        dict(level=level, wilayah_id=wilayah_id, bulan=bulan, field=field,
+             jumlah=jumlah, banyak=banyak, updated_at=now)
+        for (level, wilayah_id, bulan, field), (jumlah, banyak) in delta.items()
+        if jumlah or banyak
+    ]
+    upsert(
+        StatistikWilayahBulan.__table__, rows,
+        kunci=["level", "wilayah_id", "bulan", "field"],
+        tambah=["jumlah", "banyak"],
+        ganti=["updated_at"],
+    )
+
+
+def rebuild_statistik_wilayah():
+    """Hitung ulang seluruh kubus statistik dengan INSERT ... SELECT per level & kebiasaan.
+
+    Perlu dijalankan juga bila kelas/sekolah/wilayah dipindah induknya. Tidak melakukan commit.
+    """
+    db.session.flush()
+
+    tabel = StatistikWilayahBulan.__table__
+    db.session.execute(tabel.delete())
+
+    kolom = ["level", "wilayah_id", "bulan", "field", "jumlah", "banyak", "updated_at"]
+    now = datetime.utcnow()
+    for level, kolom_wilayah in KOLOM_WILAYAH:
+        for field in KEBIASAAN_FIELDS:
+            nilai = getattr(Kebiasaan, field)
+            sumber = _join_wilayah(
+                select(
+                    literal(level), kolom_wilayah, Kebiasaan.bulan, literal(field),
+                    func.coalesce(func.sum(nilai), 0), func.count(nilai), literal(now)
+                ).select_from(Kebiasaan).join(Kelas, Kelas.id == Kebiasaan.kelas_id)
+            ).where(kolom_wilayah.isnot(None), nilai.isnot(None)
+            ).group_by(kolom_wilayah, Kebiasaan.bulan)
+            db.session.execute(tabel.insert().from_select(kolom, sumber))
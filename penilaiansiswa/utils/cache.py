@@ -0,0 +1,49 @@
+import threading
+import time
+
+
+class CacheSederhana:
+    """Cache in-memory sederhana per proses (thread-safe) dengan TTL opsional.
+
+    Tiap worker WSGI punya cache sendiri, jadi TTL dipakai sebagai batas
+    basi maksimum bila perubahan terjadi di proses lain.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Ambil dari cache, atau panggil factory() lalu simpan hasilnya."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def hapus(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,155 @@
+import copy
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import aliased, object_session
+from penilaiansiswa import db
+from penilaiansiswa.models import (
+    User, Pegawai, Provinsi, Kabupaten, Kecamatan, Sekolah, TahunAjaran, Kelas
+)
+from penilaiansiswa.utils.cache import CacheSederhana
+
+# Cache header per (kelas_id, tahun_ajaran_id)
+_header_cache = CacheSederhana()
+
+
+def _ambil_header(kelas_id, tahun_ajaran_id):
+    """Satu query join: kelas -> sekolah -> kecamatan -> kabupaten -> provinsi,
+    tahun ajaran -> kepala sekolah, dan wali kelas (beserta nama user-nya)."""
+    KepalaSekolah = aliased(Pegawai)
+    WaliKelas = aliased(Pegawai)
+    UserKepala = aliased(User)
+    UserWali = aliased(User)
+
+    ta_join = TahunAjaran.id == (tahun_ajaran_id if tahun_ajaran_id else Kelas.tahun_ajaran_id)
+
+    row = db.session.query(
+        Kelas.id.label("kelas_id"),
+        Kelas.nama_kelas,
+        TahunAjaran.id.label("tahun_ajaran_id"),
+        TahunAjaran.tahun_ajaran,
+        TahunAjaran.semester,
+        Sekolah.id.label("sekolah_id"),
+        Sekolah.nama_sekolah,
+        Sekolah.npsn,
+        Kecamatan.nama.label("kecamatan"),
+        Kabupaten.nama.label("kabupaten"),
+        Provinsi.nama.label("provinsi"),
+        KepalaSekolah.id.label("kepala_id"),
+        KepalaSekolah.nip.label("kepala_nip"),
+        UserKepala.nama_lengkap.label("kepala_nama"),
+        WaliKelas.id.label("wali_id"),
+        WaliKelas.nip.label("wali_nip"),
+        UserWali.nama_lengkap.label("wali_nama"),
+    ).select_from(Kelas
+    ).outerjoin(TahunAjaran, ta_join
+    ).outerjoin(Sekolah, Sekolah.id == Kelas.sekolah_id
+    ).outerjoin(Kecamatan, Kecamatan.id == Sekolah.kecamatan_id
+    ).outerjoin(Kabupaten, Kabupaten.id == Kecamatan.kabupaten_id
+    ).outerjoin(Provinsi, Provinsi.id == Kabupaten.provinsi_id
+    ).outerjoin(KepalaSekolah, KepalaSekolah.id == TahunAjaran.kepala_sekolah_id
+    ).outerjoin(UserKepala, UserKepala.id == KepalaSekolah.user_id
+    ).outerjoin(WaliKelas, WaliKelas.id == Kelas.wali_kelas_id
+    ).outerjoin(UserWali, UserWali.id == WaliKelas.user_id
+    ).filter(Kelas.id == kelas_id).first()
+
+    if not row:
+        return None
+
+    return {
+        "kelas": {"id": row.kelas_id, "nama_kelas": row.nama_kelas},
+        "tahun_ajaran": {
+            "id": row.tahun_ajaran_id,
+            "tahun_ajaran": row.tahun_ajaran,
+            "semester": row.semester
+        } if row.tahun_ajaran_id else None,
+        "sekolah": {
+            "nama": row.nama_sekolah or "",
+            "npsn": row.npsn or "",
+            "kecamatan": row.kecamatan or "",
+            "kabupaten": row.kabupaten or "",
+            "provinsi": row.provinsi or ""
+        },
+        "kepala_sekolah": {
+            "nama": row.kepala_nama or "",
+            "nip": row.kepala_nip or ""
+        } if row.kepala_id else {"nama": "", "nip": ""},
+        "wali_kelas": {
+            "nama": row.wali_nama or "",
+            "nip": row.wali_nip or ""
+        } if row.wali_id else {"nama": "", "nip": ""},
+    }
+
+
+def get_header_laporan(kelas_id, tahun_ajaran_id=None):
+    """Header laporan (sekolah, wilayah, kepala sekolah, wali kelas) untuk satu kelas.
+
+    Jika tahun_ajaran_id tidak diisi, dipakai tahun ajaran milik kelas.
+    Hasil di-cache per (kelas_id, tahun_ajaran_id) dan dikosongkan otomatis setelah
+    commit yang mengubah kolom header (lihat KOLOM_HEADER) atau menghapus barisnya.
+    Return None jika kelas tidak ditemukan.
+    """
+    key = (int(kelas_id), int(tahun_ajaran_id) if tahun_ajaran_id else None)
+    ttl = current_app.config.get("LAPORAN_HEADER_CACHE_TTL", 300)
+    header = _header_cache.get_or_set(key, lambda: _ambil_header(*key), ttl=ttl)
+    # salinan agar route bebas mengubah dict tanpa merusak isi cache
+    return copy.deepcopy(header)
+
+
+def invalidate_header_laporan(*args):
+    """Kosongkan seluruh cache header (import data sekolah, kolom header berubah)."""
+    _header_cache.clear()
+
+
+# =========================
+# EVENT KOLOM HEADER
+# =========================
+# Kolom yang dibaca _ambil_header(); perubahan kolom lain (password, email, ...) tidak
+# menyentuh cache. Kelas/tahun ajaran baru belum pernah di-cache, jadi insert diabaikan.
+KOLOM_HEADER = {
+    User: ("nama_lengkap",),
+    Pegawai: ("nip", "user_id"),
+    Provinsi: ("nama",),
+    Kabupaten: ("nama", "provinsi_id"),
+    Kecamatan: ("nama", "kabupaten_id"),
+    Sekolah: ("nama_sekolah", "npsn", "kecamatan_id"),
+    TahunAjaran: ("tahun_ajaran", "semester", "kepala_sekolah_id"),
+    Kelas: ("nama_kelas", "tahun_ajaran_id", "sekolah_id", "wali_kelas_id"),
+}
+
+# Penanda di Session.info: transaksi ini mengubah kolom header
+KUNCI_BERUBAH = "header_laporan_berubah"
+
+
+def _tandai(target):
+    session = object_session(target)
+    if session is None:
+        invalidate_header_laporan()
+    else:
+        session.info[KUNCI_BERUBAH] = True
+
+
+def _kolom_diubah(target, value, oldvalue, initiator):
+    if value != oldvalue:
+        _tandai(target)
+
+
+def _baris_dihapus(mapper, connection, target):
+    _tandai(target)
+
+
+def _setelah_commit(session):
+    # dikosongkan setelah commit, agar request lain tidak meng-cache ulang nilai lama
+    if session.info.pop(KUNCI_BERUBAH, False):
+        invalidate_header_laporan()
+
+
+def _buang_tanda(session, *args):
+    session.info.pop(KUNCI_BERUBAH, None)
+
+
+for _model, _kolom_list in KOLOM_HEADER.items():
+    for _kolom in _kolom_list:
+        event.listen(getattr(_model, _kolom), "set", _kolom_diubah, active_history=True)
+    event.listen(_model, "after_delete", _baris_dihapus)
+event.listen(db.session, "after_commit", _setelah_commit)
+event.listen(db.session, "after_rollback", _buang_tanda)
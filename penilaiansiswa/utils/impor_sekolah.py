@@ -0,0 +1,309 @@
+import hashlib
+from datetime import datetime
+from penilaiansiswa import db
+from penilaiansiswa.models import Provinsi, Kabupaten, Kecamatan, Sekolah
+from penilaiansiswa.logging import tambah_audit
+from penilaiansiswa.utils.teks import normalisasi_nama
+
+# Judul kolom data_sekolah.xlsx (sudah dinormalisasi) -> kunci baris
+KOLOM_DATA_SEKOLAH = {
+    "provinsi": "provinsi",
+    "kabupaten": "kabupaten",
+    "kecamatan": "kecamatan",
+    "nama satuan pendidikan": "nama_sekolah",
+    "npsn": "npsn",
+    "bentuk pendidikan": "jenjang",
+}
+
+# Baris sekolah per INSERT/UPDATE + commit
+BATCH_SEKOLAH = 1000
+# Mode diff: batas sekolah aktif yang boleh ditutup sekali import (persen) tanpa paksa=True
+MAKS_TUTUP_PERSEN = 5
+
+
+# =========================
+# BACA FILE (streaming)
+# =========================
+def _teks(nilai):
+    if nilai is None:
+        return ""
+    if isinstance(nilai, float) and nilai.is_integer():
+        # NPSN yang dibaca Excel sebagai angka
+        nilai = int(nilai)
+    return str(nilai).strip()
+
+
+def baca_data_sekolah(path):
+    """Yield dict per sekolah dari data_sekolah.xlsx (openpyxl read_only, tanpa pandas).
+
+    Raise ValueError bila kolom wajib tidak ditemukan. Baris tanpa NPSN dilewati.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        kolom = None
+        for nilai in wb.worksheets[0].iter_rows(values_only=True):
+            if kolom is None:
+                kolom = [KOLOM_DATA_SEKOLAH.get(normalisasi_nama(_teks(v))) for v in nilai]
+                hilang = set(KOLOM_DATA_SEKOLAH.values()) - set(kolom)
+                if hilang:
+                    raise ValueError(f"Kolom tidak ditemukan: {', '.join(sorted(hilang))}")
+                continue
+            baris = {k: _teks(v) for k, v in zip(kolom, nilai) if k}
+            if baris.get("npsn"):
+                yield baris
+    finally:
+        wb.close()
+
+
+# =========================
+# WILAYAH (cache di memori)
+# =========================
+class PetaWilayah:
+    """Id provinsi/kabupaten/kecamatan berdasarkan nama, dimuat satu query per level.
+
+    Wilayah yang belum ada langsung di-INSERT (jumlahnya kecil dibanding sekolah).
+    """
+
+    def __init__(self):
+        # nama di-strip: data lama dari pandas bisa menyimpan spasi di ujung
+        self.provinsi = {row.nama.strip(): row.id for row in db.session.query(Provinsi.id, Provinsi.nama)}
+        self.kabupaten = {
+            (row.provinsi_id, row.nama.strip()): row.id
+            for row in db.session.query(Kabupaten.id, Kabupaten.provinsi_id, Kabupaten.nama)
+        }
+        self.kecamatan = {
+            (row.kabupaten_id, row.nama.strip()): row.id
+            for row in db.session.query(Kecamatan.id, Kecamatan.kabupaten_id, Kecamatan.nama)
+        }
+        self.baru = 0
+
+    def _tambah(self, model, cache, kunci, **nilai):
+        if kunci not in cache:
+            hasil = db.session.execute(model.__table__.insert().values(**nilai))
+            cache[kunci] = hasil.inserted_primary_key[0]
+            self.baru += 1
+        return cache[kunci]
+
+    def nama_kecamatan(self, kecamatan_id):
+        for (_, nama), id_ in self.kecamatan.items():
+            if id_ == kecamatan_id:
+                return nama
+        return None
+
+    def kecamatan_id(self, baris):
+        provinsi_id = self._tambah(Provinsi, self.provinsi, baris["provinsi"], nama=baris["provinsi"])
+        kabupaten_id = self._tambah(
+            Kabupaten, self.kabupaten, (provinsi_id, baris["kabupaten"]),
+            nama=baris["kabupaten"], provinsi_id=provinsi_id
+        )
+        return self._tambah(
+            Kecamatan, self.kecamatan, (kabupaten_id, baris["kecamatan"]),
+            nama=baris["kecamatan"], kabupaten_id=kabupaten_id
+        )
+
+
+# =========================
+# IMPORT
+# =========================
+# Jenis perubahan yang dicatat di laporan mode diff
+JENIS_PERUBAHAN = ("baru", "ganti_nama", "ganti_jenjang", "pindah_kecamatan", "dibuka_lagi", "ditutup")
+
+
+def hash_baris(baris):
+    """sha1 isi satu baris data sekolah (wilayah, nama, jenjang) untuk mendeteksi perubahan."""
+    teks = "\x1f".join(baris.get(k, "") for k in ("provinsi", "kabupaten", "kecamatan", "nama_sekolah", "jenjang"))
+    return hashlib.sha1(teks.encode("utf-8")).hexdigest()
+
+
+class ImporSekolah:
+    """Satu kali jalan import data sekolah; lihat impor_sekolah()."""
+
+    def __init__(self, batch, diff):
+        self.batch = batch
+        self.diff = diff
+        self.wilayah = PetaWilayah()
+        # hanya npsn -> (id, hash, aktif); isi lengkap dibaca per batch untuk baris yang hash-nya beda
+        self.sekolah = {
+            row.npsn: row
+            for row in db.session.query(Sekolah.id, Sekolah.npsn, Sekolah.hash_konten, Sekolah.aktif)
+        }
+        self.ringkasan = dict.fromkeys(
+            JENIS_PERUBAHAN + ("diubah", "sama", "hash_diisi", "ganda", "wilayah_baru", "tutup_ditahan"), 0
+        )
+        self.perubahan = []
+        self.dilihat = set()
+        self.baru, self.calon = [], []
+        self.now = datetime.utcnow()
+
+    def _catat(self, npsn, jenis, lama=None, baru=None):
+        self.ringkasan[jenis] += 1
+        if self.diff:
+            self.perubahan.append({"npsn": npsn, "jenis": jenis, "lama": lama, "baru": baru})
+
+    def tambah(self, baris):
+        npsn = baris["npsn"]
+        if npsn in self.dilihat:
+            self.ringkasan["ganda"] += 1
+            return
+        self.dilihat.add(npsn)
+
+        hash_konten = hash_baris(baris)
+        lama = self.sekolah.get(npsn)
+        if lama is None:
+            self.baru.append({
+                "npsn": npsn, "nama_sekolah": baris["nama_sekolah"], "jenjang": baris["jenjang"] or None,
+                "kecamatan_id": self.wilayah.kecamatan_id(baris), "hash_konten": hash_konten, "aktif": True,
+                "created_at": self.now, "updated_at": self.now,
+            })
+            self._catat(npsn, "baru", baru=baris["nama_sekolah"])
+        elif lama.hash_konten == hash_konten and lama.aktif:
+            self.ringkasan["sama"] += 1
+        else:
+            self.calon.append((lama, baris, hash_konten))
+
+        if len(self.baru) + len(self.calon) >= self.batch:
+            self.tulis()
+
+    def tulis(self):
+        """Bandingkan isi lengkap baris calon (satu query), lalu INSERT/UPDATE dan commit."""
+        ubah = []
+        if self.calon:
+            isi = {
+                row.id: row
+                for row in db.session.query(
+                    Sekolah.id, Sekolah.nama_sekolah, Sekolah.jenjang, Sekolah.kecamatan_id, Sekolah.updated_at
+                ).filter(Sekolah.id.in_([lama.id for lama, _, _ in self.calon]))
+            }
+            for lama, baris, hash_konten in self.calon:
+                nilai = {
+                    "nama_sekolah": baris["nama_sekolah"],
+                    "jenjang": baris["jenjang"] or None,
+                    "kecamatan_id": self.wilayah.kecamatan_id(baris),
+                }
+                sekarang = isi[lama.id]
+                berubah = False
+                for kolom, jenis in (("nama_sekolah", "ganti_nama"), ("jenjang", "ganti_jenjang"),
+                                     ("kecamatan_id", "pindah_kecamatan")):
+                    if getattr(sekarang, kolom) != nilai[kolom]:
+                        lama_nilai, baru_nilai = getattr(sekarang, kolom), nilai[kolom]
+                        if jenis == "pindah_kecamatan" and self.diff:
+                            lama_nilai = self.wilayah.nama_kecamatan(lama_nilai)
+                            baru_nilai = self.wilayah.nama_kecamatan(baru_nilai)
+                        self._catat(baris["npsn"], jenis, lama_nilai, baru_nilai)
+                        berubah = True
+                if not lama.aktif:
+                    self._catat(baris["npsn"], "dibuka_lagi")
+                    berubah = True
+                self.ringkasan["diubah" if berubah else "hash_diisi"] += 1
+                ubah.append({
+                    "id": lama.id, "hash_konten": hash_konten, "aktif": True,
+                    # hanya mengisi hash (import pertama setelah migrasi): updated_at tidak disentuh
+                    "updated_at": self.now if berubah else sekarang.updated_at, **nilai
+                })
+        _tulis(self.baru, ubah)
+        self.baru, self.calon = [], []
+
+    def tutup_yang_hilang(self, paksa=False, maks_persen=MAKS_TUTUP_PERSEN):
+        """Mode diff: sekolah aktif yang tidak ada lagi di file ditandai aktif=False.
+
+        Bila yang akan ditutup lebih dari maks_persen sekolah aktif (file terpotong / salah
+        wilayah), tidak ada yang ditutup kecuali paksa=True; jumlahnya dicatat di
+        ringkasan["tutup_ditahan"]. Return True bila penutupan dijalankan.
+        """
+        tutup = [
+            (npsn, row.id) for npsn, row in self.sekolah.items()
+            if row.aktif and npsn not in self.dilihat
+        ]
+        aktif = sum(1 for row in self.sekolah.values() if row.aktif)
+        if not paksa and len(tutup) > aktif * maks_persen / 100:
+            self.ringkasan["tutup_ditahan"] = len(tutup)
+            return False
+        tabel = Sekolah.__table__
+        for i in range(0, len(tutup), self.batch):
+            potongan = tutup[i:i + self.batch]
+            db.session.execute(
+                tabel.update().where(tabel.c.id.in_([sekolah_id for _, sekolah_id in potongan])).values(
+                    aktif=False, updated_at=self.now
+                )
+            )
+            db.session.commit()
+            for npsn, _ in potongan:
+                self._catat(npsn, "ditutup")
+        return True
+
+
+def _tulis(baru, ubah):
+    if baru:
+        db.session.execute(Sekolah.__table__.insert(), baru)
+    if ubah:
+        tabel = Sekolah.__table__
+        db.session.execute(
+            tabel.update().where(tabel.c.id == db.bindparam("b_id")).values(
+                nama_sekolah=db.bindparam("b_nama_sekolah"),
+                jenjang=db.bindparam("b_jenjang"),
+                kecamatan_id=db.bindparam("b_kecamatan_id"),
+                hash_konten=db.bindparam("b_hash_konten"),
+                aktif=db.bindparam("b_aktif"),
+                updated_at=db.bindparam("b_updated_at"),
+            ),
+            [{f"b_{k}": v for k, v in row.items()} for row in ubah]
+        )
+    db.session.commit()
+
+
+def impor_sekolah(baris_iter, batch=BATCH_SEKOLAH, diff=False, paksa=False, maks_tutup_persen=MAKS_TUTUP_PERSEN):
+    """Import / perbarui data sekolah berdasarkan NPSN, aman dijalankan berulang.
+
+    Wilayah dan (npsn, id, hash_konten, aktif) sekolah dimuat sekali ke dict; per baris
+    tidak ada query. Baris yang hash-nya sama dilewati; yang beda dibandingkan isinya per
+    batch lalu di-UPDATE, sekolah baru di-INSERT multi-row. Commit per batch.
+
+    diff=True untuk file lengkap dari data nasional: sekolah aktif yang tidak ada di file
+    ditutup (aktif=False) dan setiap perubahan dicatat di ringkasan["perubahan"].
+    Penutupan lebih dari maks_tutup_persen sekolah aktif ditahan kecuali paksa=True
+    (perubahan lain tetap disimpan), lihat ringkasan["tutup_ditahan"].
+    Return ringkasan jumlah per jenis perubahan.
+    """
+    impor = ImporSekolah(batch, diff)
+    for baris in baris_iter:
+        impor.tambah(baris)
+    impor.tulis()
+    if diff and impor.dilihat:
+        impor.tutup_yang_hilang(paksa, maks_tutup_persen)
+
+    ringkasan = impor.ringkasan
+    ringkasan["wilayah_baru"] = impor.wilayah.baru
+    if any(ringkasan[jenis] for jenis in JENIS_PERUBAHAN) or ringkasan["wilayah_baru"]:
+        tambah_audit(
+            db.session, "UPDATE", Sekolah.__tablename__,
+            keterangan="Import data sekolah: " + ", ".join(f"{k}={v}" for k, v in ringkasan.items() if v)
+        )
+        db.session.commit()
+    selesai_impor(ringkasan)
+    ringkasan["perubahan"] = impor.perubahan
+    return ringkasan
+
+
+def selesai_impor(ringkasan):
+    """Bersihkan cache turunan setelah data sekolah berubah lewat INSERT/UPDATE Core."""
+    if not (any(ringkasan[jenis] for jenis in JENIS_PERUBAHAN) or ringkasan["wilayah_baru"]):
+        return
+    from penilaiansiswa.utils.header_laporan import invalidate_header_laporan
+    from penilaiansiswa.utils.statistik import invalidate_statistik
+    from penilaiansiswa.utils.pencarian_sekolah import invalidate_index_sekolah
+
+    invalidate_header_laporan()
+    invalidate_statistik()
+    invalidate_index_sekolah()
+    # dropdown wilayah/sekolah di halaman profil
+    from penilaiansiswa.utils.wilayah_json import bangun_shard_wilayah
+
+    bangun_shard_wilayah()
+    if ringkasan["pindah_kecamatan"]:
+        # kubus statistik menyimpan nilai per kecamatan/kabupaten/provinsi induk sekolah
+        from penilaiansiswa.utils.agregat import rebuild_statistik_wilayah
+
+        rebuild_statistik_wilayah()
+        db.session.commit()
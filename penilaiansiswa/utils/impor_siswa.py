@@ -0,0 +1,179 @@
+import csv
+import io
+import os
+from penilaiansiswa import db
+from penilaiansiswa.models import Kelas, Siswa
+from penilaiansiswa.logging import tambah_audit
+from penilaiansiswa.utils.pencarian_siswa import tulis_token_siswa
+from penilaiansiswa.utils.teks import normalisasi_nama
+from penilaiansiswa.utils.versi_data import naikkan_versi, DAFTAR_SISWA
+
+# Judul kolom (sudah dinormalisasi) -> kolom siswa
+KOLOM_ROSTER = {
+    "nama": "nama_siswa", "nama siswa": "nama_siswa", "nama lengkap": "nama_siswa",
+    "nisn": "nisn",
+    "jk": "jenis_kelamin", "l p": "jenis_kelamin", "jenis kelamin": "jenis_kelamin",
+    "status": "status",
+}
+
+# Baris per validasi NISN + INSERT
+BATCH_IMPOR = 500
+
+
+# =========================
+# BACA FILE (streaming)
+# =========================
+def baca_roster(berkas, nama_file):
+    """Yield (nomor_baris, {kolom: nilai}) dari roster .xlsx/.csv tanpa memuat seluruh file.
+
+    berkas: file-like biner (mis. FileStorage.stream) atau path. Raise ValueError bila
+    format tidak didukung atau kolom nama/nisn/jenis kelamin tidak ditemukan.
+    """
+    ekstensi = os.path.splitext(nama_file or "")[1].lower()
+    if ekstensi == ".xlsx":
+        baris_iter = _baris_xlsx(berkas)
+    elif ekstensi == ".csv":
+        baris_iter = _baris_csv(berkas)
+    else:
+        raise ValueError("Format file harus .xlsx atau .csv")
+
+    kolom = None
+    for nomor, nilai in baris_iter:
+        if not any(v not in (None, "") for v in nilai):
+            continue
+        if kolom is None:
+            # baris terisi pertama = judul kolom
+            kolom = [KOLOM_ROSTER.get(normalisasi_nama(str(v or ""))) for v in nilai]
+            hilang = {"nama_siswa", "nisn", "jenis_kelamin"} - set(kolom)
+            if hilang:
+                raise ValueError(f"Kolom tidak ditemukan: {', '.join(sorted(hilang))}")
+            continue
+        yield nomor, {k: v for k, v in zip(kolom, nilai) if k}
+
+
+def _baris_xlsx(berkas):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(berkas, read_only=True, data_only=True)
+    try:
+        for nomor, nilai in enumerate(wb.worksheets[0].iter_rows(values_only=True), start=1):
+            yield nomor, list(nilai)
+    finally:
+        wb.close()
+
+
+def _baris_csv(berkas):
+    if isinstance(berkas, (str, os.PathLike)):
+        with open(berkas, "rb") as f:
+            yield from _baris_csv(f)
+        return
+    teks = io.TextIOWrapper(berkas, encoding="utf-8-sig", newline="")
+    contoh = teks.read(4096)
+    teks.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(contoh, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    for nomor, nilai in enumerate(csv.reader(teks, dialect), start=1):
+        yield nomor, nilai
+
+
+# =========================
+# VALIDASI & SIMPAN
+# =========================
+def _teks(nilai):
+    if nilai is None:
+        return ""
+    if isinstance(nilai, float) and nilai.is_integer():
+        # NISN yang dibaca Excel sebagai angka
+        nilai = int(nilai)
+    return str(nilai).strip()
+
+
+def bersihkan_siswa(data):
+    """Normalisasi satu baris roster. Raise ValueError dengan pesan untuk laporan per baris."""
+    nama = _teks(data.get("nama_siswa"))
+    nisn = _teks(data.get("nisn"))
+    jk = _teks(data.get("jenis_kelamin"))[:1].upper()
+    status = _teks(data.get("status")) or "Aktif"
+    if not nama:
+        raise ValueError("Nama siswa kosong")
+    if not nisn:
+        raise ValueError("NISN kosong")
+    if len(nisn) > 20 or len(nama) > 100:
+        raise ValueError("NISN maksimal 20 karakter, nama maksimal 100 karakter")
+    if jk not in ("L", "P"):
+        raise ValueError("Jenis kelamin harus L atau P")
+    return {"nama_siswa": nama, "nisn": nisn, "jenis_kelamin": jk, "status": status[:20]}
+
+
+def impor_siswa_kelas(kelas, baris_iter, batch=BATCH_IMPOR):
+    """Tambahkan siswa dari baris roster ke kelas, per batch.
+
+    Per batch: satu query mencari NISN yang sudah dipakai di sekolah & tahun ajaran
+    kelas ini (aturan yang sama dengan /siswa/create), satu INSERT multi-row untuk baris
+    yang lolos, lalu satu SELECT id untuk index pencarian. Tidak commit.
+    Return (jumlah ditambahkan, [{"baris", "nisn", "message"}] baris yang ditolak).
+    """
+    ditolak, dilihat, antrean = [], set(), []
+    total = 0
+
+    for nomor, data in baris_iter:
+        try:
+            siswa = bersihkan_siswa(data)
+        except ValueError as e:
+            ditolak.append({"baris": nomor, "nisn": _teks(data.get("nisn")) or None, "message": str(e)})
+            continue
+        if siswa["nisn"] in dilihat:
+            ditolak.append({"baris": nomor, "nisn": siswa["nisn"], "message": "NISN ganda di dalam file"})
+            continue
+        dilihat.add(siswa["nisn"])
+        antrean.append((nomor, siswa))
+        if len(antrean) >= batch:
+            total += _simpan_batch(kelas, antrean, ditolak)
+            antrean = []
+    if antrean:
+        total += _simpan_batch(kelas, antrean, ditolak)
+
+    if total:
+        naikkan_versi({(kelas.id, DAFTAR_SISWA)})
+    ditolak.sort(key=lambda r: r["baris"])
+    return total, ditolak
+
+
+def _simpan_batch(kelas, antrean, ditolak):
+    terpakai = {
+        row.nisn: row
+        for row in db.session.query(Siswa.nisn, Siswa.nama_siswa, Kelas.nama_kelas).join(
+            Kelas, Siswa.kelas_id == Kelas.id
+        ).filter(
+            Kelas.sekolah_id == kelas.sekolah_id,
+            Kelas.tahun_ajaran_id == kelas.tahun_ajaran_id,
+            Siswa.nisn.in_([siswa["nisn"] for _, siswa in antrean])
+        )
+    }
+
+    rows = []
+    for nomor, siswa in antrean:
+        lama = terpakai.get(siswa["nisn"])
+        if lama:
+            ditolak.append({
+                "baris": nomor, "nisn": siswa["nisn"],
+                "message": f"NISN {siswa['nisn']} sudah digunakan oleh siswa {lama.nama_siswa} di kelas {lama.nama_kelas} pada tahun ajaran yang sama."
+            })
+            continue
+        rows.append({**siswa, "kelas_id": kelas.id, "nama_normal": normalisasi_nama(siswa["nama_siswa"])})
+    if not rows:
+        return 0
+
+    db.session.execute(Siswa.__table__.insert(), rows)
+
+    # INSERT Core tidak memicu event mapper: id diambil lewat kunci unik (nisn, kelas_id)
+    baru = db.session.query(Siswa.id, Siswa.nama_siswa).filter(
+        Siswa.kelas_id == kelas.id,
+        Siswa.nisn.in_([row["nisn"] for row in rows])
+    ).all()
+    tulis_token_siswa({row.id: row.nama_siswa for row in baru})
+    for row in baru:
+        tambah_audit(db.session, "CREATE", Siswa.__tablename__, row.id)
+    return len(rows)
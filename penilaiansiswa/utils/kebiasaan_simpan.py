@@ -0,0 +1,186 @@
+import time
+from datetime import datetime
+from sqlalchemy.exc import OperationalError
+from penilaiansiswa import db
+from penilaiansiswa.models import Kebiasaan
+from penilaiansiswa.utils.rekap import KEBIASAAN_FIELDS
+from penilaiansiswa.utils.agregat import perubahan_kebiasaan, sinkron_agregat_kebiasaan
+from penilaiansiswa.utils.upsert import upsert
+from penilaiansiswa.logging import tambah_audit, audit_aktif
+
+# Kolom isian grid penilaian
+KOLOM_ISIAN = KEBIASAAN_FIELDS + ["catatan"]
+
+# Kunci unik tabel kebiasaan
+KUNCI_KEBIASAAN = ["siswa_id", "kelas_id", "bulan"]
+
+# Error MySQL yang membatalkan transaksi karena rebutan kunci: 1213 deadlock, 1205 lock wait timeout
+KODE_BENTROK_KUNCI = (1213, 1205)
+# Percobaan total untuk satu transaksi simpan (1 + ulangan)
+PERCOBAAN_SIMPAN = 3
+
+
+def bersihkan_baris(baris):
+    """Normalisasi satu baris grid ke {field: int/None, 'catatan': str/None}.
+
+    Raise ValueError bila ada nilai kebiasaan yang bukan angka.
+    """
+    hasil = {}
+    for field in KEBIASAAN_FIELDS:
+        nilai = baris.get(field)
+        if nilai is None or nilai == "":
+            hasil[field] = None
+            continue
+        try:
+            hasil[field] = int(nilai)
+        except (TypeError, ValueError):
+            raise ValueError(f"Nilai {field} harus berupa angka")
+        if hasil[field] < 0:
+            raise ValueError(f"Nilai {field} tidak boleh negatif")
+    hasil["catatan"] = baris.get("catatan") or None
+    return hasil
+
+
+def terapkan_sel(lama, sel):
+    """Gabungkan perubahan per sel ke nilai lama.
+
+    lama: row hasil baca_kebiasaan_lama(), dict hasil bersihkan_baris(), atau None.
+    Raise ValueError untuk kolom yang tidak dikenal atau nilai yang tidak valid.
+    """
+    asing = set(sel) - set(KOLOM_ISIAN)
+    if asing:
+        raise ValueError(f"Kolom tidak dikenal: {', '.join(sorted(asing))}")
+    gabungan = dict(lama) if isinstance(lama, dict) else data_kebiasaan(lama)
+    gabungan.update(sel)
+    return bersihkan_baris(gabungan)
+
+
+def data_kebiasaan(row):
+    """Nilai 7 kebiasaan + catatan dari row lama (None = baris belum ada) untuk respon JSON."""
+    return {kolom: getattr(row, kolom) if row is not None else None for kolom in KOLOM_ISIAN}
+
+
+def baca_kebiasaan_lama(kelas_id, bulan, siswa_ids):
+    """{siswa_id: row} nilai + versi baris yang sudah ada, dikunci FOR UPDATE sampai commit."""
+    return {
+        row.siswa_id: row
+        for row in db.session.query(
+            Kebiasaan.siswa_id,
+            Kebiasaan.versi,
+            *[getattr(Kebiasaan, kolom) for kolom in KOLOM_ISIAN]
+        ).filter(
+            Kebiasaan.kelas_id == kelas_id,
+            Kebiasaan.bulan == bulan,
+            Kebiasaan.siswa_id.in_(list(siswa_ids))
+        ).with_for_update().all()
+    }
+
+
+def simpan_kebiasaan_kelas(kelas_id, bulan, isian, siswa_map, user_id=None, lama_map=None, ketat=False):
+    """Tulis banyak baris kebiasaan satu kelas/bulan tanpa query per siswa.
+
+    - isian    : {siswa_id: hasil bersihkan_baris()}
+    - siswa_map: {siswa_id: Siswa}, sudah dipastikan anggota kelas (None = siswa sudah dihapus)
+    - lama_map : hasil baca_kebiasaan_lama() bila pemanggil sudah membacanya
+    - ketat    : baris baru ditulis dengan INSERT biasa, sehingga baris yang baru saja
+                 dibuat request lain memicu IntegrityError alih-alih ditimpa
+
+    Nilai lama dibaca dengan SELECT ... FOR UPDATE (untuk delta agregat), lalu
+    semua baris ditulis dengan satu upsert multi-row pada kunci unik
+    (siswa_id, kelas_id, bulan). Tidak commit, pemanggil yang commit.
+    Return {'baru', 'diperbarui', 'versi': {siswa_id: versi}}; baris yang isinya sama dilewati.
+    """
+    hasil = {"baru": 0, "diperbarui": 0, "versi": {}}
+    if not isian:
+        return hasil
+    if lama_map is None:
+        lama_map = baca_kebiasaan_lama(kelas_id, bulan, isian)
+
+    now = datetime.utcnow()
+    baris, perubahan = [], []
+    for siswa_id, nilai in isian.items():
+        lama = lama_map.get(siswa_id)
+        if lama is not None:
+            if all(getattr(lama, kolom) == nilai[kolom] for kolom in KOLOM_ISIAN):
+                hasil["versi"][siswa_id] = lama.versi
+                continue
+            nilai_lama = {field: getattr(lama, field) for field in KEBIASAAN_FIELDS}
+            versi = lama.versi + 1
+            hasil["diperbarui"] += 1
+        else:
+            nilai_lama = None
+            versi = 1
+            hasil["baru"] += 1
+        hasil["versi"][siswa_id] = versi
+        baris.append({
+            "siswa_id": siswa_id, "kelas_id": kelas_id, "bulan": bulan,
+            "created_at": now, "updated_at": now,
+            "created_by": user_id, "updated_by": user_id,
+            "versi": versi,
+            **nilai
+        })
+        baru = {field: nilai[field] for field in KEBIASAAN_FIELDS}
+        perubahan.append(perubahan_kebiasaan(
+            siswa_map.get(siswa_id), kelas_id, bulan, nilai_lama, baru, siswa_id=siswa_id
+        ))
+
+    ditulis = [row["siswa_id"] for row in baris]
+    if ketat:
+        baris_baru = [b for b in baris if b["siswa_id"] not in lama_map]
+        baris = [b for b in baris if b["siswa_id"] in lama_map]
+        if baris_baru:
+            db.session.execute(Kebiasaan.__table__.insert(), baris_baru)
+
+    # satu statement, baris yang sudah ada ditimpa (created_* tetap)
+    upsert(
+        Kebiasaan.__table__, baris, kunci=KUNCI_KEBIASAAN,
+        ganti=KOLOM_ISIAN + ["versi", "updated_at", "updated_by"]
+    )
+
+    # upsert Core tidak memicu event mapper: id diambil lewat kunci unik lalu dicatat ke buffer audit
+    if ditulis and audit_aktif():
+        entri = db.session.query(Kebiasaan.siswa_id, Kebiasaan.id).filter(
+            Kebiasaan.kelas_id == kelas_id,
+            Kebiasaan.bulan == bulan,
+            Kebiasaan.siswa_id.in_(ditulis)
+        )
+        for siswa_id, entri_id in entri:
+            aksi = "UPDATE" if siswa_id in lama_map else "CREATE"
+            tambah_audit(
+                db.session, aksi, Kebiasaan.__tablename__, entri_id,
+                keterangan=f"{aksi} on kebiasaan id={entri_id} siswa_id={siswa_id} kelas_id={kelas_id} bulan={bulan}"
+            )
+
+    sinkron_agregat_kebiasaan(perubahan)
+    return hasil
+
+
+# =========================
+# ULANGI TRANSAKSI SAAT DEADLOCK
+# =========================
+def bentrok_kunci(error):
+    """True bila OperationalError berasal dari deadlock / lock wait timeout (transaksi aman diulang)."""
+    orig = getattr(error, "orig", None)
+    args = getattr(orig, "args", None)
+    return bool(args) and args[0] in KODE_BENTROK_KUNCI
+
+
+def ulangi_transaksi(tulis, percobaan=PERCOBAAN_SIMPAN):
+    """Jalankan tulis() lalu commit; bila deadlock / lock wait timeout, rollback dan ulangi.
+
+    Dua simpan pertama untuk (siswa, kelas, bulan) yang sama saling menunggu gap lock
+    dari baca_kebiasaan_lama(), dan InnoDB membatalkan salah satunya. tulis() harus
+    membaca ulang nilai lama setiap dipanggil agar delta agregat dihitung dari data
+    terbaru. Error lain, atau bentrok yang masih terjadi di percobaan terakhir,
+    di-raise setelah rollback. Return hasil tulis().
+    """
+    for ke in range(1, percobaan + 1):
+        try:
+            hasil = tulis()
+            db.session.commit()
+            return hasil
+        except OperationalError as e:
+            db.session.rollback()
+            if ke == percobaan or not bentrok_kunci(e):
+                raise
+            time.sleep(0.05 * ke)
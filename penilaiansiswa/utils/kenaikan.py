@@ -0,0 +1,131 @@
+from sqlalchemy import case, exists, func, select
+from sqlalchemy.orm import aliased
+from penilaiansiswa import db
+from penilaiansiswa.models import Kelas, Siswa, SiswaToken
+from penilaiansiswa.logging import tambah_audit
+from penilaiansiswa.utils.versi_data import naikkan_versi, DAFTAR_SISWA
+
+# salin  : siswa disalin ke kelas baru, baris lama tidak diubah
+# pindah : seperti salin, lalu status baris lama menjadi STATUS_NAIK
+MODE_KENAIKAN = ("salin", "pindah")
+STATUS_NAIK = "Naik Kelas"
+
+
+def _siswa_aktif(tabel):
+    return db.or_(tabel.status.is_(None), func.lower(tabel.status) == "aktif")
+
+
+def siapkan_kelas_tujuan(pasangan, tahun_ajaran, wali_default_id):
+    """Cari atau buat kelas tujuan di tahun ajaran baru.
+
+    pasangan: list dict {"kelas": Kelas lama, "nama_kelas", "wali_kelas_id" (opsional)}.
+    Kelas dengan nama sama (tanpa beda huruf besar/kecil) di tahun ajaran tujuan dipakai ulang.
+    Return {kelas_lama_id: (Kelas baru, dibuat?)}.
+    """
+    nama_list = {p["nama_kelas"].lower() for p in pasangan}
+    ada = {
+        k.nama_kelas.lower(): k
+        for k in Kelas.query.filter(
+            Kelas.tahun_ajaran_id == tahun_ajaran.id,
+            Kelas.sekolah_id == tahun_ajaran.sekolah_id,
+            func.lower(Kelas.nama_kelas).in_(nama_list)
+        )
+    }
+    hasil = {}
+    for p in pasangan:
+        kunci = p["nama_kelas"].lower()
+        dibuat = kunci not in ada
+        if dibuat:
+            ada[kunci] = Kelas(
+                tahun_ajaran_id=tahun_ajaran.id,
+                nama_kelas=p["nama_kelas"],
+                wali_kelas_id=p.get("wali_kelas_id") or wali_default_id,
+                sekolah_id=tahun_ajaran.sekolah_id
+            )
+            db.session.add(ada[kunci])
+        hasil[p["kelas"].id] = (ada[kunci], dibuat)
+    db.session.flush()
+    return hasil
+
+
+def naikkan_kelas(peta, tahun_ajaran, mode="salin"):
+    """Salin siswa aktif kelas lama ke kelas baru dengan INSERT ... SELECT, tanpa loop per siswa.
+
+    - peta : {kelas_lama_id: kelas_baru_id}
+    - NISN yang sudah ada di sekolah & tahun ajaran tujuan dilewati (aturan /siswa/create)
+    - NISN yang sama di lebih dari satu kelas lama ditolak (ValueError) sebelum ada yang ditulis
+    - token pencarian disalin dari baris lama dengan INSERT ... SELECT kedua
+    - baris siswa lama tetap ada, jadi laporan tahun lalu tidak berubah
+    Tidak commit. Return {kelas_baru_id: jumlah disalin} dan jumlah siswa yang dilewati.
+    """
+    lama_ids = list(peta)
+    kelas_baru = case(peta, value=Siswa.kelas_id)
+    sumber = (Siswa.kelas_id.in_(lama_ids), _siswa_aktif(Siswa))
+
+    # 0) satu NISN di dua kelas lama akan tersalin dua kali ke tahun ajaran tujuan
+    ganda = [
+        nisn for (nisn,) in db.session.query(Siswa.nisn).filter(*sumber).group_by(Siswa.nisn).having(
+            func.count(Siswa.id) > 1
+        )
+    ]
+    if ganda:
+        raise ValueError(f"NISN ganda di kelas lama: {', '.join(sorted(ganda))}")
+    kandidat = db.session.query(func.count(Siswa.id)).filter(*sumber).scalar()
+    # siswa yang sudah ada di kelas tujuan (kelas dipakai ulang) bukan hasil kenaikan ini
+    sudah_di_tujuan = [
+        siswa_id for (siswa_id,) in db.session.query(Siswa.id).filter(Siswa.kelas_id.in_(list(peta.values())))
+    ]
+
+    # 1) siswa
+    lain, kelas_lain = aliased(Siswa), aliased(Kelas)
+    sudah_ada = exists().where(
+        lain.nisn == Siswa.nisn,
+        lain.kelas_id == kelas_lain.id,
+        kelas_lain.sekolah_id == tahun_ajaran.sekolah_id,
+        kelas_lain.tahun_ajaran_id == tahun_ajaran.id
+    )
+    kolom = ["nama_siswa", "nama_normal", "nisn", "jenis_kelamin", "status", "kelas_id"]
+    db.session.execute(Siswa.__table__.insert().from_select(kolom, select(
+        Siswa.nama_siswa, Siswa.nama_normal, Siswa.nisn, Siswa.jenis_kelamin,
+        db.literal("Aktif"), kelas_baru
+    ).where(*sumber, ~sudah_ada)))
+
+    # 2) baris baru dipasangkan ke baris lama lewat (nisn, kelas tujuan) dalam transaksi ini;
+    #    siswa yang ditambahkan request lain ke kelas tujuan tidak ikut terhitung
+    baru = aliased(Siswa)
+    pasangan = db.session.query(baru.id, baru.kelas_id, Siswa.id).join(
+        baru, db.and_(baru.nisn == Siswa.nisn, baru.kelas_id == kelas_baru)
+    ).filter(*sumber, baru.id.notin_(sudah_di_tujuan)).all()
+
+    # 3) token pencarian untuk baris baru disalin dari baris lama
+    if pasangan:
+        db.session.execute(SiswaToken.__table__.insert().from_select(["token", "siswa_id"], select(
+            SiswaToken.token, baru.id
+        ).join(
+            Siswa, SiswaToken.siswa_id == Siswa.id
+        ).join(
+            baru, db.and_(baru.nisn == Siswa.nisn, baru.kelas_id == kelas_baru)
+        ).where(
+            *sumber, baru.id.in_([baru_id for baru_id, _, _ in pasangan])
+        )))
+
+    disalin = {}
+    for _, kelas_id, _ in pasangan:
+        disalin[kelas_id] = disalin.get(kelas_id, 0) + 1
+
+    # 4) mode pindah: tandai baris lama, kelas_id tetap agar riwayat & laporan utuh
+    if mode == "pindah":
+        Siswa.query.filter(*sumber).update({Siswa.status: STATUS_NAIK}, synchronize_session=False)
+
+    versi = {(kelas_id, DAFTAR_SISWA) for kelas_id in peta.values()}
+    if mode == "pindah":
+        versi.update((kelas_id, DAFTAR_SISWA) for kelas_id in lama_ids)
+    naikkan_versi(versi)
+
+    # INSERT ... SELECT tidak memicu event mapper: satu event audit per siswa baru
+    for baru_id, kelas_id, lama_id in pasangan:
+        tambah_audit(
+            db.session, "CREATE", Siswa.__tablename__, baru_id,
+            keterangan=f"Kenaikan kelas ({mode}) siswa_id={lama_id} -> siswa_id={baru_id} kelas_id={kelas_id}"
+        )
+    return disalin, kandidat - len(pasangan)
@@ -0,0 +1,186 @@
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import and_, or_
+from penilaiansiswa import db
+from penilaiansiswa.models import LogAktivitas, LogAktivitasHarian
+from penilaiansiswa.utils.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+# Batas baris per halaman API log
+MAKS_LIMIT_LOG = 200
+
+
+# =========================
+# CURSOR
+# =========================
+def buat_cursor(row):
+    """Cursor opaque 'timestamp_iso|id' dari baris terakhir satu halaman."""
+    return f"{row.timestamp.isoformat()}|{row.id}"
+
+
+def baca_cursor(cursor):
+    """Kebalikan buat_cursor(). Raise ValueError bila format tidak valid."""
+    try:
+        waktu, entri_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(waktu), int(entri_id)
+    except (AttributeError, ValueError):
+        raise ValueError("Cursor tidak valid")
+
+
+# =========================
+# QUERY
+# =========================
+def daftar_log(user_id=None, tabel=None, entri_id=None, aksi=None, dari=None, sampai=None,
+               cursor=None, limit=50):
+    """Satu halaman log_aktivitas terbaru dulu, dengan keyset pagination.
+
+    Urutan (timestamp DESC, id DESC) sehingga halaman berikutnya cukup
+    "WHERE (timestamp, id) < cursor" tanpa OFFSET; filter user_id / tabel+entri_id
+    memakai index ix_log_aktivitas_user_waktu / ix_log_aktivitas_tabel_entri.
+    Return (rows, next_cursor); next_cursor None bila sudah halaman terakhir.
+    """
+    query = db.session.query(
+        LogAktivitas.id, LogAktivitas.user_id, LogAktivitas.aksi, LogAktivitas.tabel,
+        LogAktivitas.entri_id, LogAktivitas.keterangan, LogAktivitas.timestamp
+    )
+    if user_id is not None:
+        query = query.filter(LogAktivitas.user_id == user_id)
+    if tabel:
+        query = query.filter(LogAktivitas.tabel == tabel)
+    if entri_id is not None:
+        query = query.filter(LogAktivitas.entri_id == entri_id)
+    if aksi:
+        query = query.filter(LogAktivitas.aksi == aksi)
+    if dari:
+        query = query.filter(LogAktivitas.timestamp >= dari)
+    if sampai:
+        query = query.filter(LogAktivitas.timestamp < sampai)
+    if cursor:
+        waktu, id_terakhir = baca_cursor(cursor)
+        query = query.filter(or_(
+            LogAktivitas.timestamp < waktu,
+            and_(LogAktivitas.timestamp == waktu, LogAktivitas.id < id_terakhir)
+        ))
+
+    # ambil satu baris lebih untuk tahu masih ada halaman berikutnya
+    rows = query.order_by(LogAktivitas.timestamp.desc(), LogAktivitas.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, buat_cursor(rows[-1])
+    return rows, None
+
+
+def ringkasan_harian(user_id=None, tabel=None, dari=None, sampai=None):
+    """Baris log_aktivitas_harian (hasil arsip), tanggal terbaru dulu."""
+    query = LogAktivitasHarian.query
+    if user_id is not None:
+        query = query.filter(LogAktivitasHarian.user_id == user_id)
+    if tabel:
+        query = query.filter(LogAktivitasHarian.tabel == tabel)
+    if dari:
+        query = query.filter(LogAktivitasHarian.tanggal >= dari)
+    if sampai:
+        query = query.filter(LogAktivitasHarian.tanggal < sampai)
+    return query.order_by(
+        LogAktivitasHarian.tanggal.desc(), LogAktivitasHarian.user_id, LogAktivitasHarian.tabel,
+        LogAktivitasHarian.aksi
+    ).all()
+
+
+# =========================
+# RETENSI
+# =========================
+def batas_retensi(bulan, sekarang=None):
+    """Awal bulan kalender N bulan sebelum sekarang; log sebelum tanggal ini diarsipkan."""
+    sekarang = sekarang or datetime.utcnow()
+    total = sekarang.year * 12 + sekarang.month - 1 - bulan
+    return datetime(total // 12, total % 12 + 1, 1)
+
+
+def arsipkan_log(batas, chunk=1000):
+    """Ringkas log_aktivitas dengan timestamp < batas ke log_aktivitas_harian lalu hapus aslinya.
+
+    Diproses per chunk baris tertua (range scan ix_log_aktivitas_timestamp):
+    hitung per (tanggal, user_id, tabel, aksi), upsert jumlah ke ringkasan, hapus
+    id yang sudah diringkas, lalu commit, sehingga transaksi & lock tetap kecil
+    dan job yang terhenti bisa dijalankan ulang tanpa menghitung dua kali.
+    Return jumlah baris yang diarsipkan.
+    """
+    total = 0
+    while True:
+        rows = db.session.query(
+            LogAktivitas.id, LogAktivitas.timestamp, LogAktivitas.user_id,
+            LogAktivitas.tabel, LogAktivitas.aksi
+        ).filter(
+            LogAktivitas.timestamp < batas
+        ).order_by(LogAktivitas.timestamp, LogAktivitas.id).limit(chunk).all()
+        if not rows:
+            break
+
+        jumlah = Counter(
+            (row.timestamp.date(), row.user_id or 0, row.tabel or "", row.aksi or "")
+            for row in rows
+        )
+        upsert(
+            LogAktivitasHarian.__table__,
+            [
+                {"tanggal": tanggal, "user_id": user_id, "tabel": tabel, "aksi": aksi, "jumlah": n}
+                for (tanggal, user_id, tabel, aksi), n in jumlah.items()
+            ],
+            kunci=["tanggal", "user_id", "tabel", "aksi"],
+            tambah=["jumlah"]
+        )
+        db.session.execute(
+            LogAktivitas.__table__.delete().where(LogAktivitas.id.in_([row.id for row in rows]))
+        )
+        db.session.commit()
+        total += len(rows)
+        if len(rows) < chunk:
+            break
+    return total
+
+
+# =========================
+# MUAT BERKAS JSONL (AUDIT_LOG_MODE = "jsonl")
+# =========================
+KOLOM_LOG = ("user_id", "aksi", "tabel", "entri_id", "keterangan", "timestamp")
+
+
+def muat_berkas_jsonl(path, batch=1000):
+    """Muat satu file audit .jsonl.gz hasil putaran BerkasAudit ke log_aktivitas.
+
+    INSERT multi-row per `batch` baris dalam satu transaksi per file; file dihapus
+    setelah commit sehingga tidak dimuat dua kali. Baris rusak (mis. terpotong
+    saat proses mati) dilewati. Return (jumlah dimuat, jumlah rusak).
+    """
+    dimuat = rusak = 0
+    rows = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for baris in f:
+            if not baris.strip():
+                continue
+            try:
+                data = json.loads(baris)
+                row = {kolom: data.get(kolom) for kolom in KOLOM_LOG}
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+            except (ValueError, TypeError, AttributeError):
+                rusak += 1
+                continue
+            rows.append(row)
+            if len(rows) >= batch:
+                db.session.execute(LogAktivitas.__table__.insert(), rows)
+                dimuat += len(rows)
+                rows = []
+    if rows:
+        db.session.execute(LogAktivitas.__table__.insert(), rows)
+        dimuat += len(rows)
+    db.session.commit()
+    os.remove(path)
+    if rusak:
+        logger.warning("%d baris audit rusak dilewati di %s", rusak, path)
+    return dimuat, rusak
@@ -0,0 +1,148 @@
+import copy
+import functools
+import glob
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, request, render_template, jsonify, send_file
+from werkzeug.utils import secure_filename
+
+# Satu pool proses per worker WSGI, dibuat saat PDF pertama diminta
+_executor = None
+# PDF yang sedang dirender: path tujuan -> Future
+_proses = {}
+_lock = threading.Lock()
+
+
+# =========================
+# WORKER (berjalan di proses terpisah)
+# =========================
+def _render_pdf(html, base_url, tujuan, lama):
+    """Render HTML ke file PDF. Ditulis ke file sementara lalu di-rename agar atomik.
+
+    Setelah PDF baru siap, versi lama laporan yang sama (pola `lama`) dihapus
+    supaya setiap perubahan data tidak meninggalkan file PDF usang di disk.
+    """
+    from weasyprint import HTML
+
+    sementara = f"{tujuan}.{os.getpid()}.tmp"
+    HTML(string=html, base_url=base_url).write_pdf(sementara)
+    os.replace(sementara, tujuan)
+    for path in glob.glob(lama):
+        if path != tujuan:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return tujuan
+
+
+def _selesai(tujuan, future):
+    """Callback Future: lepas dari _proses begitu render selesai, walau tidak ada request yang menunggu."""
+    with _lock:
+        if _proses.get(tujuan) is future:
+            del _proses[tujuan]
+
+
+def _get_executor(baru=False):
+    global _executor
+    with _lock:
+        if baru and _executor is not None:
+            # pool rusak (proses worker mati), buang dan buat ulang
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _executor is None:
+            workers = current_app.config.get("LAPORAN_PDF_WORKERS", 2)
+            # spawn: jangan fork proses WSGI yang sedang memegang koneksi database
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+# =========================
+# HELPER
+# =========================
+def pdf_tersedia():
+    """True bila WeasyPrint terpasang (dependency opsional)."""
+    return importlib.util.find_spec("weasyprint") is not None
+
+
+def versi_data_laporan(template, data):
+    """Hash isi laporan (tanpa tanggal cetak) + sumber template, dipakai sebagai kunci cache PDF."""
+    isi = copy.copy(data)
+    isi.pop("tanggal_cetak", None)
+    source, _, _ = current_app.jinja_env.loader.get_source(current_app.jinja_env, template)
+    payload = json.dumps({"template": source, "data": isi}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def kunci_laporan():
+    """Identitas laporan dari URL request (tanpa ?format), sama untuk semua versi datanya."""
+    args = sorted((k, v) for k, v in request.args.items(multi=True) if k != "format")
+    return hashlib.sha1(f"{request.path}?{args}".encode("utf-8")).hexdigest()[:16]
+
+
+def _path_pdf(template, kunci, versi):
+    """Path PDF `<kunci laporan>-<versi data>.pdf` dan pola glob semua versi laporan tersebut."""
+    folder = os.path.join(
+        current_app.config["LAPORAN_PDF_DIR"],
+        os.path.splitext(os.path.basename(template))[0]
+    )
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{kunci}-{versi}.pdf"), os.path.join(folder, f"{kunci}-*.pdf")
+
+
+def kirim_pdf(template, nama_file, data, **context):
+    """Kirim laporan sebagai PDF dari cache disk, atau jadwalkan render di process pool.
+
+    Bila PDF belum selesai dalam LAPORAN_PDF_TUNGGU detik, balas 202 dan
+    klien cukup mengulang request yang sama sampai mendapat file PDF.
+    """
+    if not pdf_tersedia():
+        return jsonify({"success": False, "message": "Export PDF server belum tersedia (WeasyPrint belum terpasang)"}), 501
+
+    tujuan, lama = _path_pdf(template, kunci_laporan(), versi_data_laporan(template, data))
+
+    if not os.path.exists(tujuan):
+        with _lock:
+            future = _proses.get(tujuan)
+        if future is None:
+            html = render_template(template, data=data, **context)
+            try:
+                future = _get_executor().submit(_render_pdf, html, request.url_root, tujuan, lama)
+            except BrokenProcessPool:
+                future = _get_executor(baru=True).submit(_render_pdf, html, request.url_root, tujuan, lama)
+            with _lock:
+                _proses[tujuan] = future
+            # dipanggil langsung bila future sudah selesai
+            future.add_done_callback(functools.partial(_selesai, tujuan))
+
+        wait([future], timeout=current_app.config.get("LAPORAN_PDF_TUNGGU", 2))
+        if not future.done():
+            response = jsonify({"success": True, "status": "proses", "message": "PDF sedang dibuat, silakan tunggu"})
+            response.headers["Retry-After"] = "2"
+            return response, 202
+
+        if future.exception() is not None:
+            if isinstance(future.exception(), BrokenProcessPool):
+                _get_executor(baru=True)
+            current_app.logger.error(f"Gagal membuat PDF {nama_file}: {future.exception()}")
+            return jsonify({"success": False, "message": f"Gagal membuat PDF: {future.exception()}"}), 500
+
+    # "2025/2026" pada nama file -> "2025-2026"
+    nama_file = secure_filename(nama_file.replace("/", "-"))
+    return send_file(tujuan, mimetype="application/pdf", as_attachment=True, download_name=nama_file)
+
+
+def respon_laporan(template, nama_file, data, **context):
+    """Render laporan sebagai HTML, atau PDF bila diminta dengan ?format=pdf."""
+    if request.args.get("format") == "pdf":
+        return kirim_pdf(template, nama_file, data, **context)
+    # tombol "Unduh PDF (Server)" hanya ditampilkan bila WeasyPrint terpasang
+    return render_template(template, data=data, pdf_tersedia=pdf_tersedia(), **context)
@@ -0,0 +1,217 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import accumulate
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from penilaiansiswa import db
+from penilaiansiswa.models import Provinsi, Kabupaten, Kecamatan, Sekolah
+from penilaiansiswa.utils.teks import normalisasi_nama
+
+# Batas hasil /pegawai/search_sekolah
+MAKS_HASIL_SEKOLAH = 20
+# Panjang minimal q (setelah normalisasi); awalan lebih pendek cocok dengan hampir semua sekolah
+MIN_PANJANG_Q = 3
+# Kandidat yang dicek satu per satu sebelum beralih ke irisan himpunan
+MAKS_PINDAI = 2000
+
+# Penanda di Session.info: transaksi ini mengubah sekolah/wilayah
+KUNCI_BERUBAH = "index_sekolah_berubah"
+
+# Index aktif proses ini: (IndeksSekolah, generasi data, waktu dibuat)
+_indeks = None
+# Naik setiap commit yang mengubah sekolah/wilayah; index generasi lama dianggap basi
+_generasi = 0
+_lock = threading.Lock()
+_sedang_dibangun = False
+
+
+class IndeksSekolah:
+    """Index awalan in-memory atas kata nama_sekolah (sudah dinormalisasi) dan NPSN.
+
+    Sekolah disimpan terurut menurut nama, jadi posisi = urutan hasil. Setiap kunci
+    (kata / NPSN) punya daftar posisi yang juga terurut; pencarian menggabung daftar
+    itu secara lazy dan berhenti setelah `limit` hasil. Tidak ada query saat mencari.
+    """
+
+    def __init__(self, rows, wilayah):
+        """rows: (id, nama_sekolah, npsn, kecamatan_id); wilayah: {kecamatan_id: {id & label wilayah}}."""
+        rows = list(rows)
+        nama = [normalisasi_nama(row[1]) for row in rows]
+        urutan = sorted(range(len(rows)), key=nama.__getitem__)
+        self.nama = [nama[j] for j in urutan]
+        self.sekolah = [rows[j] for j in urutan]
+        self.wilayah = wilayah
+        # " kata1 kata2 ... npsn": kata q cocok bila " " + kata ada di teks ini
+        self.teks = []
+        self._npsn = {}
+        posting = defaultdict(list)
+        for i, row in enumerate(self.sekolah):
+            npsn = (row[2] or "").strip()
+            teks = f" {self.nama[i]} {npsn}"
+            self.teks.append(teks)
+            # kata ganda dalam satu nama cukup disaring saat mencari
+            for k in teks.split():
+                posting[k].append(i)
+            if npsn:
+                self._npsn.setdefault(npsn, i)
+        self._kunci = sorted(posting)
+        self._posting = [posting[k] for k in self._kunci]
+        # _kumulatif[j] = jumlah posisi milik kunci ke-0..j-1, untuk ukuran rentang awalan
+        self._kumulatif = list(accumulate((len(p) for p in self._posting), initial=0))
+
+    def _rentang(self, awalan):
+        """Rentang indeks _kunci yang berawalan `awalan`."""
+        kiri = bisect_left(self._kunci, awalan)
+        return kiri, bisect_left(self._kunci, awalan + "\uffff", kiri)
+
+    def _urutan(self, q_normal, awal, akhir):
+        """Posisi kandidat sesuai urutan hasil (boleh berulang): NPSN sama persis,
+        nama diawali q (satu rentang di daftar nama), lalu posisi kunci awal..akhir."""
+        if q_normal in self._npsn:
+            yield self._npsn[q_normal]
+        for i in range(bisect_left(self.nama, q_normal), len(self.nama)):
+            if not self.nama[i].startswith(q_normal):
+                break
+            yield i
+        yield from heapq.merge(*self._posting[awal:akhir])
+
+    def _data(self, i):
+        id_, nama_sekolah, npsn, kecamatan_id = self.sekolah[i]
+        return {"id": id_, "nama_sekolah": nama_sekolah, "npsn": npsn, **self.wilayah.get(kecamatan_id, {})}
+
+    def cari(self, q, limit=MAKS_HASIL_SEKOLAH):
+        """Setiap kata q harus menjadi awalan salah satu kata nama atau NPSN.
+
+        Urutan: NPSN sama persis, nama diawali q, lalu nama menurut abjad.
+        q yang lebih pendek dari MIN_PANJANG_Q tidak dicari.
+        """
+        q_normal = normalisasi_nama(q)
+        if len(q_normal) < MIN_PANJANG_Q:
+            return []
+        kata_q = list(dict.fromkeys(q_normal.split()))
+
+        # kata dengan posisi paling sedikit menggerakkan pencarian, semua kata dicek per sekolah
+        rentang = {kata: self._rentang(kata) for kata in kata_q}
+        penggerak = min(kata_q, key=lambda kata: self._kumulatif[rentang[kata][1]] - self._kumulatif[rentang[kata][0]])
+
+        hasil, dilihat = [], set()
+        for i in self._urutan(q_normal, *rentang[penggerak]):
+            if i in dilihat:
+                continue
+            if len(dilihat) >= MAKS_PINDAI:
+                # kata-kata q sering muncul tetapi jarang bersamaan: iris himpunan posisi sekaligus.
+                # Posisi yang belum dilihat semuanya sesudah posisi terakhir, jadi urutan tetap sama
+                irisan = set.intersection(*[set().union(*self._posting[slice(*rentang[kata])]) for kata in kata_q])
+                hasil.extend(self._data(j) for j in heapq.nsmallest(limit - len(hasil), irisan - dilihat))
+                break
+            dilihat.add(i)
+            if all(f" {kata}" in self.teks[i] for kata in kata_q):
+                hasil.append(self._data(i))
+                if len(hasil) >= limit:
+                    break
+        return hasil
+
+
+def _bangun_index():
+    """Dua query: sekolah aktif, lalu label wilayah per kecamatan."""
+    rows = db.session.execute(
+        db.select(Sekolah.id, Sekolah.nama_sekolah, Sekolah.npsn, Sekolah.kecamatan_id).where(Sekolah.aktif.is_(True))
+    ).all()
+    wilayah = {
+        row.kecamatan_id: {
+            "provinsi_id": row.provinsi_id,
+            "kabupaten_id": row.kabupaten_id,
+            "kecamatan_id": row.kecamatan_id,
+            "wilayah": ", ".join(n for n in (row.kecamatan, row.kabupaten, row.provinsi) if n),
+        }
+        for row in db.session.query(
+            Kecamatan.id.label("kecamatan_id"), Kecamatan.nama.label("kecamatan"),
+            Kabupaten.id.label("kabupaten_id"), Kabupaten.nama.label("kabupaten"),
+            Provinsi.id.label("provinsi_id"), Provinsi.nama.label("provinsi"),
+        ).select_from(Kecamatan
+        ).outerjoin(Kabupaten, Kabupaten.id == Kecamatan.kabupaten_id
+        ).outerjoin(Provinsi, Provinsi.id == Kabupaten.provinsi_id)
+    }
+    return IndeksSekolah(rows, wilayah)
+
+
+def _pasang_index(generasi):
+    """Bangun index baru lalu ganti index aktif sekaligus (satu assignment)."""
+    global _indeks
+    _indeks = (_bangun_index(), generasi, time.monotonic())
+
+
+def _bangun_latar(app, generasi):
+    global _sedang_dibangun
+    try:
+        with app.app_context():
+            _pasang_index(generasi)
+    except Exception:
+        app.logger.exception("Gagal membangun ulang index pencarian sekolah")
+    finally:
+        _sedang_dibangun = False
+
+
+def cari_sekolah(q, limit=MAKS_HASIL_SEKOLAH):
+    """Cari sekolah aktif berdasarkan awalan kata nama atau NPSN, beserta wilayahnya.
+
+    Index dibangun saat pencarian pertama. Setelah itu, bila data sekolah/wilayah berubah
+    atau TTL SEKOLAH_INDEX_TTL lewat (perubahan dari worker lain), index dibangun ulang
+    di thread latar belakang sementara pencarian tetap memakai index lama.
+    """
+    global _sedang_dibangun
+    aktif = _indeks
+    if aktif is None:
+        with _lock:
+            if _indeks is None:
+                _pasang_index(_generasi)
+        aktif = _indeks
+    else:
+        _, generasi, dibuat = aktif
+        ttl = current_app.config.get("SEKOLAH_INDEX_TTL", 600)
+        basi = generasi != _generasi or (ttl and time.monotonic() - dibuat > ttl)
+        if basi and not _sedang_dibangun:
+            with _lock:
+                if not _sedang_dibangun:
+                    _sedang_dibangun = True
+                    threading.Thread(
+                        target=_bangun_latar, args=(current_app._get_current_object(), _generasi),
+                        name="index-sekolah", daemon=True
+                    ).start()
+    return aktif[0].cari(q, limit)
+
+
+def invalidate_index_sekolah(*args):
+    """Tandai index sekolah basi; dibangun ulang saat pencarian berikutnya (import data sekolah)."""
+    global _generasi
+    _generasi += 1
+
+
+# =========================
+# EVENT SEKOLAH & WILAYAH
+# =========================
+def _tandai_berubah(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[KUNCI_BERUBAH] = True
+
+
+def _setelah_commit(session):
+    # generasi baru setelah commit, agar thread pembangun membaca data yang sudah tersimpan
+    if session.info.pop(KUNCI_BERUBAH, False):
+        invalidate_index_sekolah()
+
+
+def _buang_tanda(session, *args):
+    session.info.pop(KUNCI_BERUBAH, None)
+
+
+for _model in (Provinsi, Kabupaten, Kecamatan, Sekolah):
+    for _evt in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _evt, _tandai_berubah)
+event.listen(db.session, "after_commit", _setelah_commit)
+event.listen(db.session, "after_rollback", _buang_tanda)
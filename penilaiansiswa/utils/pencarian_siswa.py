@@ -0,0 +1,112 @@
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import contains_eager, joinedload
+from penilaiansiswa import db
+from penilaiansiswa.models import Kelas, Siswa, SiswaToken
+from penilaiansiswa.utils.teks import normalisasi_nama, token_nama
+
+# Batas hasil /siswa/search
+MAKS_HASIL = 20
+# Panjang minimal kata q untuk pencarian nama
+MIN_PANJANG_TOKEN = 2
+
+
+# =========================
+# PENCARIAN
+# =========================
+def cari_siswa(q, kelas=None, limit=MAKS_HASIL):
+    """Cari siswa berdasarkan NISN atau nama, kelas & sekolah ikut di-load.
+
+    - q hanya angka : prefix NISN (index uq_nisn_per_kelas), NISN yang persis sama di urutan awal
+    - selain itu    : setiap kata q harus menjadi awalan salah satu kata nama (index siswa_token),
+                      jadi "ahm fau" menemukan "Ahmad Fauzi"; kata < MIN_PANJANG_TOKEN huruf diabaikan
+    - kelas         : kecualikan siswa yang sudah di kelas mana pun pada sekolah & tahun ajaran
+                      yang sama dengan kelas ini (siswa tanpa kelas juga tidak ikut, seperti sebelumnya)
+    """
+    q = (q or "").strip()
+    query = Siswa.query
+    if kelas is not None:
+        query = query.join(Siswa.kelas).filter(
+            ~db.and_(Kelas.sekolah_id == kelas.sekolah_id, Kelas.tahun_ajaran_id == kelas.tahun_ajaran_id)
+        ).options(contains_eager(Siswa.kelas).joinedload(Kelas.sekolah))
+    else:
+        query = query.options(joinedload(Siswa.kelas).joinedload(Kelas.sekolah))
+
+    if q.isdigit():
+        # awalan terurut: NISN yang sama persis selalu muncul pertama
+        return query.filter(Siswa.nisn.like(f"{q}%")).order_by(Siswa.nisn, Siswa.id).limit(limit).all()
+
+    # kata terlalu pendek (mis. inisial "a") cocok dengan sebagian besar siswa_token: diabaikan
+    tokens = [token for token in token_nama(q) if len(token) >= MIN_PANJANG_TOKEN]
+    if not tokens:
+        return []
+    for token in tokens:
+        query = query.filter(Siswa.id.in_(
+            select(SiswaToken.siswa_id).where(SiswaToken.token.like(f"{token}%"))
+        ))
+    return query.order_by(Siswa.nama_normal, Siswa.id).limit(limit).all()
+
+
+# =========================
+# INDEX TOKEN
+# =========================
+def tulis_token_siswa(nama_map, conn=None):
+    """Ganti token nama untuk {siswa_id: nama_siswa}; dipakai event dan penulisan massal (Core)."""
+    if not nama_map:
+        return
+    executor = conn if conn is not None else db.session
+    tabel = SiswaToken.__table__
+    executor.execute(tabel.delete().where(tabel.c.siswa_id.in_(list(nama_map))))
+    rows = [
+        {"token": token, "siswa_id": siswa_id}
+        for siswa_id, nama in nama_map.items()
+        for token in token_nama(nama)
+    ]
+    if rows:
+        executor.execute(tabel.insert(), rows)
+
+
+def rebuild_token_siswa(batch=1000):
+    """Isi ulang siswa.nama_normal dan seluruh siswa_token per batch. Tidak commit. Return jumlah siswa."""
+    total, id_terakhir = 0, 0
+    while True:
+        rows = db.session.query(Siswa.id, Siswa.nama_siswa).filter(
+            Siswa.id > id_terakhir
+        ).order_by(Siswa.id).limit(batch).all()
+        if not rows:
+            return total
+        db.session.execute(
+            Siswa.__table__.update().where(Siswa.__table__.c.id == db.bindparam("b_id")).values(
+                nama_normal=db.bindparam("b_nama")
+            ),
+            [{"b_id": row.id, "b_nama": normalisasi_nama(row.nama_siswa)} for row in rows]
+        )
+        tulis_token_siswa({row.id: row.nama_siswa for row in rows})
+        total += len(rows)
+        id_terakhir = rows[-1].id
+
+
+# =========================
+# EVENT SISWA
+# =========================
+def _isi_nama_normal(mapper, connection, target):
+    target.nama_normal = normalisasi_nama(target.nama_siswa)
+
+
+def _token_baru(mapper, connection, target):
+    tulis_token_siswa({target.id: target.nama_siswa}, conn=connection)
+
+
+def _token_ubah(mapper, connection, target):
+    if inspect(target).attrs.nama_siswa.history.has_changes():
+        tulis_token_siswa({target.id: target.nama_siswa}, conn=connection)
+
+
+def _token_hapus(mapper, connection, target):
+    connection.execute(SiswaToken.__table__.delete().where(SiswaToken.__table__.c.siswa_id == target.id))
+
+
+event.listen(Siswa, "before_insert", _isi_nama_normal)
+event.listen(Siswa, "before_update", _isi_nama_normal)
+event.listen(Siswa, "after_insert", _token_baru)
+event.listen(Siswa, "after_update", _token_ubah)
+event.listen(Siswa, "before_delete", _token_hapus)
@@ -0,0 +1,259 @@
+from sqlalchemy import func
+from penilaiansiswa import db
+from penilaiansiswa.models import Kebiasaan, Siswa, RekapKelasBulan
+
+KEBIASAAN_FIELDS = [
+    "bangun_pagi", "beribadah", "berolahraga",
+    "sehat_dan_lemar", "belajar", "bermasyarakat", "tidur_cepat"
+]
+
+# Nilai minimal agar satu kebiasaan dianggap "terbiasa"
+AMBANG_TERBIASA = 20
+
+
+# =========================
+# LOADER MATRIKS NILAI
+# =========================
+def load_nilai_kelas(kelas_id, bulan_list, siswa_id=None):
+    """Ambil seluruh nilai kebiasaan satu kelas untuk daftar bulan dalam SATU query.
+
+    Return dict {siswa_id: {bulan: {field: nilai, ..., 'catatan': ...}}}.
+    Siswa/bulan yang belum diisi tidak muncul di dict.
+    Isi siswa_id untuk membatasi ke satu siswa saja.
+    """
+    if not bulan_list:
+        return {}
+
+    query = db.session.query(
+        Kebiasaan.siswa_id,
+        Kebiasaan.bulan,
+        *[getattr(Kebiasaan, field) for field in KEBIASAAN_FIELDS],
+        Kebiasaan.catatan
+    ).filter(
+        Kebiasaan.kelas_id == kelas_id,
+        Kebiasaan.bulan.in_(list(bulan_list))
+    )
+    if siswa_id is not None:
+        query = query.filter(Kebiasaan.siswa_id == siswa_id)
+    # satu baris per siswa/kelas/bulan dijamin oleh uq_kebiasaan_siswa_kelas_bulan
+    matrix = {}
+    for row in query.all():
+        nilai = {field: getattr(row, field) for field in KEBIASAAN_FIELDS}
+        nilai["catatan"] = row.catatan
+        matrix.setdefault(row.siswa_id, {})[row.bulan] = nilai
+    return matrix
+
+
+# =========================
+# REKAP TERBIASA / BELUM
+# =========================
+def _rekap_kosong():
+    return {field: {"terbiasa": 0, "belum": 0} for field in KEBIASAAN_FIELDS}
+
+
+def _tambah_persentase(rekap):
+    """Tambahkan terbiasa_pct / belum_pct ke setiap field rekap."""
+    for field in KEBIASAAN_FIELDS:
+        total_field = rekap[field]["terbiasa"] + rekap[field]["belum"]
+        if total_field > 0:
+            rekap[field]["terbiasa_pct"] = round((rekap[field]["terbiasa"] / total_field) * 100, 2)
+            rekap[field]["belum_pct"] = round((rekap[field]["belum"] / total_field) * 100, 2)
+        else:
+            rekap[field]["terbiasa_pct"] = 0.0
+            rekap[field]["belum_pct"] = 0.0
+
+
+def nilai_minimum_periode(nilai_siswa, bulan_list):
+    """Reduksi nilai satu siswa menjadi nilai minimum per field selama periode.
+
+    Bulan yang belum diisi dihitung 0, sehingga aturan "setiap bulan >= 20"
+    cukup dicek dengan minimum >= 20.
+    """
+    baris_bulan = [nilai_siswa.get(bulan) or {} for bulan in bulan_list]
+    return {
+        field: min((baris.get(field) or 0 for baris in baris_bulan), default=0)
+        for field in KEBIASAAN_FIELDS
+    }
+
+
+def hitung_rekap_periode(siswa_list, matrix, bulan_list):
+    """Hitung rekap terbiasa/belum untuk satu atau beberapa bulan (tanpa query).
+
+    Satu field dianggap terbiasa bila nilainya >= 20 di SETIAP bulan periode,
+    siswa dianggap terbiasa bila ketujuh field terbiasa.
+    Return dict berisi 'rekap_siswa', 'rekap_umum' dan 'rekap_jk'
+    dengan struktur yang sama seperti yang dipakai template laporan.
+    """
+    rekap_umum = _rekap_kosong()
+    rekap_jk = {"P": _rekap_kosong(), "L": _rekap_kosong()}
+
+    jml_perempuan = sum(1 for s in siswa_list if s.jenis_kelamin == "P")
+    jml_laki = sum(1 for s in siswa_list if s.jenis_kelamin == "L")
+    terbiasa_perempuan = 0
+    terbiasa_laki = 0
+
+    for siswa in siswa_list:
+        minimum = nilai_minimum_periode(matrix.get(siswa.id, {}), bulan_list)
+
+        semua_terbiasa = True
+        for field in KEBIASAAN_FIELDS:
+            status = "terbiasa" if minimum[field] >= AMBANG_TERBIASA else "belum"
+            rekap_umum[field][status] += 1
+            rekap_jk[siswa.jenis_kelamin][field][status] += 1
+            if status == "belum":
+                semua_terbiasa = False
+
+        # LOGIKA TERBIASA: semua 7 field terbiasa
+        if semua_terbiasa:
+            if siswa.jenis_kelamin == "P":
+                terbiasa_perempuan += 1
+            elif siswa.jenis_kelamin == "L":
+                terbiasa_laki += 1
+
+    _tambah_persentase(rekap_umum)
+    for jk in ["P", "L"]:
+        _tambah_persentase(rekap_jk[jk])
+
+    total_siswa = len(siswa_list)
+    total_terbiasa = terbiasa_perempuan + terbiasa_laki
+
+    return {
+        "rekap_siswa": {
+            "perempuan": {"total": jml_perempuan, "terbiasa": terbiasa_perempuan, "belum": jml_perempuan - terbiasa_perempuan},
+            "laki": {"total": jml_laki, "terbiasa": terbiasa_laki, "belum": jml_laki - terbiasa_laki},
+            "total": {"total": total_siswa, "terbiasa": total_terbiasa, "belum": total_siswa - total_terbiasa}
+        },
+        "rekap_umum": rekap_umum,
+        "rekap_jk": rekap_jk,
+    }
+
+
+def hitung_rekap_bulan(siswa_list, matrix, bulan):
+    """Rekap RCHK satu bulan = rekap periode dengan satu bulan."""
+    return hitung_rekap_periode(siswa_list, matrix, [bulan])
+
+
+def rekap_kelas_periode(kelas_id, siswa_list, bulan_list):
+    """Muat nilai kelas untuk seluruh bulan sekaligus lalu hitung rekap periodenya."""
+    matrix = load_nilai_kelas(kelas_id, bulan_list)
+    return hitung_rekap_periode(siswa_list, matrix, bulan_list)
+
+
+def rekap_bulan_tersimpan(kelas_id, bulan):
+    """Rekap RCHK satu bulan dari tabel rekap_kelas_bulan (tanpa memindai nilai siswa).
+
+    Return None bila belum ada baris rekap untuk kelas/bulan ini, atau bila jumlah_terisi
+    tidak sama dengan jumlah nilai siswa kelas ini (rekap tertinggal, mis. siswa pindah
+    kelas); pemanggil sebaiknya jatuh kembali ke hitung_rekap_bulan().
+    """
+    rows = RekapKelasBulan.query.filter_by(kelas_id=kelas_id, bulan=bulan).all()
+    if not rows:
+        return None
+    per_jk = {row.jenis_kelamin: row for row in rows}
+
+    # jumlah siswa dan jumlah nilai terisi per jenis kelamin dalam satu query
+    terisi = db.or_(*[getattr(Kebiasaan, field).isnot(None) for field in KEBIASAAN_FIELDS])
+    hitungan = db.session.query(
+        Siswa.jenis_kelamin, func.count(Siswa.id), func.count(Kebiasaan.id)
+    ).outerjoin(Kebiasaan, db.and_(
+        Kebiasaan.siswa_id == Siswa.id,
+        Kebiasaan.kelas_id == kelas_id,
+        Kebiasaan.bulan == bulan,
+        terisi
+    )).filter(Siswa.kelas_id == kelas_id).group_by(Siswa.jenis_kelamin).all()
+
+    jumlah_siswa = {jk: jumlah for jk, jumlah, _ in hitungan}
+    jumlah_terisi = {jk: nilai for jk, _, nilai in hitungan if nilai}
+    if jumlah_terisi != {row.jenis_kelamin: row.jumlah_terisi for row in rows if row.jumlah_terisi}:
+        return None
+
+    rekap_umum = _rekap_kosong()
+    rekap_jk = {"P": _rekap_kosong(), "L": _rekap_kosong()}
+    terbiasa_semua = {}
+
+    for jk in ["P", "L"]:
+        row = per_jk.get(jk)
+        total = jumlah_siswa.get(jk, 0)
+        terbiasa_semua[jk] = row.terbiasa_semua if row else 0
+        for field in KEBIASAAN_FIELDS:
+            terbiasa = getattr(row, f"{field}_terbiasa") if row else 0
+            rekap_jk[jk][field]["terbiasa"] = terbiasa
+            rekap_jk[jk][field]["belum"] = total - terbiasa
+            rekap_umum[field]["terbiasa"] += terbiasa
+            rekap_umum[field]["belum"] += total - terbiasa
+
+    _tambah_persentase(rekap_umum)
+    for jk in ["P", "L"]:
+        _tambah_persentase(rekap_jk[jk])
+
+    jml_perempuan = jumlah_siswa.get("P", 0)
+    jml_laki = jumlah_siswa.get("L", 0)
+    total_siswa = jml_perempuan + jml_laki
+    total_terbiasa = terbiasa_semua["P"] + terbiasa_semua["L"]
+
+    return {
+        "rekap_siswa": {
+            "perempuan": {"total": jml_perempuan, "terbiasa": terbiasa_semua["P"], "belum": jml_perempuan - terbiasa_semua["P"]},
+            "laki": {"total": jml_laki, "terbiasa": terbiasa_semua["L"], "belum": jml_laki - terbiasa_semua["L"]},
+            "total": {"total": total_siswa, "terbiasa": total_terbiasa, "belum": total_siswa - total_terbiasa}
+        },
+        "rekap_umum": rekap_umum,
+        "rekap_jk": rekap_jk,
+    }
+
+
+# =========================
+# AGREGAT PER SISWA PER SEMESTER
+# =========================
+def semester_dari_bulan(bulan):
+    """'2025-08' -> ('2025/2026', 'ganjil'), '2026-02' -> ('2025/2026', 'genap')."""
+    tahun, bulan_num = (int(x) for x in bulan.split("-"))
+    if bulan_num >= 7:
+        return f"{tahun}/{tahun + 1}", "ganjil"
+    return f"{tahun - 1}/{tahun}", "genap"
+
+
+def bulan_semester(tahun_ajaran, semester):
+    """Daftar 6 bulan 'YYYY-MM' milik satu semester ('2025/2026', 'ganjil')."""
+    tahun_awal, tahun_akhir = (int(x) for x in tahun_ajaran.split("/"))
+    if semester == "ganjil":
+        return [f"{tahun_awal}-{m:02d}" for m in range(7, 13)]
+    return [f"{tahun_akhir}-{m:02d}" for m in range(1, 7)]
+
+
+def hitung_agregat_siswa(nilai_per_bulan):
+    """Agregat satu siswa dari {bulan: {field: nilai}} (bulan kosong boleh tidak ada).
+
+    Hanya bulan dengan nilai > 0 yang dihitung terisi. Status terbiasa bila
+    rata-rata bulan terisi >= 20. Return {field: {'jumlah', 'terisi', 'min', 'rata', 'terbiasa'}}.
+    """
+    agregat = {}
+    for field in KEBIASAAN_FIELDS:
+        terisi = [
+            nilai[field] for nilai in nilai_per_bulan.values()
+            if nilai and (nilai.get(field) or 0) > 0
+        ]
+        jumlah = sum(terisi)
+        rata = jumlah / len(terisi) if terisi else 0
+        agregat[field] = {
+            "jumlah": jumlah,
+            "terisi": len(terisi),
+            "min": min(terisi) if terisi else None,
+            "rata": rata,
+            "terbiasa": bool(terisi) and rata >= AMBANG_TERBIASA,
+        }
+    return agregat
+
+
+def agregat_dari_rekap(rekap_siswa):
+    """Ubah baris RekapSiswaSemester ke struktur yang sama dengan hitung_agregat_siswa()."""
+    return {
+        field: {
+            "jumlah": getattr(rekap_siswa, f"{field}_jumlah"),
+            "terisi": getattr(rekap_siswa, f"{field}_terisi"),
+            "min": getattr(rekap_siswa, f"{field}_min"),
+            "rata": getattr(rekap_siswa, f"{field}_rata"),
+            "terbiasa": bool(getattr(rekap_siswa, f"{field}_terbiasa")),
+        }
+        for field in KEBIASAAN_FIELDS
+    }
@@ -0,0 +1,118 @@
+from datetime import datetime
+from penilaiansiswa import db
+from penilaiansiswa.models import Kelas, Siswa, OperasiKlien
+from penilaiansiswa.utils.kebiasaan_simpan import (
+    KOLOM_ISIAN, terapkan_sel, data_kebiasaan, baca_kebiasaan_lama, simpan_kebiasaan_kelas
+)
+
+JENIS_OPERASI = ("simpan", "hapus")
+
+
+def _periksa_operasi(op):
+    """Validasi bentuk satu operasi. Return pesan penolakan, atau None bila valid."""
+    if op.get("jenis") not in JENIS_OPERASI:
+        return "Jenis operasi tidak dikenal"
+    try:
+        op["siswa_id"] = int(op["siswa_id"])
+        op["kelas_id"] = int(op["kelas_id"])
+        datetime.strptime(op["bulan"], "%Y-%m")
+    except (KeyError, TypeError, ValueError):
+        return "siswa_id, kelas_id atau bulan tidak valid"
+    if op["jenis"] == "simpan":
+        if not isinstance(op.get("data"), dict):
+            return "Data operasi simpan tidak valid"
+        try:
+            terapkan_sel(None, op["data"])
+        except ValueError as e:
+            return str(e)
+    return None
+
+
+def replay_operasi(operasi, user_id, pegawai_id):
+    """Terapkan antrean operasi klien berurutan dalam transaksi yang sedang berjalan.
+
+    operasi: list dict {"op_id", "jenis": "simpan"/"hapus", "kelas_id", "siswa_id", "bulan", "data"}.
+    "simpan" menimpa sel yang dikirim saja, "hapus" mengosongkan seluruh isi baris
+    (sama seperti delete_row). op_id yang sudah pernah diproses user ini dilewati.
+
+    Validasi kelas & siswa masing-masing satu query, lalu satu baca + satu upsert
+    per kelas/bulan. Tidak commit. Return list {"op_id", "status", "message"} sesuai urutan.
+    """
+    op_ids = [op["op_id"] for op in operasi]
+    sudah = {
+        row.op_id: row.status
+        for row in db.session.query(OperasiKlien.op_id, OperasiKlien.status).filter(
+            OperasiKlien.user_id == user_id,
+            OperasiKlien.op_id.in_(op_ids)
+        )
+    }
+
+    hasil, baru, dilihat = [], [], set()
+    for op in operasi:
+        if op["op_id"] in sudah or op["op_id"] in dilihat:
+            hasil.append({"op_id": op["op_id"], "status": "duplikat", "message": "Operasi sudah diproses"})
+            continue
+        dilihat.add(op["op_id"])
+        status = {"op_id": op["op_id"], "status": "diterapkan", "message": None}
+        pesan = _periksa_operasi(op)
+        if pesan:
+            status.update(status="ditolak", message=pesan)
+        hasil.append(status)
+        baru.append((op, status))
+
+    valid = [op for op, status in baru if status["status"] == "diterapkan"]
+
+    # ✅ hak wali kelas dan keanggotaan siswa untuk semua operasi sekaligus
+    kelas_wali = {
+        kelas_id for (kelas_id,) in db.session.query(Kelas.id).filter(
+            Kelas.id.in_({op["kelas_id"] for op in valid}),
+            Kelas.wali_kelas_id == pegawai_id
+        )
+    } if valid else set()
+    siswa_map = {
+        s.id: s for s in Siswa.query.filter(Siswa.id.in_({op["siswa_id"] for op in valid}))
+    } if valid else {}
+
+    per_kelas_bulan = {}
+    for op, status in baru:
+        if status["status"] != "diterapkan":
+            continue
+        siswa = siswa_map.get(op["siswa_id"])
+        if op["kelas_id"] not in kelas_wali:
+            status.update(status="ditolak", message="Anda bukan wali kelas dari kelas ini")
+        elif not siswa or siswa.kelas_id != op["kelas_id"]:
+            status.update(status="ditolak", message="Siswa tidak ditemukan di kelas ini")
+        else:
+            per_kelas_bulan.setdefault((op["kelas_id"], op["bulan"]), []).append(op)
+
+    # Catat op_id lebih dulu: replay paralel dengan op_id sama akan bentrok di kunci unik
+    now = datetime.utcnow()
+    if baru:
+        db.session.execute(OperasiKlien.__table__.insert(), [
+            {
+                "user_id": user_id, "op_id": op["op_id"], "status": status["status"],
+                "keterangan": status["message"], "created_at": now
+            }
+            for op, status in baru
+        ])
+
+    for (kelas_id, bulan), ops in per_kelas_bulan.items():
+        lama_map = baca_kebiasaan_lama(kelas_id, bulan, {op["siswa_id"] for op in ops})
+        # lipat operasi per siswa sesuai urutan antrean
+        isian = {}
+        for op in ops:
+            nilai = isian.get(op["siswa_id"]) or data_kebiasaan(lama_map.get(op["siswa_id"]))
+            if op["jenis"] == "simpan":
+                isian[op["siswa_id"]] = terapkan_sel(nilai, op["data"])
+            else:
+                isian[op["siswa_id"]] = {kolom: None for kolom in KOLOM_ISIAN}
+        # jangan membuat baris kosong untuk siswa yang memang belum punya nilai
+        isian = {
+            siswa_id: nilai for siswa_id, nilai in isian.items()
+            if siswa_id in lama_map or any(v is not None for v in nilai.values())
+        }
+        simpan_kebiasaan_kelas(
+            kelas_id, bulan, isian, siswa_map, user_id, lama_map=lama_map, ketat=True
+        )
+
+    return hasil
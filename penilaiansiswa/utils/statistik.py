@@ -0,0 +1,337 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, func
+from penilaiansiswa import db
+from penilaiansiswa.models import (
+    User, Pegawai, Provinsi, Kabupaten, Kecamatan, Sekolah, Kelas, Kebiasaan, TahunAjaran,
+    StatistikWilayahBulan
+)
+from penilaiansiswa.utils.cache import CacheSederhana
+from penilaiansiswa.utils.rekap import KEBIASAAN_FIELDS, bulan_semester, semester_dari_bulan
+
+KEBIASAAN_LABELS = ['Bangun Pagi', 'Beribadah', 'Berolahraga', 'Sehat & Bergizi', 'Belajar', 'Bermasyarakat', 'Tidur Cepat']
+TREND_COLORS = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#2E8B57']
+
+# Level drill-down kubus statistik: (model, kolom nama, kolom induk)
+LEVEL_WILAYAH = {
+    "provinsi": (Provinsi, Provinsi.nama, None),
+    "kabupaten": (Kabupaten, Kabupaten.nama, Kabupaten.provinsi_id),
+    "kecamatan": (Kecamatan, Kecamatan.nama, Kecamatan.kabupaten_id),
+    "sekolah": (Sekolah, Sekolah.nama_sekolah, Sekolah.kecamatan_id),
+}
+
+# Snapshot respons /superadmin/api/statistik
+_statistik_cache = CacheSederhana()
+
+
+# =========================
+# RATA-RATA PER SEKOLAH
+# =========================
+def _jumlah_per_sekolah():
+    """SUM & COUNT ketujuh kebiasaan per sekolah dalam SATU query GROUP BY.
+
+    Return list (sekolah_id, nama_sekolah, {field: (jumlah, banyak)}) urut sekolah_id.
+    Baris kebiasaan yang kelasnya tanpa sekolah dikumpulkan dengan sekolah_id None
+    (hanya dipakai untuk rata-rata keseluruhan).
+    """
+    rows = db.session.query(
+        Kelas.sekolah_id,
+        Sekolah.nama_sekolah,
+        *[func.sum(getattr(Kebiasaan, field)) for field in KEBIASAAN_FIELDS],
+        *[func.count(getattr(Kebiasaan, field)) for field in KEBIASAAN_FIELDS]
+    ).select_from(Kebiasaan
+    ).outerjoin(Kelas, Kelas.id == Kebiasaan.kelas_id
+    ).outerjoin(Sekolah, Sekolah.id == Kelas.sekolah_id
+    ).group_by(Kelas.sekolah_id, Sekolah.nama_sekolah
+    ).order_by(Kelas.sekolah_id).all()
+
+    n = len(KEBIASAAN_FIELDS)
+    hasil = []
+    for row in rows:
+        jumlah = row[2:2 + n]
+        banyak = row[2 + n:2 + 2 * n]
+        hasil.append((
+            row[0] if row[1] is not None else None,
+            row[1],
+            {field: (float(jumlah[i] or 0), banyak[i]) for i, field in enumerate(KEBIASAAN_FIELDS)}
+        ))
+    return hasil
+
+
+def _rata(jumlah, banyak):
+    return jumlah / banyak if banyak else 0.0
+
+
+# =========================
+# TREND BULANAN
+# =========================
+NAMA_BULAN_SINGKAT = ['Jan', 'Feb', 'Mar', 'Apr', 'Mei', 'Jun', 'Jul', 'Agust', 'Sept', 'Okt', 'Nop', 'Des']
+
+# Jumlah & banyak nilai nasional per bulan: bulan -> {'baris': n, field: (jumlah, banyak)}
+_trend_cache = CacheSederhana()
+
+
+def label_bulan(bulan):
+    """'2025-08' -> 'Agust 2025'."""
+    tahun, bulan_num = bulan.split("-")
+    return f"{NAMA_BULAN_SINGKAT[int(bulan_num) - 1]} {tahun}"
+
+
+def daftar_bulan(bulan_dari, bulan_sampai):
+    """Semua bulan 'YYYY-MM' dari bulan_dari sampai bulan_sampai (inklusif)."""
+    tahun, bulan_num = (int(x) for x in bulan_dari.split("-"))
+    hasil = []
+    while f"{tahun}-{bulan_num:02d}" <= bulan_sampai:
+        hasil.append(f"{tahun}-{bulan_num:02d}")
+        tahun, bulan_num = (tahun + 1, 1) if bulan_num == 12 else (tahun, bulan_num + 1)
+    return hasil
+
+
+def bulan_tahun_ajaran(tahun_ajaran):
+    """12 bulan satu tahun ajaran ('2025/2026' -> 2025-07 .. 2026-06)."""
+    return bulan_semester(tahun_ajaran, "ganjil") + bulan_semester(tahun_ajaran, "genap")
+
+
+def tahun_ajaran_berjalan():
+    """Tahun ajaran yang mencakup bulan ini, mis. '2025/2026'."""
+    return semester_dari_bulan(datetime.now().strftime("%Y-%m"))[0]
+
+
+def _jumlah_per_bulan(bulan_dari, bulan_sampai):
+    """SUM & COUNT nasional per bulan dalam satu range scan index kebiasaan.bulan."""
+    rows = db.session.query(
+        Kebiasaan.bulan,
+        func.count(Kebiasaan.id),
+        *[func.sum(getattr(Kebiasaan, field)) for field in KEBIASAAN_FIELDS],
+        *[func.count(getattr(Kebiasaan, field)) for field in KEBIASAAN_FIELDS]
+    ).filter(
+        Kebiasaan.bulan >= bulan_dari,
+        Kebiasaan.bulan <= bulan_sampai
+    ).group_by(Kebiasaan.bulan).all()
+
+    n = len(KEBIASAAN_FIELDS)
+    hasil = {}
+    for row in rows:
+        per_bulan = {"baris": row[1]}
+        for i, field in enumerate(KEBIASAAN_FIELDS):
+            per_bulan[field] = (float(row[2 + i] or 0), row[2 + n + i])
+        hasil[row.bulan] = per_bulan
+    return hasil
+
+
+def trend_bulanan(bulan_list):
+    """Data line chart rata-rata tiap kebiasaan untuk daftar bulan (format Chart.js).
+
+    Bulan yang sudah lewat disimpan di cache selama TREND_BULAN_LALU_TTL detik dan dikosongkan
+    lebih awal bila nilai bulan itu diubah di proses ini (worker lain menunggu TTL); bulan
+    berjalan selalu dihitung ulang. Bulan tanpa data bernilai None (garis disambung dengan spanGaps).
+    """
+    bulan_ini = datetime.now().strftime("%Y-%m")
+    ttl = current_app.config.get("TREND_BULAN_LALU_TTL", 600) or None
+
+    data_bulan = {}
+    kurang = []
+    for bulan in bulan_list:
+        tersimpan = _trend_cache.get(bulan)
+        if tersimpan is None:
+            kurang.append(bulan)
+        else:
+            data_bulan[bulan] = tersimpan
+
+    if kurang:
+        baru = _jumlah_per_bulan(min(kurang), max(kurang))
+        for bulan in kurang:
+            data_bulan[bulan] = baru.get(bulan, {})
+            if bulan < bulan_ini:
+                _trend_cache.set(bulan, data_bulan[bulan], ttl)
+
+    trend_datasets = []
+    for i, field in enumerate(KEBIASAAN_FIELDS):
+        data_per_bulan = []
+        for bulan in bulan_list:
+            per_bulan = data_bulan[bulan]
+            data_per_bulan.append(_rata(*per_bulan[field]) if per_bulan else None)
+
+        trend_datasets.append({
+            'label': KEBIASAAN_LABELS[i],
+            'data': data_per_bulan,
+            'borderColor': TREND_COLORS[i],
+            'tension': 0.3,
+            'spanGaps': True
+        })
+
+    return {
+        'labels': [label_bulan(bulan) for bulan in bulan_list],
+        'datasets': trend_datasets
+    }
+
+
+def invalidate_trend(bulan_list):
+    """Buang cache trend untuk bulan-bulan yang nilainya berubah."""
+    for bulan in bulan_list:
+        _trend_cache.hapus(bulan)
+
+
+# =========================
+# SNAPSHOT STATISTIK
+# =========================
+def _trend_data(tahun_ajaran):
+    """Line chart 12 bulan tahun ajaran (tahun ajaran berjalan bila formatnya tidak dikenali)."""
+    try:
+        bulan_list = bulan_tahun_ajaran(tahun_ajaran)
+    except ValueError:
+        bulan_list = bulan_tahun_ajaran(tahun_ajaran_berjalan())
+    return trend_bulanan(bulan_list)
+
+
+def hitung_statistik():
+    """Susun data dashboard superadmin (tanpa cache).
+
+    Hanya sekolah yang sudah punya data kebiasaan yang masuk grafik & tabel,
+    sehingga daftar sekolah nasional tidak perlu dimuat.
+    """
+    tahun_ajaran_terakhir = db.session.query(TahunAjaran.tahun_ajaran).order_by(TahunAjaran.id.desc()).first()
+    tahun_ajaran_text = tahun_ajaran_terakhir.tahun_ajaran if tahun_ajaran_terakhir else tahun_ajaran_berjalan()
+
+    per_sekolah = _jumlah_per_sekolah()
+
+    # Rata-rata per sekolah per kebiasaan
+    sekolah_stats = []
+    total = {field: [0.0, 0] for field in KEBIASAAN_FIELDS}
+    for sekolah_id, nama_sekolah, per_field in per_sekolah:
+        for field, (jumlah, banyak) in per_field.items():
+            total[field][0] += jumlah
+            total[field][1] += banyak
+        if sekolah_id is None:
+            continue
+
+        baris = {'sekolah': nama_sekolah}
+        for field, (jumlah, banyak) in per_field.items():
+            baris[field] = _rata(jumlah, banyak)
+        nilai_valid = [baris[field] for field in KEBIASAAN_FIELDS if baris[field] > 0]
+        baris['rata_rata'] = sum(nilai_valid) / len(nilai_valid) if nilai_valid else 0
+        sekolah_stats.append(baris)
+
+    # Data untuk 7 grafik kebiasaan (maksimal 10 sekolah teratas)
+    habits_data = {}
+    for field, field_label in zip(KEBIASAAN_FIELDS, KEBIASAAN_LABELS):
+        sekolah_dengan_data = [(s['sekolah'], s[field]) for s in sekolah_stats if s[field] > 0]
+        if not sekolah_dengan_data:
+            sekolah_dengan_data = [(s['sekolah'], s[field]) for s in sekolah_stats]
+        sekolah_dengan_data.sort(key=lambda x: x[1], reverse=True)
+        sekolah_dengan_data = sekolah_dengan_data[:10]
+        habits_data[field_label] = {
+            'labels': [item[0] for item in sekolah_dengan_data],
+            'data': [item[1] for item in sekolah_dengan_data]
+        }
+
+    # Overall performance = rata-rata dari rata-rata tiap kebiasaan
+    overall_avg = sum(_rata(jumlah, banyak) for jumlah, banyak in total.values()) / len(KEBIASAAN_FIELDS)
+
+    return {
+        'tahun_ajaran': tahun_ajaran_text,
+        'total_users': User.query.count(),
+        'total_pegawai': Pegawai.query.count(),
+        'total_sekolah': Sekolah.query.count(),
+        'overall_performance': round(overall_avg, 1),
+        'habits_data': habits_data,
+        'trend_data': _trend_data(tahun_ajaran_text),
+        'sekolah_stats': sorted(sekolah_stats, key=lambda x: x['rata_rata'], reverse=True)
+    }
+
+
+def get_statistik():
+    """Snapshot statistik superadmin dari cache, dihitung ulang bila kedaluwarsa/dikosongkan."""
+    ttl = current_app.config.get("STATISTIK_CACHE_TTL", 600)
+    return _statistik_cache.get_or_set("statistik", hitung_statistik, ttl=ttl)
+
+
+def invalidate_statistik(*args):
+    """Kosongkan snapshot statistik (dipanggil saat data kebiasaan/sekolah/user berubah)."""
+    _statistik_cache.clear()
+
+
+# =========================
+# DRILL-DOWN WILAYAH (KUBUS STATISTIK)
+# =========================
+def _filter_bulan(query, bulan_dari=None, bulan_sampai=None):
+    if bulan_dari:
+        query = query.filter(StatistikWilayahBulan.bulan >= bulan_dari)
+    if bulan_sampai:
+        query = query.filter(StatistikWilayahBulan.bulan <= bulan_sampai)
+    return query
+
+
+def _rata_per_field(per_field):
+    """{field: (jumlah, banyak)} -> rata-rata tiap kebiasaan + rata-rata keseluruhan."""
+    rata_rata = {field: _rata(*per_field.get(field, (0, 0))) for field in KEBIASAAN_FIELDS}
+    nilai_valid = [nilai for nilai in rata_rata.values() if nilai > 0]
+    return rata_rata, (sum(nilai_valid) / len(nilai_valid) if nilai_valid else 0)
+
+
+def statistik_wilayah(level, induk_id=None, bulan_dari=None, bulan_sampai=None):
+    """Rata-rata 7 kebiasaan untuk setiap wilayah pada satu level, dari kubus statistik.
+
+    induk_id membatasi ke anak dari satu wilayah induk (mis. kabupaten milik
+    provinsi tertentu). Satu query GROUP BY wilayah & kebiasaan.
+    """
+    model, kolom_nama, kolom_induk = LEVEL_WILAYAH[level]
+    query = db.session.query(
+        model.id, kolom_nama,
+        StatistikWilayahBulan.field,
+        func.sum(StatistikWilayahBulan.jumlah),
+        func.sum(StatistikWilayahBulan.banyak)
+    ).join(StatistikWilayahBulan, db.and_(
+        StatistikWilayahBulan.level == level,
+        StatistikWilayahBulan.wilayah_id == model.id
+    ))
+    if kolom_induk is not None and induk_id is not None:
+        query = query.filter(kolom_induk == induk_id)
+    query = _filter_bulan(query, bulan_dari, bulan_sampai)
+    rows = query.group_by(model.id, kolom_nama, StatistikWilayahBulan.field).all()
+
+    per_wilayah = {}
+    for wilayah_id, nama, field, jumlah, banyak in rows:
+        item = per_wilayah.setdefault(wilayah_id, {"nama": nama, "field": {}})
+        item["field"][field] = (float(jumlah or 0), int(banyak or 0))
+
+    hasil = []
+    for wilayah_id, item in per_wilayah.items():
+        rata_rata, keseluruhan = _rata_per_field(item["field"])
+        hasil.append({
+            "id": wilayah_id,
+            "nama": item["nama"],
+            "rata_rata": rata_rata,
+            "rata_keseluruhan": keseluruhan,
+            "jumlah_nilai": sum(banyak for _, banyak in item["field"].values())
+        })
+    return sorted(hasil, key=lambda x: x["nama"] or "")
+
+
+def statistik_wilayah_bulanan(level, wilayah_id, bulan_dari=None, bulan_sampai=None):
+    """Rata-rata 7 kebiasaan per bulan untuk satu wilayah, dari kubus statistik."""
+    query = db.session.query(
+        StatistikWilayahBulan.bulan,
+        StatistikWilayahBulan.field,
+        StatistikWilayahBulan.jumlah,
+        StatistikWilayahBulan.banyak
+    ).filter(
+        StatistikWilayahBulan.level == level,
+        StatistikWilayahBulan.wilayah_id == wilayah_id
+    )
+    rows = _filter_bulan(query, bulan_dari, bulan_sampai).order_by(StatistikWilayahBulan.bulan).all()
+
+    per_bulan = {}
+    for bulan, field, jumlah, banyak in rows:
+        per_bulan.setdefault(bulan, {})[field] = (float(jumlah or 0), int(banyak or 0))
+
+    hasil = []
+    for bulan, per_field in per_bulan.items():
+        rata_rata, keseluruhan = _rata_per_field(per_field)
+        hasil.append({"bulan": bulan, "rata_rata": rata_rata, "rata_keseluruhan": keseluruhan})
+    return hasil
+
+
+for _model in (User, Pegawai, Sekolah, TahunAjaran):
+    for _evt in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _evt, invalidate_statistik)
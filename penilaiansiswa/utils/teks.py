@@ -0,0 +1,22 @@
+import re
+import unicodedata
+
+_BUKAN_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Panjang maksimal satu token (kolom siswa_token.token)
+MAKS_TOKEN = 50
+
+
+def normalisasi_nama(teks):
+    """'  Muh. Ḥasan  al-Farīd ' -> 'muh hasan al farid' (huruf kecil, tanpa aksen & tanda baca)."""
+    if not teks:
+        return ""
+    if not teks.isascii():
+        teks = unicodedata.normalize("NFKD", teks)
+        teks = "".join(c for c in teks if not unicodedata.combining(c))
+    return _BUKAN_ALNUM.sub(" ", teks.lower()).strip()
+
+
+def token_nama(teks):
+    """Kata unik dari nama yang sudah dinormalisasi, sesuai urutan kemunculan."""
+    return list(dict.fromkeys(kata[:MAKS_TOKEN] for kata in normalisasi_nama(teks).split()))
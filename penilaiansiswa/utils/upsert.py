@@ -0,0 +1,41 @@
+from penilaiansiswa import db
+
+
+def upsert(table, rows, kunci, tambah=(), ganti=(), conn=None):
+    """Multi-row INSERT yang menimpa/menambah baris lama bila kunci unik bentrok.
+
+    - table : objek Table (mis. Model.__table__)
+    - rows  : list of dict nilai yang akan di-insert
+    - kunci : kolom unique key (dipakai ON CONFLICT di SQLite/PostgreSQL)
+    - tambah: kolom yang dijumlahkan, kolom = kolom + nilai_baru
+    - ganti : kolom yang ditimpa dengan nilai baru
+    - conn  : Connection untuk dipakai di dalam event flush (default db.session)
+
+    MySQL memakai INSERT ... ON DUPLICATE KEY UPDATE dalam satu statement.
+    """
+    if not rows:
+        return None
+
+    executor = conn if conn is not None else db.session
+    dialect = (conn.dialect if conn is not None else db.session.get_bind().dialect).name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(rows)
+        baru = stmt.inserted
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(rows)
+        baru = stmt.excluded
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        baru = stmt.excluded
+
+    set_ = {col: table.c[col] + baru[col] for col in tambah}
+    set_.update({col: baru[col] for col in ganti})
+
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update(**set_)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=list(kunci), set_=set_)
+    return executor.execute(stmt)
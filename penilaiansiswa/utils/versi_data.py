@@ -0,0 +1,84 @@
+from datetime import datetime
+from flask import request, make_response
+from sqlalchemy import event, inspect
+from penilaiansiswa import db
+from penilaiansiswa.models import Siswa, VersiDataKelas
+from penilaiansiswa.utils.upsert import upsert
+
+# bulan untuk versi daftar siswa satu kelas
+DAFTAR_SISWA = ""
+
+
+# =========================
+# PENGHITUNG VERSI
+# =========================
+def naikkan_versi(kunci, conn=None):
+    """Naikkan versi untuk himpunan (kelas_id, bulan) dalam transaksi yang sedang berjalan."""
+    now = datetime.utcnow()
+    rows = [
+        {"kelas_id": kelas_id, "bulan": bulan, "versi": 1, "updated_at": now}
+        for kelas_id, bulan in sorted(k for k in kunci if k[0])
+    ]
+    upsert(VersiDataKelas.__table__, rows, kunci=["kelas_id", "bulan"],
+           tambah=["versi"], ganti=["updated_at"], conn=conn)
+
+
+def versi_kelas(kelas_id, bulan=None):
+    """ETag dan Last-Modified data satu kelas dalam SATU query ke versi_data_kelas.
+
+    bulan=None untuk daftar siswa saja; dengan bulan, versi daftar siswa ikut
+    dihitung karena grid nilai memuat seluruh siswa kelas.
+    """
+    daftar_bulan = [DAFTAR_SISWA] if bulan is None else [DAFTAR_SISWA, bulan]
+    rows = {
+        row.bulan: row
+        for row in db.session.query(
+            VersiDataKelas.bulan, VersiDataKelas.versi, VersiDataKelas.updated_at
+        ).filter(
+            VersiDataKelas.kelas_id == kelas_id,
+            VersiDataKelas.bulan.in_(daftar_bulan)
+        )
+    }
+    bagian = [str(kelas_id)] + [
+        f"{b or 'siswa'}.{rows[b].versi if b in rows else 0}" for b in daftar_bulan
+    ]
+    waktu = [row.updated_at for row in rows.values() if row.updated_at]
+    return "-".join(bagian), max(waktu) if waktu else None
+
+
+def respon_bersyarat(etag, last_modified, buat_respon):
+    """Balas 304 bila klien sudah memegang versi terbaru, tanpa memanggil buat_respon().
+
+    buat_respon: fungsi tanpa argumen yang menghasilkan respon lengkap.
+    """
+    if request.if_none_match:
+        tidak_berubah = request.if_none_match.contains(etag)
+    else:
+        tidak_berubah = bool(
+            last_modified and request.if_modified_since
+            and last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+        )
+    if tidak_berubah:
+        response = make_response("", 304)
+    else:
+        response = make_response(buat_respon())
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # data milik wali kelas: boleh disimpan browser, tetapi selalu divalidasi ulang
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# =========================
+# EVENT DAFTAR SISWA
+# =========================
+def _siswa_berubah(mapper, connection, target):
+    kelas_ids = {target.kelas_id}
+    # siswa pindah kelas: daftar kelas lama juga berubah
+    kelas_ids.update(inspect(target).attrs.kelas_id.history.deleted or ())
+    naikkan_versi({(kelas_id, DAFTAR_SISWA) for kelas_id in kelas_ids}, conn=connection)
+
+
+for _evt in ("after_insert", "after_update", "after_delete"):
+    event.listen(Siswa, _evt, _siswa_berubah)
@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from flask import current_app, url_for
+from penilaiansiswa import db
+from penilaiansiswa.models import Provinsi, Kabupaten, Kecamatan, Sekolah
+
+# index.<hash>.json / kab-<id>.<hash>.json, disimpan sebagai <nama>.gz
+POLA_SHARD = re.compile(r"^(index|kab-\d+)\.[0-9a-f]{12}\.json$")
+MANIFEST = "manifest.json"
+
+# manifest yang sedang dipakai proses ini: (mtime, isi)
+_manifest = (None, None)
+
+
+def _folder():
+    return current_app.config["WILAYAH_JSON_DIR"]
+
+
+def _tulis_shard(folder, awalan, data):
+    """Tulis JSON terkompresi dengan hash isi di nama file; file yang sudah ada tidak ditulis ulang."""
+    isi = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    nama = f"{awalan}.{hashlib.sha1(isi).hexdigest()[:12]}.json"
+    path = os.path.join(folder, nama + ".gz")
+    if not os.path.exists(path):
+        with open(path + ".tmp", "wb") as f:
+            # mtime=0 agar isi file sama persis untuk data yang sama
+            with gzip.GzipFile(fileobj=f, mode="wb", mtime=0) as gz:
+                gz.write(isi)
+        os.replace(path + ".tmp", path)
+    return nama
+
+
+def bangun_shard_wilayah():
+    """Tulis ulang pohon wilayah sebagai shard JSON statis (satu query per level).
+
+    - index.<hash>.json       : provinsi -> kabupaten, beserta nama shard tiap kabupaten
+    - kab-<id>.<hash>.json    : kecamatan -> sekolah satu kabupaten; sekolah yang sudah
+                                ditutup diberi "aktif": false agar form profil pegawai
+                                tetap bisa menampilkan sekolah yang sedang dipilih
+    Hash isi ada di nama file sehingga bisa di-cache browser selamanya; shard yang
+    isinya tidak berubah tetap memakai nama lama. Shard yang tidak dipakai lagi dihapus satu generasi kemudian.
+    Return isi manifest.
+    """
+    folder = _folder()
+    os.makedirs(folder, exist_ok=True)
+
+    sekolah = {}
+    for row in db.session.query(
+        Sekolah.id, Sekolah.nama_sekolah, Sekolah.npsn, Sekolah.kecamatan_id, Sekolah.aktif
+    ).order_by(Sekolah.nama_sekolah):
+        item = {"id": row.id, "nama_sekolah": row.nama_sekolah, "npsn": row.npsn}
+        if not row.aktif:
+            item["aktif"] = False
+        sekolah.setdefault(row.kecamatan_id, []).append(item)
+    kecamatan = {}
+    for row in db.session.query(Kecamatan.id, Kecamatan.nama, Kecamatan.kabupaten_id).order_by(Kecamatan.nama):
+        kecamatan.setdefault(row.kabupaten_id, []).append(
+            {"id": row.id, "nama": row.nama, "sekolah": sekolah.get(row.id, [])}
+        )
+    kabupaten = {}
+    for row in db.session.query(Kabupaten.id, Kabupaten.nama, Kabupaten.provinsi_id).order_by(Kabupaten.nama):
+        shard = _tulis_shard(folder, f"kab-{row.id}", {"kabupaten_id": row.id, "kecamatan": kecamatan.get(row.id, [])})
+        kabupaten.setdefault(row.provinsi_id, []).append({"id": row.id, "nama": row.nama, "shard": shard})
+    index = _tulis_shard(folder, "index", {
+        "provinsi": [
+            {"id": row.id, "nama": row.nama, "kabupaten": kabupaten.get(row.id, [])}
+            for row in db.session.query(Provinsi.id, Provinsi.nama).order_by(Provinsi.nama)
+        ]
+    })
+
+    dipakai = sorted([index] + [k["shard"] for daftar in kabupaten.values() for k in daftar])
+    path_manifest = os.path.join(folder, MANIFEST)
+    try:
+        with open(path_manifest) as f:
+            lama = json.load(f)
+    except (FileNotFoundError, ValueError):
+        lama = {}
+    if lama.get("shard") == dipakai:
+        # data wilayah tidak berubah: URL tetap sama
+        return lama
+    sebelumnya = lama.get("shard", [])
+    manifest = {"index": index, "shard": dipakai, "dibuat": datetime.utcnow().isoformat()}
+    with open(path_manifest + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path_manifest + ".tmp", path_manifest)
+
+    # shard generasi sebelumnya disimpan: halaman yang sudah memuat index lama masih memintanya
+    simpan = {nama + ".gz" for nama in dipakai + sebelumnya}
+    for nama in os.listdir(folder):
+        if nama.endswith(".json.gz") and nama not in simpan:
+            os.remove(os.path.join(folder, nama))
+    return manifest
+
+
+def manifest_wilayah():
+    """Manifest shard terbaru; dibangun dulu bila belum ada. Dibaca ulang bila file berubah."""
+    global _manifest
+    path = os.path.join(_folder(), MANIFEST)
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        bangun_shard_wilayah()
+        mtime = os.path.getmtime(path)
+    if _manifest[0] != mtime:
+        with open(path) as f:
+            _manifest = (mtime, json.load(f))
+    return _manifest[1]
+
+
+def path_shard(nama):
+    """Path file .gz untuk nama shard dari URL, atau None bila nama tidak valid / tidak ada."""
+    if not POLA_SHARD.match(nama):
+        return None
+    path = os.path.join(_folder(), nama + ".gz")
+    return path if os.path.exists(path) else None
+
+
+def url_index_wilayah():
+    """URL index shard terbaru untuk template form profil (home.html)."""
+    return url_for("pegawai_bp.wilayah_json", nama=manifest_wilayah()["index"])
@@ -0,0 +1,134 @@
+# test_agregat.py - tabel agregat yang diperbarui secara delta harus sama dengan hitung ulang penuh
+from datetime import datetime
+
+from penilaiansiswa import db
+from penilaiansiswa.models import RekapKelasBulan, RekapSiswaSemester, Siswa, StatistikWilayahBulan
+from penilaiansiswa.utils.agregat import (
+    rebuild_rekap_kelas_bulan, rebuild_rekap_siswa_semester, rebuild_statistik_wilayah
+)
+from penilaiansiswa.utils.rekap import KEBIASAAN_FIELDS, rekap_bulan_tersimpan
+from penilaiansiswa.utils.upsert import upsert
+
+# Tabel agregat -> kolom kunci unik
+TABEL_AGREGAT = {
+    RekapKelasBulan: ("kelas_id", "bulan", "jenis_kelamin"),
+    RekapSiswaSemester: ("siswa_id", "kelas_id", "tahun_ajaran", "semester"),
+    StatistikWilayahBulan: ("level", "wilayah_id", "bulan", "field"),
+}
+
+
+def _isi(siswa_id, **nilai):
+    return {"siswa_id": siswa_id, **{field: nilai.get(field) for field in KEBIASAAN_FIELDS}, "catatan": None}
+
+
+def _snapshot():
+    """Isi tabel agregat tanpa id/updated_at. Baris yang seluruh hitungannya nol sama dengan tidak ada."""
+    hasil = {}
+    for model, kunci in TABEL_AGREGAT.items():
+        kolom = [c.name for c in model.__table__.columns if c.name not in ("id", "updated_at")]
+        baris = {}
+        for row in db.session.query(*[model.__table__.c[k] for k in kolom]):
+            nilai = dict(zip(kolom, row))
+            if not any(v for k, v in nilai.items() if k not in kunci):
+                continue
+            baris[tuple(nilai[k] for k in kunci)] = {
+                k: round(v, 6) if isinstance(v, float) else v for k, v in nilai.items()
+            }
+        hasil[model.__tablename__] = baris
+    return hasil
+
+
+def _rebuild_semua():
+    rebuild_rekap_kelas_bulan()
+    rebuild_rekap_siswa_semester()
+    rebuild_statistik_wilayah()
+    db.session.commit()
+
+
+def test_delta_sama_dengan_rebuild(client, data):
+    kelas_id, siswa = data["kelas"], data["siswa"]
+
+    def bulk(bulan, rows):
+        r = client.post("/penilaian/kebiasaan/save_bulk", json={"kelas_id": kelas_id, "bulan": bulan, "rows": rows})
+        assert r.status_code == 200, r.json
+
+    bulk("2025-08", [
+        _isi(s, bangun_pagi=20 + i, beribadah=25, belajar=10 * i, tidur_cepat=18)
+        for i, s in enumerate(siswa)
+    ])
+    bulk("2025-09", [_isi(s, bangun_pagi=21, berolahraga=15, belajar=22) for s in siswa[:3]])
+    # bulan semester genap
+    bulk("2026-01", [_isi(siswa[0], sehat_dan_lemar=30, bermasyarakat=5)])
+
+    # ubah satu baris, kosongkan satu sel, hapus isi satu baris
+    r = client.post("/penilaian/kebiasaan/save_row", data={
+        "siswa_id": siswa[0], "kelas_id": kelas_id, "bulan": "2025-08", "bangun_pagi": "5", "belajar": "28"
+    })
+    assert r.json["success"]
+    r = client.post("/penilaian/kebiasaan/sync", json={"kelas_id": kelas_id, "bulan": "2025-08", "perubahan": [
+        {"siswa_id": siswa[1], "versi": 1, "sel": {"belajar": None, "beribadah": 12}},
+    ]})
+    assert r.json["diterapkan"] and not r.json["konflik"]
+    client.post(f"/penilaian/kebiasaan/delete_row/{siswa[3]}/2025-08")
+    r = client.post("/penilaian/kebiasaan/replay", json={"operasi": [
+        {"op_id": "op-1", "jenis": "hapus", "kelas_id": kelas_id, "siswa_id": siswa[2], "bulan": "2025-09"},
+        {"op_id": "op-2", "jenis": "simpan", "kelas_id": kelas_id, "siswa_id": siswa[5], "bulan": "2025-10",
+         "data": {"tidur_cepat": 26}},
+    ]})
+    assert r.json["diterapkan"] == 2
+
+    delta = _snapshot()
+    assert all(delta.values())
+    _rebuild_semua()
+    assert _snapshot() == delta
+
+
+def test_hapus_baris_siswa_terhapus(client, data):
+    kelas_id, siswa = data["kelas"], data["siswa"]
+    client.post("/penilaian/kebiasaan/save_bulk", json={"kelas_id": kelas_id, "bulan": "2025-08", "rows": [
+        _isi(s, belajar=20, beribadah=22) for s in siswa[:2]
+    ]})
+    # siswa dihapus langsung dari tabel: baris kebiasaannya tertinggal tanpa siswa
+    db.session.execute(Siswa.__table__.delete().where(Siswa.id == siswa[0]))
+    db.session.commit()
+    _rebuild_semua()
+
+    r = client.post(f"/penilaian/kebiasaan/delete_row/{siswa[0]}/2025-08", data={"kelas_id": kelas_id})
+    assert r.json["success"]
+    delta = _snapshot()
+    _rebuild_semua()
+    assert _snapshot() == delta
+
+
+def test_rekap_bulan_tersimpan_cocok_dengan_nilai(client, data):
+    kelas_id, siswa = data["kelas"], data["siswa"]
+    client.post("/penilaian/kebiasaan/save_bulk", json={"kelas_id": kelas_id, "bulan": "2025-08", "rows": [
+        _isi(s, **{field: 20 for field in KEBIASAAN_FIELDS}) for s in siswa[:4]
+    ]})
+    rekap = rekap_bulan_tersimpan(kelas_id, "2025-08")
+    assert rekap is not None
+
+    # rekap tersimpan yang tidak cocok dengan tabel kebiasaan tidak dipakai
+    db.session.query(RekapKelasBulan).filter_by(kelas_id=kelas_id).update({"jumlah_terisi": 1})
+    db.session.commit()
+    assert rekap_bulan_tersimpan(kelas_id, "2025-08") is None
+
+
+def test_upsert_tambah_dan_ganti(app):
+    tabel = StatistikWilayahBulan.__table__
+    kunci = ["level", "wilayah_id", "bulan", "field"]
+
+    def baris(jumlah, banyak):
+        return {"level": "sekolah", "wilayah_id": 1, "bulan": "2025-08", "field": "belajar",
+                "jumlah": jumlah, "banyak": banyak, "updated_at": datetime(2025, 8, banyak)}
+
+    upsert(tabel, [baris(20, 1)], kunci=kunci, tambah=["jumlah", "banyak"], ganti=["updated_at"])
+    upsert(tabel, [baris(15, 2)], kunci=kunci, tambah=["jumlah", "banyak"], ganti=["updated_at"])
+    row = db.session.query(StatistikWilayahBulan).one()
+    assert (row.jumlah, row.banyak, row.updated_at) == (35, 3, datetime(2025, 8, 2))
+
+    upsert(tabel, [baris(7, 1)], kunci=kunci, ganti=["jumlah", "banyak"])
+    db.session.expire_all()
+    row = db.session.query(StatistikWilayahBulan).one()
+    assert (row.jumlah, row.banyak) == (7, 1)
+    assert upsert(tabel, [], kunci=kunci) is None
@@ -0,0 +1,185 @@
+# test_impor.py - import data sekolah, import roster siswa dan kenaikan kelas
+import pytest
+
+from penilaiansiswa import db
+from penilaiansiswa.models import Sekolah, Kecamatan, Kelas, LogAktivitas, Siswa, TahunAjaran
+from penilaiansiswa.utils.impor_sekolah import impor_sekolah
+from penilaiansiswa.utils.impor_siswa import impor_siswa_kelas
+from penilaiansiswa.utils.kenaikan import siapkan_kelas_tujuan, naikkan_kelas, STATUS_NAIK
+
+
+def _sekolah(npsn, nama, kecamatan="Panggul", jenjang="SD"):
+    return {"provinsi": "Jawa Timur", "kabupaten": "Trenggalek", "kecamatan": kecamatan,
+            "nama_sekolah": nama, "npsn": npsn, "jenjang": jenjang}
+
+
+def _file_sekolah(jumlah):
+    return [_sekolah(f"2054{i:04d}", f"SD Negeri {i} Panggul") for i in range(jumlah)]
+
+
+# =========================
+# IMPORT SEKOLAH
+# =========================
+def test_impor_sekolah_aman_diulang(app):
+    ringkasan = impor_sekolah(_file_sekolah(30), batch=7)
+    assert ringkasan["baru"] == 30
+    assert Kecamatan.query.count() == 1
+
+    ringkasan = impor_sekolah(_file_sekolah(30), batch=7)
+    assert ringkasan["sama"] == 30
+    assert ringkasan["baru"] == ringkasan["diubah"] == 0
+    assert Sekolah.query.count() == 30
+
+
+def test_impor_sekolah_diff(app):
+    impor_sekolah(_file_sekolah(40))
+    baris = _file_sekolah(40)
+    baris[0]["nama_sekolah"] = "SD Negeri 0 Panggul Baru"
+    baris[1]["kecamatan"] = "Munjungan"
+    del baris[2]
+
+    ringkasan = impor_sekolah(baris, diff=True)
+    assert (ringkasan["ganti_nama"], ringkasan["pindah_kecamatan"], ringkasan["ditutup"]) == (1, 1, 1)
+    assert {(p["npsn"], p["jenis"]) for p in ringkasan["perubahan"]} == {
+        ("20540000", "ganti_nama"), ("20540001", "pindah_kecamatan"), ("20540002", "ditutup")
+    }
+    assert Sekolah.query.filter_by(npsn="20540002").one().aktif is False
+
+    # muncul lagi di file berikutnya: dibuka kembali
+    ringkasan = impor_sekolah(_file_sekolah(40), diff=True)
+    assert ringkasan["dibuka_lagi"] == 1
+    assert Sekolah.query.filter_by(aktif=False).count() == 0
+
+
+def test_impor_sekolah_diff_menahan_penutupan_massal(app):
+    impor_sekolah(_file_sekolah(40))
+    terpotong = _file_sekolah(10)
+    terpotong[0]["nama_sekolah"] = "SD Negeri 0 Panggul Baru"
+
+    ringkasan = impor_sekolah(terpotong, diff=True, maks_tutup_persen=5)
+    assert ringkasan["tutup_ditahan"] == 30
+    assert ringkasan["ditutup"] == 0
+    assert Sekolah.query.filter_by(aktif=False).count() == 0
+    # perubahan lain di file tetap disimpan
+    assert Sekolah.query.filter_by(npsn="20540000").one().nama_sekolah == "SD Negeri 0 Panggul Baru"
+
+    ringkasan = impor_sekolah(terpotong, diff=True, paksa=True, maks_tutup_persen=5)
+    assert ringkasan["ditutup"] == 30
+    assert Sekolah.query.filter_by(aktif=False).count() == 30
+
+
+# =========================
+# IMPORT ROSTER SISWA
+# =========================
+def test_impor_siswa_kelas(data):
+    kelas = db.session.get(Kelas, data["kelas"])
+    baris = [
+        (2, {"nama_siswa": "Ani", "nisn": "1001", "jenis_kelamin": "p"}),
+        (3, {"nama_siswa": "Budi", "nisn": 1002.0, "jenis_kelamin": "L"}),
+        (4, {"nama_siswa": "Budi Lagi", "nisn": "1002", "jenis_kelamin": "L"}),
+        (5, {"nama_siswa": "Citra", "nisn": "00001", "jenis_kelamin": "P"}),
+        (6, {"nama_siswa": "", "nisn": "1003", "jenis_kelamin": "L"}),
+        (7, {"nama_siswa": "Dedi", "nisn": "1004", "jenis_kelamin": "X"}),
+    ]
+    ditambah, ditolak = impor_siswa_kelas(kelas, iter(baris), batch=2)
+    db.session.commit()
+
+    assert ditambah == 2
+    assert [r["baris"] for r in ditolak] == [4, 5, 6, 7]
+    assert "sudah digunakan" in ditolak[1]["message"]
+    baru = Siswa.query.filter(Siswa.nisn.in_(["1001", "1002"])).order_by(Siswa.nisn).all()
+    assert [(s.nama_siswa, s.jenis_kelamin, s.kelas_id) for s in baru] == [
+        ("Ani", "P", kelas.id), ("Budi", "L", kelas.id)
+    ]
+
+    # file yang sama diimport ulang: tidak ada siswa ganda
+    ditambah, _ = impor_siswa_kelas(kelas, iter(baris))
+    assert ditambah == 0
+
+
+# =========================
+# KENAIKAN KELAS
+# =========================
+def _tahun_ajaran_baru(data):
+    tahun_ajaran = TahunAjaran(sekolah_id=data["sekolah"], tahun_ajaran="2026/2027", semester="ganjil")
+    db.session.add(tahun_ajaran)
+    db.session.flush()
+    return tahun_ajaran
+
+
+def test_naikkan_kelas_pindah(data):
+    kelas = db.session.get(Kelas, data["kelas"])
+    db.session.get(Siswa, data["siswa"][5]).status = "Lulus"
+    tahun_ajaran = _tahun_ajaran_baru(data)
+    tujuan = siapkan_kelas_tujuan([{"kelas": kelas, "nama_kelas": "2A"}], tahun_ajaran, data["pegawai"])
+    kelas_baru, dibuat = tujuan[kelas.id]
+    assert dibuat
+
+    disalin, dilewati = naikkan_kelas({kelas.id: kelas_baru.id}, tahun_ajaran, mode="pindah")
+    db.session.commit()
+
+    assert disalin == {kelas_baru.id: 5} and dilewati == 0
+    assert sorted(s.nisn for s in Siswa.query.filter_by(kelas_id=kelas_baru.id)) == [f"00{i:03d}" for i in range(5)]
+    # baris lama tetap di kelas lama agar laporan tahun lalu utuh
+    lama = Siswa.query.filter_by(kelas_id=kelas.id).all()
+    assert len(lama) == 6
+    assert {s.status for s in lama} == {STATUS_NAIK, "Lulus"}
+
+
+def test_naikkan_kelas_diulang_tidak_menggandakan(data):
+    kelas = db.session.get(Kelas, data["kelas"])
+    tahun_ajaran = _tahun_ajaran_baru(data)
+    pasangan = [{"kelas": kelas, "nama_kelas": "2A"}]
+    kelas_baru, _ = siapkan_kelas_tujuan(pasangan, tahun_ajaran, data["pegawai"])[kelas.id]
+    naikkan_kelas({kelas.id: kelas_baru.id}, tahun_ajaran)
+    db.session.commit()
+
+    # kelas tujuan dengan nama sama dipakai ulang, NISN yang sudah ada dilewati
+    kelas_ulang, dibuat = siapkan_kelas_tujuan(
+        [{"kelas": kelas, "nama_kelas": "2a"}], tahun_ajaran, data["pegawai"]
+    )[kelas.id]
+    assert kelas_ulang.id == kelas_baru.id and not dibuat
+    disalin, dilewati = naikkan_kelas({kelas.id: kelas_baru.id}, tahun_ajaran)
+    assert disalin == {} and dilewati == 6
+    assert Siswa.query.filter_by(kelas_id=kelas_baru.id).count() == 6
+
+
+def test_naikkan_kelas_nisn_ganda_ditolak(data):
+    kelas = db.session.get(Kelas, data["kelas"])
+    kelas_b = Kelas(tahun_ajaran_id=kelas.tahun_ajaran_id, nama_kelas="1B", wali_kelas_id=data["pegawai"],
+                    sekolah_id=data["sekolah"])
+    db.session.add(kelas_b)
+    db.session.flush()
+    db.session.add(Siswa(nama_siswa="Kembar NISN", nisn="00000", jenis_kelamin="L", kelas_id=kelas_b.id))
+    db.session.commit()
+
+    tahun_ajaran = _tahun_ajaran_baru(data)
+    tujuan = siapkan_kelas_tujuan(
+        [{"kelas": kelas, "nama_kelas": "2A"}, {"kelas": kelas_b, "nama_kelas": "2B"}], tahun_ajaran, data["pegawai"]
+    )
+    with pytest.raises(ValueError, match="00000"):
+        naikkan_kelas({k: baru.id for k, (baru, _) in tujuan.items()}, tahun_ajaran)
+    db.session.rollback()
+    assert Siswa.query.count() == 7
+
+
+def test_naikkan_kelas_audit_per_siswa(data, audit):
+    kelas = db.session.get(Kelas, data["kelas"])
+    tahun_ajaran = _tahun_ajaran_baru(data)
+    kelas_baru, _ = siapkan_kelas_tujuan([{"kelas": kelas, "nama_kelas": "2A"}], tahun_ajaran, data["pegawai"])[kelas.id]
+    db.session.commit()
+    # siswa yang sudah ada di kelas tujuan tidak dihitung sebagai hasil kenaikan
+    sudah = Siswa(nama_siswa="Pindahan", nisn="77777", jenis_kelamin="P", kelas_id=kelas_baru.id)
+    db.session.add(sudah)
+    db.session.commit()
+    LogAktivitas.query.delete()
+    db.session.commit()
+
+    disalin, _ = naikkan_kelas({kelas.id: kelas_baru.id}, tahun_ajaran)
+    db.session.commit()
+
+    baru = {s.id: s.nisn for s in Siswa.query.filter_by(kelas_id=kelas_baru.id) if s.id != sudah.id}
+    assert disalin == {kelas_baru.id: 6} and len(baru) == 6
+    log = LogAktivitas.query.filter_by(tabel="siswa", aksi="CREATE").all()
+    assert sorted(row.entri_id for row in log) == sorted(baru)
+    assert all(f"-> siswa_id={row.entri_id} kelas_id={kelas_baru.id}" in row.keterangan for row in log)
@@ -0,0 +1,105 @@
+# test_log.py - audit log per transaksi, API log dengan keyset cursor dan arsip ringkasan harian
+from datetime import datetime, timedelta
+
+import pytest
+
+from penilaiansiswa import db
+from penilaiansiswa.models import LogAktivitas, LogAktivitasHarian, Siswa
+from penilaiansiswa.models.users import User
+from penilaiansiswa.utils import log_aktivitas
+from penilaiansiswa.utils.log_aktivitas import arsipkan_log
+
+
+def _log(waktu, aksi="UPDATE", user_id=None):
+    return LogAktivitas(user_id=user_id, aksi=aksi, tabel="siswa", entri_id=1, keterangan=aksi, timestamp=waktu)
+
+
+# =========================
+# BUFFER AUDIT
+# =========================
+def test_audit_ditulis_saat_commit(data, audit):
+    siswa = Siswa(nama_siswa="Siswa Baru", nisn="00999", jenis_kelamin="L", kelas_id=data["kelas"])
+    db.session.add(siswa)
+    db.session.flush()
+    assert db.session.query(LogAktivitas).count() == 0
+    db.session.commit()
+    assert [(row.aksi, row.tabel, row.entri_id) for row in LogAktivitas.query] == [("CREATE", "siswa", siswa.id)]
+
+    # event dari transaksi yang di-rollback tidak ikut tertulis di commit berikutnya
+    db.session.add(Siswa(nama_siswa="Batal", nisn="00998", jenis_kelamin="P", kelas_id=data["kelas"]))
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert LogAktivitas.query.count() == 1
+
+
+# =========================
+# API LOG (KEYSET)
+# =========================
+@pytest.fixture
+def superadmin(app, data):
+    User.query.filter_by(username="kepsek").update({"role": "superadmin"})
+    db.session.commit()
+    client = app.test_client()
+    client.post("/login", data={"username": "kepsek", "password": "rahasia"})
+    return client
+
+
+def test_api_log_keyset(superadmin):
+    waktu = datetime(2026, 1, 5, 8)
+    # beberapa log dengan timestamp sama: urutan diputus oleh id
+    db.session.add_all([_log(waktu + timedelta(minutes=i // 3)) for i in range(8)])
+    db.session.commit()
+    urutan = [row.id for row in LogAktivitas.query.order_by(LogAktivitas.timestamp.desc(), LogAktivitas.id.desc())]
+
+    hasil, cursor, halaman = [], None, 0
+    while True:
+        r = superadmin.get("/superadmin/api/log-aktivitas", query_string={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        hasil += [row["id"] for row in r.json["data"]]
+        halaman += 1
+        cursor = r.json["next_cursor"]
+        if cursor is None:
+            break
+    assert hasil == urutan and halaman == 3
+
+    r = superadmin.get("/superadmin/api/log-aktivitas", query_string={"cursor": "bukan-cursor"})
+    assert r.status_code == 400
+
+
+def test_api_log_hanya_superadmin(client):
+    assert client.get("/superadmin/api/log-aktivitas").status_code == 403
+
+
+# =========================
+# ARSIP
+# =========================
+def test_arsip_aman_diulang(app, monkeypatch):
+    hari_1, hari_2 = datetime(2025, 1, 10, 9), datetime(2025, 1, 11, 9)
+    db.session.add_all(
+        [_log(hari_1, "CREATE", 1) for _ in range(3)]
+        + [_log(hari_2, "UPDATE") for _ in range(2)] + [_log(datetime(2025, 3, 1))]
+    )
+    db.session.commit()
+    batas = datetime(2025, 2, 1)
+
+    # job terhenti setelah chunk pertama: chunk itu sudah di-commit, sisanya di-rollback
+    upsert_asli = log_aktivitas.upsert
+    panggilan = {"n": 0}
+
+    def upsert_gagal(*args, **kwargs):
+        panggilan["n"] += 1
+        if panggilan["n"] == 2:
+            raise RuntimeError("koneksi putus")
+        return upsert_asli(*args, **kwargs)
+
+    monkeypatch.setattr(log_aktivitas, "upsert", upsert_gagal)
+    with pytest.raises(RuntimeError):
+        arsipkan_log(batas, chunk=2)
+    db.session.rollback()
+    monkeypatch.setattr(log_aktivitas, "upsert", upsert_asli)
+
+    assert arsipkan_log(batas, chunk=2) == 3
+    assert arsipkan_log(batas, chunk=2) == 0
+    ringkasan = {(row.tanggal.day, row.user_id, row.aksi): row.jumlah for row in LogAktivitasHarian.query}
+    assert ringkasan == {(10, 1, "CREATE"): 3, (11, 0, "UPDATE"): 2}
+    assert LogAktivitas.query.count() == 1
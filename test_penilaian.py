@@ -0,0 +1,154 @@
+# test_penilaian.py - sync per sel (cek versi), hapus isi baris, ETag/304, replay antrean offline
+# dan ulang transaksi saat deadlock
+from sqlalchemy.exc import OperationalError
+
+from penilaiansiswa import db
+from penilaiansiswa.models import Kebiasaan, OperasiKlien, RekapKelasBulan, Siswa
+from penilaiansiswa.routes import penilaian_routes
+
+
+def _sync(client, data, bulan, perubahan):
+    return client.post("/penilaian/kebiasaan/sync", json={
+        "kelas_id": data["kelas"], "bulan": bulan, "perubahan": perubahan
+    })
+
+
+def _kebiasaan(siswa_id, bulan):
+    db.session.expire_all()
+    return Kebiasaan.query.filter_by(siswa_id=siswa_id, bulan=bulan).one_or_none()
+
+
+def test_sync_konflik_versi(client, data):
+    siswa_id = data["siswa"][0]
+    r = _sync(client, data, "2025-08", [{"siswa_id": siswa_id, "versi": 0, "sel": {"belajar": 20}}])
+    assert r.json["diterapkan"] == [{"siswa_id": siswa_id, "versi": 1}]
+
+    r = _sync(client, data, "2025-08", [{"siswa_id": siswa_id, "versi": 1, "sel": {"beribadah": 25}}])
+    assert r.json["diterapkan"] == [{"siswa_id": siswa_id, "versi": 2}]
+
+    # perangkat lain masih memegang versi 1: tidak ditulis, nilai server dikembalikan
+    r = _sync(client, data, "2025-08", [{"siswa_id": siswa_id, "versi": 1, "sel": {"belajar": 5}}])
+    assert r.json["diterapkan"] == []
+    [konflik] = r.json["konflik"]
+    assert konflik["versi"] == 2
+    assert konflik["data"]["belajar"] == 20 and konflik["data"]["beribadah"] == 25
+
+    kebiasaan = _kebiasaan(siswa_id, "2025-08")
+    assert (kebiasaan.belajar, kebiasaan.beribadah, kebiasaan.versi) == (20, 25, 2)
+
+
+def test_sync_nilai_tidak_valid(client, data):
+    siswa_id = data["siswa"][0]
+    r = _sync(client, data, "2025-08", [{"siswa_id": siswa_id, "versi": 0, "sel": {"belajar": "abc"}}])
+    assert r.status_code == 400
+    assert _kebiasaan(siswa_id, "2025-08") is None
+
+
+def test_delete_row_lewat_jalur_kunci(client, data):
+    siswa_id = data["siswa"][0]
+    _sync(client, data, "2025-08", [{"siswa_id": siswa_id, "versi": 0, "sel": {"belajar": 20}}])
+
+    r = client.post(f"/penilaian/kebiasaan/delete_row/{siswa_id}/2025-08", data={"kelas_id": data["kelas"]})
+    assert r.json["success"] and r.json["versi"] == 2
+    kebiasaan = _kebiasaan(siswa_id, "2025-08")
+    assert (kebiasaan.belajar, kebiasaan.versi) == (None, 2)
+    assert RekapKelasBulan.query.filter_by(bulan="2025-08").one().jumlah_terisi == 0
+
+    # perangkat yang masih memegang versi 1 mendapat konflik, bukan menimpa penghapusan
+    r = _sync(client, data, "2025-08", [{"siswa_id": siswa_id, "versi": 1, "sel": {"belajar": 5}}])
+    assert r.json["konflik"][0]["versi"] == 2
+
+    r = client.post(f"/penilaian/kebiasaan/delete_row/{data['siswa'][1]}/2025-08", data={"kelas_id": data["kelas"]})
+    assert r.status_code == 404
+
+
+def test_get_kebiasaan_304(client, data):
+    url = f"/penilaian/kebiasaan/get/{data['kelas']}/2025-08"
+    r = client.get(url)
+    assert r.status_code == 200 and len(r.json) == 6
+    etag = r.headers["ETag"]
+
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304 and not r.data
+
+    # nilai bulan lain tidak mengubah versi grid bulan ini
+    _sync(client, data, "2025-09", [{"siswa_id": data["siswa"][0], "versi": 0, "sel": {"belajar": 20}}])
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    _sync(client, data, "2025-08", [{"siswa_id": data["siswa"][0], "versi": 0, "sel": {"belajar": 20}}])
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    assert r.json[0]["belajar"] == 20
+
+    # siswa baru di kelas: grid dan daftar siswa sama-sama berubah
+    etag = r.headers["ETag"]
+    etag_siswa = client.get(f"/penilaian/siswa/list/{data['kelas']}").headers["ETag"]
+    db.session.add(Siswa(nama_siswa="Siswa Baru", nisn="00999", jenis_kelamin="L", kelas_id=data["kelas"]))
+    db.session.commit()
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+    assert client.get(f"/penilaian/siswa/list/{data['kelas']}", headers={"If-None-Match": etag_siswa}).status_code == 200
+
+
+def test_replay_idempoten(client, data):
+    kelas_id, siswa = data["kelas"], data["siswa"]
+    operasi = [
+        {"op_id": "a-1", "jenis": "simpan", "kelas_id": kelas_id, "siswa_id": siswa[0], "bulan": "2025-08",
+         "data": {"belajar": 20}},
+        {"op_id": "a-2", "jenis": "simpan", "kelas_id": kelas_id, "siswa_id": siswa[0], "bulan": "2025-08",
+         "data": {"beribadah": 30}},
+        {"op_id": "a-3", "jenis": "simpan", "kelas_id": kelas_id + 99, "siswa_id": siswa[1], "bulan": "2025-08",
+         "data": {"belajar": 20}},
+    ]
+    r = client.post("/penilaian/kebiasaan/replay", json={"operasi": operasi})
+    assert [h["status"] for h in r.json["hasil"]] == ["diterapkan", "diterapkan", "ditolak"]
+
+    rekap = [(row.jenis_kelamin, row.jumlah_terisi) for row in RekapKelasBulan.query]
+    # dikirim ulang (respon pertama hilang): semuanya duplikat, data dan rekap tidak berubah
+    r = client.post("/penilaian/kebiasaan/replay", json={"operasi": operasi})
+    assert [h["status"] for h in r.json["hasil"]] == ["duplikat"] * 3
+
+    kebiasaan = _kebiasaan(siswa[0], "2025-08")
+    assert (kebiasaan.belajar, kebiasaan.beribadah, kebiasaan.versi) == (20, 30, 1)
+    assert [(row.jenis_kelamin, row.jumlah_terisi) for row in RekapKelasBulan.query] == rekap
+    assert OperasiKlien.query.count() == 3
+
+
+class _Deadlock(Exception):
+    pass
+
+
+def _simpan_deadlock(monkeypatch, kali):
+    """Buat simpan_kebiasaan_kelas di route gagal 1213 sebanyak `kali` kali setelah menulis."""
+    asli = penilaian_routes.simpan_kebiasaan_kelas
+    sisa = {"kali": kali}
+
+    def simpan(*args, **kwargs):
+        hasil = asli(*args, **kwargs)
+        if sisa["kali"]:
+            sisa["kali"] -= 1
+            raise OperationalError("INSERT ...", {}, _Deadlock(1213, "Deadlock found when trying to get lock"))
+        return hasil
+
+    monkeypatch.setattr(penilaian_routes, "simpan_kebiasaan_kelas", simpan)
+    monkeypatch.setattr("penilaiansiswa.utils.kebiasaan_simpan.time.sleep", lambda detik: None)
+
+
+def test_deadlock_diulang(client, data, monkeypatch):
+    _simpan_deadlock(monkeypatch, 1)
+    siswa_id = data["siswa"][0]
+    r = client.post("/penilaian/kebiasaan/save_row", data={
+        "siswa_id": siswa_id, "kelas_id": data["kelas"], "bulan": "2025-08", "belajar": "20"
+    })
+    assert r.json["success"]
+    # percobaan pertama di-rollback, jadi delta rekap hanya dihitung sekali
+    assert _kebiasaan(siswa_id, "2025-08").versi == 1
+    assert RekapKelasBulan.query.filter_by(bulan="2025-08").one().jumlah_terisi == 1
+
+
+def test_deadlock_terus_menerus_409(client, data, monkeypatch):
+    _simpan_deadlock(monkeypatch, 10)
+    r = client.post("/penilaian/kebiasaan/save_bulk", json={
+        "kelas_id": data["kelas"], "bulan": "2025-08", "rows": [{"siswa_id": data["siswa"][0], "belajar": 20}]
+    })
+    assert r.status_code == 409
+    assert _kebiasaan(data["siswa"][0], "2025-08") is None
@@ -0,0 +1,61 @@
+# test_siswa.py - pencarian siswa /siswa/search (prefix NISN & prefix kata nama)
+from penilaiansiswa import db
+from penilaiansiswa.models import Kelas, Siswa, TahunAjaran
+
+
+def _cari(client, q, **params):
+    r = client.get("/siswa/search", query_string={"q": q, **params})
+    assert r.json["success"]
+    return [s["nama_siswa"] for s in r.json["siswa"]]
+
+
+def _tambah_siswa(data, *nama_nisn):
+    for nama, nisn in nama_nisn:
+        db.session.add(Siswa(nama_siswa=nama, nisn=nisn, jenis_kelamin="L", kelas_id=data["kelas"]))
+    db.session.commit()
+
+
+def test_cari_awalan_kata_nama(client, data):
+    _tambah_siswa(data, ("Ahmad Fauzi", "1001"), ("Ahmad Fauzan", "1002"), ("Fauzi Rahman", "1003"),
+                  ("Muh. Ḥasan al-Farīd", "1004"))
+
+    assert _cari(client, "ahm fau") == ["Ahmad Fauzan", "Ahmad Fauzi"]
+    assert _cari(client, "FAUZI") == ["Ahmad Fauzi", "Fauzi Rahman"]
+    # aksen & tanda baca dinormalisasi
+    assert _cari(client, "hasan farid") == ["Muh. Ḥasan al-Farīd"]
+    # kata satu huruf diabaikan
+    assert _cari(client, "a") == []
+    assert _cari(client, "a fauzan") == ["Ahmad Fauzan"]
+
+    # ganti nama lewat ORM: token lama dibuang
+    siswa = Siswa.query.filter_by(nisn="1003").one()
+    siswa.nama_siswa = "Rahman Hakim"
+    db.session.commit()
+    assert _cari(client, "fauzi") == ["Ahmad Fauzi"]
+    assert _cari(client, "hak") == ["Rahman Hakim"]
+
+
+def test_cari_awalan_nisn(client, data):
+    _tambah_siswa(data, ("Satu", "1001"), ("Dua", "10012"), ("Tiga", "10013"), ("Empat", "2001"))
+    assert _cari(client, "1001") == ["Satu", "Dua", "Tiga"]
+    assert _cari(client, "2") == ["Empat"]
+
+
+def test_cari_kecuali_kelas_sekolah_tahun_sama(client, data):
+    kelas = db.session.get(Kelas, data["kelas"])
+    kelas_b = Kelas(tahun_ajaran_id=kelas.tahun_ajaran_id, nama_kelas="1B", sekolah_id=data["sekolah"],
+                    wali_kelas_id=data["pegawai"])
+    tahun_lalu = TahunAjaran(sekolah_id=data["sekolah"], tahun_ajaran="2024/2025", semester="genap")
+    db.session.add_all([kelas_b, tahun_lalu])
+    db.session.flush()
+    kelas_lalu = Kelas(tahun_ajaran_id=tahun_lalu.id, nama_kelas="TK", sekolah_id=data["sekolah"],
+                       wali_kelas_id=data["pegawai"])
+    db.session.add(kelas_lalu)
+    db.session.flush()
+    db.session.add(Siswa(nama_siswa="Ahmad Lama", nisn="3001", jenis_kelamin="L", kelas_id=kelas_lalu.id))
+    db.session.commit()
+
+    # siswa kelas 1A (tahun ajaran yang sama) tidak ditawarkan lagi untuk kelas 1B
+    assert _cari(client, "siswa", kelas_id=kelas_b.id) == []
+    assert _cari(client, "ahmad", kelas_id=kelas_b.id) == ["Ahmad Lama"]
+    assert len(_cari(client, "siswa")) == 6
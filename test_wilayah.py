@@ -0,0 +1,117 @@
+# test_wilayah.py - shard JSON pohon wilayah (dropdown) dan typeahead sekolah
+import gzip
+import json
+import os
+import threading
+
+import pytest
+
+from penilaiansiswa import db
+from penilaiansiswa.models import Sekolah
+from penilaiansiswa.utils import pencarian_sekolah, wilayah_json
+from penilaiansiswa.utils.wilayah_json import bangun_shard_wilayah
+
+
+@pytest.fixture(autouse=True)
+def _bersih(app, tmp_path, monkeypatch):
+    """Folder shard & index sekolah baru per test (keduanya disimpan per proses)."""
+    monkeypatch.setitem(app.config, "WILAYAH_JSON_DIR", str(tmp_path / "wilayah"))
+    monkeypatch.setattr(wilayah_json, "_manifest", (None, None))
+    monkeypatch.setattr(pencarian_sekolah, "_indeks", None)
+
+
+def _sekolah(data, nama, npsn, aktif=True):
+    kecamatan_id = db.session.get(Sekolah, data["sekolah"]).kecamatan_id
+    sekolah = Sekolah(nama_sekolah=nama, npsn=npsn, kecamatan_id=kecamatan_id, aktif=aktif)
+    db.session.add(sekolah)
+    db.session.commit()
+    return sekolah
+
+
+def _json(client, url):
+    r = client.get(url)
+    assert r.status_code == 200
+    return r.json
+
+
+# =========================
+# SHARD WILAYAH
+# =========================
+def _shard_kabupaten(client, manifest):
+    base = "/pegawai/wilayah/"
+    [provinsi] = _json(client, base + manifest["index"])["provinsi"]
+    [kabupaten] = provinsi["kabupaten"]
+    return kabupaten["shard"], _json(client, base + kabupaten["shard"])
+
+
+def test_shard_wilayah(client, data):
+    _sekolah(data, "SD Negeri 9 Panggul", "20500009", aktif=False)
+    manifest = bangun_shard_wilayah()
+
+    nama_shard, shard = _shard_kabupaten(client, manifest)
+    [kecamatan] = shard["kecamatan"]
+    # sekolah yang sudah ditutup tetap ada (ditandai) agar pilihan pegawai lama bisa ditampilkan
+    assert [(s["npsn"], s.get("aktif", True)) for s in kecamatan["sekolah"]] == [
+        ("20500001", True), ("20500009", False)
+    ]
+
+    r = client.get("/pegawai/wilayah/" + nama_shard, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(r.data)) == shard
+    assert "immutable" in r.headers["Cache-Control"]
+    assert client.get("/pegawai/wilayah/kab-1.000000000000.json").status_code == 404
+
+    # data tidak berubah: nama shard sama; ganti nama sekolah: hanya shard kabupaten yang berganti
+    assert bangun_shard_wilayah()["index"] == manifest["index"]
+    db.session.get(Sekolah, data["sekolah"]).nama_sekolah = "SD Negeri 1 Panggul Baru"
+    db.session.commit()
+    baru = bangun_shard_wilayah()
+    assert baru["index"] != manifest["index"]
+    nama_baru, _ = _shard_kabupaten(client, baru)
+    assert nama_baru != nama_shard
+    # shard generasi sebelumnya masih bisa diminta halaman yang sudah terbuka
+    assert client.get("/pegawai/wilayah/" + nama_shard).status_code == 200
+
+
+def test_shard_wilayah_perlu_login(app, data):
+    manifest = bangun_shard_wilayah()
+    r = app.test_client().get("/pegawai/wilayah/" + manifest["index"])
+    assert r.status_code == 302
+    assert os.path.exists(os.path.join(app.config["WILAYAH_JSON_DIR"], manifest["index"] + ".gz"))
+
+
+# =========================
+# TYPEAHEAD SEKOLAH
+# =========================
+def _cari(client, q, **params):
+    r = client.get("/pegawai/search_sekolah", query_string={"q": q, **params})
+    return [s["npsn"] for s in r.json["sekolah"]] if r.json["success"] else r.json["message"]
+
+
+def test_cari_sekolah(client, data):
+    _sekolah(data, "SD Negeri 2 Panggul", "20500002")
+    _sekolah(data, "SMP Negeri 1 Panggul", "20500003")
+    _sekolah(data, "SD Negeri 3 Panggul", "20500004", aktif=False)
+
+    assert _cari(client, "neg pang") == ["20500001", "20500002", "20500003"]
+    assert _cari(client, "smp") == ["20500003"]
+    # NPSN sama persis di urutan pertama, awalan NPSN juga cocok
+    assert _cari(client, "20500002") == ["20500002"]
+    assert _cari(client, "2050000") == ["20500001", "20500002", "20500003"]
+    assert _cari(client, "sd pang", limit=1) == ["20500001"]
+    assert "minimal" in _cari(client, "sd")
+
+    [hasil] = client.get("/pegawai/search_sekolah", query_string={"q": "smp"}).json["sekolah"]
+    assert hasil["wilayah"] == "Panggul, Trenggalek, Jawa Timur"
+
+
+def test_cari_sekolah_index_diperbarui(client, data):
+    assert _cari(client, "munjungan") == []
+    _sekolah(data, "SD Negeri 1 Munjungan", "20500005")
+
+    # index lama tetap dipakai sementara index baru dibangun di thread latar belakang
+    assert _cari(client, "munjungan") == []
+    for thread in threading.enumerate():
+        if thread.name == "index-sekolah":
+            thread.join(5)
+    assert _cari(client, "munjungan") == ["20500005"]